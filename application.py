@@ -1,26 +1,151 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, current_app, jsonify, request, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from flask_bcrypt import Bcrypt
 from flask_jwt_extended import (
-    JWTManager, create_access_token, jwt_required, get_jwt_identity
+    JWTManager, create_access_token, get_jwt, get_jwt_identity, verify_jwt_in_request
 )
+from functools import wraps
 import datetime
+import math
+import os
+
+from glucose import CONTEXT_CODES, CONTEXTS, GlucoseStore, parse_csv_readings, parse_json_readings, parse_timestamp
+from glycemic import DAY_POINTS, DEFAULT_GI, HIGH_GLUCOSE, RESPONSE_MINUTES, STEP_MINUTES, DayEstimate
+from grocery import GroceryIndex
+from image_cache import DEFAULT_SIZE as DEFAULT_IMAGE_SIZE, SIZES as IMAGE_SIZES, ImageCache, ImageUnavailable
+from ingredient_categorizer import CATEGORIES, Categorizer
+from ingredient_insights import (
+    DEFAULT_MODEL as INSIGHT_MODEL, MAX_NAME_LENGTH as MAX_INSIGHT_NAME, IngredientInsights, InsightUnavailable,
+    OpenAIClient, insight_key,
+)
+from meal_plan import SLOTS, MealPlanner, day_totals
+from metrics import MAX_PROFILE_SECONDS, Metrics
+from password_hasher import PasswordHasher, PasswordPoolBusy
+from product_index import ProductIndex, rate_products
+from progress_history import BUCKETS
+from recipe_fit import FitIndex, parse_fit_args
+from recipe_index import DEFAULT_LIMIT, MAX_LIMIT, RecipeIndex, decode_cursor, encode_cursor, parse_query
+from recipe_payload import SUMMARY_FIELDS, RecipePayloads, parse_projection, project
+from recipe_search import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, SearchIndex, parse_limit
+from recipe_store import RecipeStore
+from spoonacular_proxy import (
+    DEFAULT_BASE_URL as SPOONACULAR_BASE_URL, SpoonacularProxy, UpstreamError, bounded_int, parse_ingredients,
+    search_params,
+)
+from token_revocation import TokenRevocations
+from user_store import DEFAULT_GOALS, PROGRESS_FIELDS, UserStore
 
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:*", "http://127.0.0.1:*"], 
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-     allow_headers=["Content-Type", "Authorization"])
+     allow_headers=["Content-Type", "Authorization", "If-None-Match"],
+     expose_headers=["ETag", "X-Cache", "Retry-After"])
 
 
 # === Security Config ===
 app.config['JWT_SECRET_KEY'] = 'super-secret-key'  # Use environment variable in production
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = datetime.timedelta(days=1)
+# ":memory:" gives a throwaway database, e.g. for tests
+app.config['USER_DB_PATH'] = os.environ.get('USER_DB_PATH', 'users.db')
+# Changing the cost upgrades existing hashes on each user's next login
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_WORKERS'] = int(os.environ.get('PASSWORD_WORKERS', 0)) or None
+app.config['PASSWORD_QUEUE_SIZE'] = int(os.environ.get('PASSWORD_QUEUE_SIZE', 16))
+# Revoked-token filter shared by all workers; sized per token lifetime
+app.config['REVOCATION_FILTER_PATH'] = (
+    None if app.config['USER_DB_PATH'] == ':memory:' else app.config['USER_DB_PATH'] + '.revoked')
+app.config['REVOCATION_FILTER_CAPACITY'] = int(os.environ.get('REVOCATION_FILTER_CAPACITY', 1_000_000))
+app.config['MAX_PROGRESS_BATCH'] = 500
+app.config['MAX_HISTORY_DAYS'] = 3660
+app.config['MAX_GLUCOSE_BATCH'] = 100000
+# Built offline with `python product_index.py build <OpenFoodFacts dump> products.idx`
+app.config['PRODUCT_INDEX_PATH'] = os.environ.get('PRODUCT_INDEX_PATH', 'products.idx')
+app.config['MAX_PRODUCT_BATCH'] = 1000
+app.config['MAX_CATEGORIZE_BATCH'] = 10000
+app.config['MAX_GROCERY_RECIPES'] = 100
+app.config['MAX_MEALPLAN_DAYS'] = 14
+app.config['IMAGE_CACHE_DIR'] = os.environ.get('IMAGE_CACHE_DIR', 'image_cache')
+app.config['IMAGE_CACHE_MAX_BYTES'] = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 1024 ** 3))
+# Seconds clients may reuse an image without revalidating
+app.config['IMAGE_MAX_AGE'] = 7 * 24 * 3600
+# Seconds; days not solved exactly by then are filled greedily
+app.config['MEALPLAN_TIME_BUDGET'] = 0.5
+app.config['MAX_GLYCEMIC_PREVIEW'] = 5000
+app.config['MAX_SERVINGS'] = 100
+# Grams of carbs or sugar, or minutes of exercise, in one progress event
+app.config['MAX_EVENT_AMOUNT'] = 10000
+# Days of glucose readings used for the glycemic curve's baseline
+app.config['GLYCEMIC_BASELINE_DAYS'] = 14
+# Time one call in N of each internal phase; 0 turns phase timing off
+app.config['METRICS_SAMPLE_EVERY'] = int(os.environ.get('METRICS_SAMPLE_EVERY', 16))
+# One metrics row per pre-fork worker; server.py sets SERVER_WORKERS
+app.config['METRICS_SLOTS'] = int(os.environ.get('SERVER_WORKERS', 1))
+# GET /metrics/profile samples live stacks, so it is off unless asked for and needs a token
+app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED') == '1'
+# Spoonacular calls go through the server so the key and quota are shared; no key disables them
+app.config['SPOONACULAR_API_KEY'] = os.environ.get('SPOONACULAR_API_KEY')
+app.config['SPOONACULAR_BASE_URL'] = os.environ.get('SPOONACULAR_BASE_URL', SPOONACULAR_BASE_URL)
+# Upstream calls per hour across every worker
+app.config['SPOONACULAR_MAX_PER_HOUR'] = int(os.environ.get('SPOONACULAR_MAX_PER_HOUR', 150))
+# Proxy requests per user per hour, cache hits included
+app.config['SPOONACULAR_MAX_PER_USER_HOUR'] = int(os.environ.get('SPOONACULAR_MAX_PER_USER_HOUR', 120))
+app.config['MAX_SPOONACULAR_RECIPES'] = 100
+# Without a key, insights precomputed by `python ingredient_insights.py` are still served
+app.config['OPENAI_API_KEY'] = os.environ.get('OPENAI_API_KEY')
+app.config['INSIGHT_MODEL'] = os.environ.get('INSIGHT_MODEL', INSIGHT_MODEL)
 
-bcrypt = Bcrypt(app)
+passwords = PasswordHasher(
+    rounds=app.config['BCRYPT_LOG_ROUNDS'],
+    workers=app.config['PASSWORD_WORKERS'],
+    queue_size=app.config['PASSWORD_QUEUE_SIZE'],
+)
 jwt = JWTManager(app)
 
-# === In-memory data (replace with real DB in production) ===
-users = {}  # key: email, value: {password_hash, profile}
+# === Metrics ===
+metrics = Metrics(("hashing", "serialization", "store", "jwt"),
+                  slots=app.config['METRICS_SLOTS'], sample_every=app.config['METRICS_SAMPLE_EVERY'])
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with metrics.phase("serialization"):
+            return super().dumps(obj, **kwargs)
+
+
+app.json = TimedJSONProvider(app)
+metrics.instrument(passwords, "hashing", ("hash", "verify"))
+
+
+def jwt_required(**options):
+    """flask_jwt_extended's jwt_required, with token verification timed as the "jwt" phase."""
+    def decorator(fn):
+        @wraps(fn)
+        def verified(*args, **kwargs):
+            with metrics.phase("jwt"):
+                verify_jwt_in_request(**options)
+            return current_app.ensure_sync(fn)(*args, **kwargs)
+        return verified
+    return decorator
+
+# === Data ===
+users = UserStore(app.config['USER_DB_PATH'])
+glucose = GlucoseStore(users)
+recipe_store = RecipeStore(users)
+revocations = TokenRevocations(
+    users, app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds(),
+    capacity=app.config['REVOCATION_FILTER_CAPACITY'], path=app.config['REVOCATION_FILTER_PATH'],
+)
+spoonacular = SpoonacularProxy(
+    users, app.config['SPOONACULAR_API_KEY'], base_url=app.config['SPOONACULAR_BASE_URL'],
+    max_per_hour=app.config['SPOONACULAR_MAX_PER_HOUR'], max_per_user_hour=app.config['SPOONACULAR_MAX_PER_USER_HOUR'],
+) if app.config['SPOONACULAR_API_KEY'] else None
+insights = IngredientInsights(
+    users, OpenAIClient(app.config['OPENAI_API_KEY'], app.config['INSIGHT_MODEL'])
+    if app.config['OPENAI_API_KEY'] else None,
+)
+metrics.instrument(users, "store", ("create_user", "get_password_hash", "set_password_hash", "get_profile",
+                                    "update_profile", "set_goals", "add_progress", "reset_progress",
+                                    "apply_events", "get_history"))
 
 recipes = [
     {
@@ -169,12 +294,114 @@ recipes = [
     }
 ]
 
+# Recipes imported with recipe_importer.py replace the built-in starter set
+if recipe_store.count():
+    recipes = recipe_store.load()
+
+recipe_index = RecipeIndex(recipes)
+recipe_payloads = RecipePayloads(recipes)
+fit_index = FitIndex(recipe_index)
+meal_planner = MealPlanner(recipes)
+search_index = SearchIndex(recipes)
+images = ImageCache(app.config['IMAGE_CACHE_DIR'], app.config['IMAGE_CACHE_MAX_BYTES'])
+
+# Memory-mapped, so every worker shares the same page cache
+products = ProductIndex(app.config['PRODUCT_INDEX_PATH']) if os.path.exists(app.config['PRODUCT_INDEX_PATH']) else None
+
+categorizer = Categorizer()
+grocery_index = GroceryIndex(recipes, categorizer)
+
+# Query args that only pick a projection of the precomputed catalog payload
+PROJECTION_ARGS = {"view", "fields"}
+
 # === Helpers ===
-def reset_if_needed(user_profile):
-    today = datetime.date.today().isoformat()
-    if user_profile.get("lastUpdated") != today:
-        user_profile["progress"] = {"carbs": 0, "sugar": 0, "exercise": 0}
-        user_profile["lastUpdated"] = today
+def today():
+    return datetime.date.today().isoformat()
+
+def event_time(timestamp):
+    """Local datetime of an ISO-8601 string or epoch-milliseconds timestamp."""
+    if isinstance(timestamp, bool):
+        raise ValueError
+    if isinstance(timestamp, (int, float)):
+        return datetime.datetime.fromtimestamp(timestamp / 1000)
+    moment = datetime.datetime.fromisoformat(timestamp)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone()
+    return moment
+
+def positive_number(value):
+    return not isinstance(value, bool) and isinstance(value, (int, float)) and 0 < value < math.inf
+
+def is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def parse_progress_events(data):
+    """Validate a /progress/batch body into (key, day, amounts, meal) tuples.
+
+    An event naming a `recipe_id` (optionally with `servings`) or a
+    `glycemic_index` is a timed meal: carbs and sugar default to the
+    recipe's, and it feeds GET /progress/glycemic.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    events = (data or {}).get("events")
+    if not isinstance(events, list):
+        raise ValueError("events must be a list")
+    if len(events) > app.config['MAX_PROGRESS_BATCH']:
+        raise ValueError(f"At most {app.config['MAX_PROGRESS_BATCH']} events per batch")
+    # Days outside this range would pad every history column up to them
+    now = datetime.date.today()
+    first_day = now - datetime.timedelta(days=app.config['MAX_HISTORY_DAYS'])
+    last_day = now + datetime.timedelta(days=1)
+    parsed = []
+    for i, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise ValueError(f"events[{i}] must be an object")
+        key = event.get("key")
+        if not isinstance(key, str) or not key:
+            raise ValueError(f"events[{i}].key is required")
+        try:
+            moment = event_time(event.get("timestamp"))
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise ValueError(f"events[{i}].timestamp is invalid")
+        if not first_day <= moment.date() <= last_day:
+            raise ValueError(f"events[{i}].timestamp must be within the last {app.config['MAX_HISTORY_DAYS']} days")
+        recipe = None
+        if event.get("recipe_id") is not None:
+            if not is_id(event["recipe_id"]):
+                raise ValueError(f"events[{i}].recipe_id must be an integer")
+            recipe = recipe_index.get(event["recipe_id"])
+            if recipe is None:
+                raise ValueError(f"events[{i}].recipe_id not found")
+        servings = event.get("servings", 1)
+        if not positive_number(servings) or servings > app.config['MAX_SERVINGS']:
+            raise ValueError(f"events[{i}].servings must be a positive number up to {app.config['MAX_SERVINGS']}")
+        amounts = {}
+        for field in PROGRESS_FIELDS:
+            value = event.get(field, (recipe.get(field) or 0) * servings if recipe and field != "exercise" else 0)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"events[{i}].{field} must be a number")
+            limit = app.config['MAX_EVENT_AMOUNT']
+            if not abs(value) <= limit:
+                raise ValueError(f"events[{i}].{field} must be from -{limit} to {limit}")
+            amounts[field] = value
+        meal = None
+        gi = event.get("glycemic_index")
+        if gi is not None and (not positive_number(gi) or gi > 100):
+            raise ValueError(f"events[{i}].glycemic_index must be from 1 to 100")
+        if (recipe or gi is not None) and amounts["carbs"] > 0:
+            gi = gi or (recipe and recipe.get("glycemic_index")) or DEFAULT_GI
+            meal = (int(moment.timestamp()), recipe and recipe["id"], amounts["carbs"], gi)
+        parsed.append((key, moment.date().isoformat(), amounts, meal))
+    return parsed
+
+@jwt.token_in_blocklist_loader
+def token_revoked(jwt_header, jwt_payload):
+    return revocations.is_revoked(jwt_payload)
+
+@app.errorhandler(PasswordPoolBusy)
+def password_pool_busy(e):
+    return jsonify({"msg": "Server busy, please try again"}), 503, {"Retry-After": "1"}
 
 # === Auth Endpoints ===
 @app.route("/signup", methods=["POST"])
@@ -184,22 +411,13 @@ def signup():
     password = data["password"]
     name = data.get("name", "New User")  # Get name from request
 
-    if email in users:
+    if users.get_password_hash(email) is not None:
         return jsonify({"msg": "User already exists"}), 400
 
-    hashed_pw = bcrypt.generate_password_hash(password).decode('utf-8')
-
-    users[email] = {
-        "password": hashed_pw,
-        "profile": {
-            "name": name,
-            "bio": "",
-            "profile_picture": "",
-            "goals": {"carbs": 200, "sugar": 50, "exercise": 30},
-            "progress": {"carbs": 0, "sugar": 0, "exercise": 0},
-            "lastUpdated": datetime.date.today().isoformat()
-        }
-    }
+    hashed_pw = passwords.hash(password)
+
+    if not users.create_user(email, hashed_pw, name, today()):
+        return jsonify({"msg": "User already exists"}), 400
 
     return jsonify({"msg": "User registered successfully"}), 200
 
@@ -209,27 +427,196 @@ def login():
     email = data["email"]
     password = data["password"]
 
-    user = users.get(email)
-    if not user or not bcrypt.check_password_hash(user["password"], password):
+    password_hash = users.get_password_hash(email)
+    if not password_hash or not passwords.verify(password, password_hash):
         return jsonify({"msg": "Invalid credentials"}), 401
+    if passwords.needs_rehash(password_hash):
+        passwords.rehash_later(password, lambda new_hash: users.set_password_hash(email, new_hash))
 
-    access_token = create_access_token(identity=email)
+    # Tokens carry the user's generation so /logout/all can revoke them in one entry
+    access_token = create_access_token(identity=email, additional_claims={"gen": revocations.generation(email)})
     return jsonify(access_token=access_token), 200
 
-# === Recipe Endpoint ===
+@app.route("/logout", methods=["POST"])
+@jwt_required()
+def logout():
+    token = get_jwt()
+    revocations.revoke_token(token["jti"], token["exp"])
+    return jsonify({"msg": "Logged out"}), 200
+
+@app.route("/logout/all", methods=["POST"])
+@jwt_required()
+def logout_all():
+    revocations.revoke_all(get_jwt_identity())
+    return jsonify({"msg": "Logged out on all devices"}), 200
+
+# === Recipe Endpoints ===
 @app.route("/recipes", methods=["GET"])
 def get_recipes():
-    return jsonify(recipes)
+    try:
+        fields = parse_projection(request.args, recipe_payloads.fields)
+        # Bare /recipes keeps returning the full list for existing clients
+        if set(request.args) <= PROJECTION_ARGS:
+            return catalog_response(recipe_payloads.get(fields))
+        query = parse_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result = recipe_index.query(**query)
+    result["recipes"] = [project(r, fields) for r in result["recipes"]]
+    return jsonify(result)
+
+def catalog_response(payload):
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    matched = next((tag for tag in payload.etags() if request.if_none_match.contains_weak(tag)), None)
+    if matched is not None:
+        headers["ETag"] = f'"{matched}"'
+        return Response(status=304, headers=headers)
+    body, encoding, etag = payload.variant(request.accept_encodings)
+    headers["ETag"] = f'"{etag}"'
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, mimetype="application/json", headers=headers)
+
+@app.route("/recipes/search", methods=["GET"])
+def search_recipes():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        limit = parse_limit(request.args, "limit", DEFAULT_LIMIT, MAX_LIMIT)
+        cursor = request.args.get("cursor")
+        offset = decode_cursor(cursor) if cursor else 0
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    matches, total = search_index.search(query, limit, offset)
+    next_offset = offset + len(matches)
+    return jsonify({
+        "recipes": [dict(project(r, SUMMARY_FIELDS), score=round(score, 4)) for r, score in matches],
+        "total": total,
+        "next_cursor": encode_cursor(next_offset) if next_offset < total else None,
+    })
+
+@app.route("/recipes/suggest", methods=["GET"])
+def suggest_recipes():
+    try:
+        limit = parse_limit(request.args, "limit", DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    matches, terms = search_index.suggest(request.args.get("prefix", ""), limit)
+    return jsonify({
+        "recipes": [{"id": r["id"], "title": r["title"]} for r in matches],
+        "terms": terms,
+    })
+
+@app.route("/recipes/fit", methods=["GET"])
+@jwt_required()
+def get_fitting_recipes():
+    """Top-k recipes that fit what is left of today's carb and sugar goals."""
+    try:
+        calories, categories, k = parse_fit_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    profile = users.get_profile(get_jwt_identity(), today())
+    if not profile:
+        return jsonify({"error": "User not found"}), 404
+    goals, progress = profile["goals"], profile["progress"]
+    remaining = {}
+    for field in ("carbs", "sugar"):
+        try:
+            remaining[field] = max(float(goals.get(field, DEFAULT_GOALS[field])) - (progress[field] or 0), 0.0)
+        except (TypeError, ValueError):
+            remaining[field] = math.nan
+        if not math.isfinite(remaining[field]):
+            return jsonify({"error": f"Goal for {field} is not a number"}), 400
+    remaining["calories"] = calories
+    matches = fit_index.fit(remaining["carbs"], remaining["sugar"], calories, categories, k)
+    return jsonify({
+        "remaining": remaining,
+        "recipes": [dict(project(r, SUMMARY_FIELDS), fit_score=round(score, 4)) for r, score in matches],
+    })
+
+@app.route("/mealplan", methods=["POST"])
+@jwt_required()
+def create_meal_plan():
+    """Breakfast/lunch/dinner/snack for N days within the user's daily goals."""
+    data = request.get_json() or {}
+    days = data.get("days", 7)
+    if not isinstance(days, int) or isinstance(days, bool) or not 1 <= days <= app.config['MAX_MEALPLAN_DAYS']:
+        return jsonify({"error": f"days must be an integer from 1 to {app.config['MAX_MEALPLAN_DAYS']}"}), 400
+    profile = users.get_profile(get_jwt_identity(), today())
+    if not profile:
+        return jsonify({"error": "User not found"}), 404
+    goals = {}
+    for field in ("carbs", "sugar", "calories"):
+        value = profile["goals"].get(field, DEFAULT_GOALS.get(field))
+        if value is None:
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = math.nan
+        if not math.isfinite(value):
+            return jsonify({"error": f"Goal for {field} is not a number"}), 400
+        goals[field] = max(value, 0.0)
+    plan, complete = meal_planner.plan(goals, days, app.config['MEALPLAN_TIME_BUDGET'])
+    return jsonify({
+        "goals": goals,
+        "complete": complete,
+        "days": [
+            {
+                "day": n,
+                "meals": {slot: day[slot] and project(day[slot], SUMMARY_FIELDS) for slot in SLOTS},
+                "totals": day_totals(day),
+            }
+            for n, day in enumerate(plan, 1)
+        ],
+    })
+
+@app.route("/recipes/<int:recipe_id>", methods=["GET"])
+def get_recipe(recipe_id):
+    recipe = recipe_index.get(recipe_id)
+    if recipe:
+        return jsonify(recipe)
+    return jsonify({"error": "Recipe not found"}), 404
+
+@app.route("/recipes/batch", methods=["POST"])
+def get_recipes_batch():
+    data = request.get_json() or {}
+    ids = data.get("ids")
+    if not isinstance(ids, list) or not all(is_id(i) for i in ids):
+        return jsonify({"error": "ids must be a list of integers"}), 400
+    found, missing = recipe_index.get_many(ids)
+    return jsonify({"recipes": found, "missing": missing})
+
+# === Recipe Images ===
+@app.route("/images/<int:recipe_id>", methods=["GET"])
+def get_recipe_image(recipe_id):
+    size = request.args.get("size", DEFAULT_IMAGE_SIZE)
+    if size not in IMAGE_SIZES:
+        return jsonify({"error": f"size must be one of {', '.join(IMAGE_SIZES)}"}), 400
+    recipe = recipe_index.get(recipe_id)
+    if not recipe or not recipe.get("image"):
+        return jsonify({"error": "Image not found"}), 404
+    # A second try covers the object being evicted between lookup and open
+    for _ in range(2):
+        try:
+            path, digest, mimetype = images.get(recipe["image"], size)
+            return send_file(path, mimetype=mimetype, etag=digest, max_age=app.config['IMAGE_MAX_AGE'],
+                             conditional=True)
+        except ImageUnavailable as e:
+            return jsonify({"error": str(e)}), 502
+        except FileNotFoundError:
+            continue
+    return jsonify({"error": "Image not available"}), 503
 
 # === Profile & Goal Management ===
 @app.route("/profile", methods=["GET"])
 @jwt_required()
 def get_profile():
     email = get_jwt_identity()
-    user = users.get(email)
-    if user:
-        reset_if_needed(user["profile"])
-        return jsonify(user["profile"])
+    profile = users.get_profile(email, today())
+    if profile:
+        return jsonify(profile)
     return jsonify({"error": "User not found"}), 404
 
 @app.route("/profile", methods=["PUT"])
@@ -237,15 +624,21 @@ def get_profile():
 def update_profile():
     email = get_jwt_identity()
     data = request.get_json()
-    user = users.get(email)
-    if user:
-        # Update name if provided
-        if "name" in data:
-            user["profile"]["name"] = data["name"]
-        # Update bio if provided
-        if "bio" in data:
-            user["profile"]["bio"] = data["bio"]
-        return jsonify({"message": "Profile updated", "profile": user["profile"]})
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be an object"}), 400
+    # Only name and bio can be changed here
+    changes = {}
+    if "name" in data:
+        if not isinstance(data["name"], str):
+            return jsonify({"error": "name must be a string"}), 400
+        changes["name"] = data["name"]
+    if "bio" in data:
+        if data["bio"] is not None and not isinstance(data["bio"], str):
+            return jsonify({"error": "bio must be a string"}), 400
+        changes["bio"] = data["bio"] or ""
+    profile = users.update_profile(email, changes)
+    if profile:
+        return jsonify({"message": "Profile updated", "profile": profile})
     return jsonify({"error": "User not found"}), 404
 
 @app.route("/goals", methods=["POST"])
@@ -253,9 +646,12 @@ def update_profile():
 def update_goals():
     email = get_jwt_identity()
     data = request.get_json()
-    user = users.get(email)
-    if user:
-        user["profile"]["goals"] = data
+    if not isinstance(data, dict):
+        return jsonify({"error": "Goals must be an object"}), 400
+    for field, value in data.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value < math.inf:
+            return jsonify({"error": f"Goal for {field} must be a non-negative number"}), 400
+    if users.set_goals(email, data):
         return jsonify({"message": "Goals updated"})
     return jsonify({"error": "User not found"}), 404
 
@@ -264,26 +660,390 @@ def update_goals():
 def log_progress():
     email = get_jwt_identity()
     data = request.get_json()
-    user = users.get(email)
-    if user:
-        reset_if_needed(user["profile"])
-        user["profile"]["progress"]["carbs"] += data.get("carbs", 0)
-        user["profile"]["progress"]["sugar"] += data.get("sugar", 0)
-        user["profile"]["progress"]["exercise"] += data.get("exercise", 0)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be an object"}), 400
+    limit = app.config['MAX_EVENT_AMOUNT']
+    for field in PROGRESS_FIELDS:
+        value = data.get(field, 0)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not abs(value) <= limit:
+            return jsonify({"error": f"{field} must be a number from -{limit} to {limit}"}), 400
+    if users.add_progress(email, data, today()):
         return jsonify({"message": "Progress updated"})
     return jsonify({"error": "User not found"}), 404
 
+@app.route("/progress/batch", methods=["POST"])
+@jwt_required()
+def log_progress_batch():
+    email = get_jwt_identity()
+    try:
+        events = parse_progress_events(request.get_json())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result = users.apply_events(email, events, today())
+    if result is None:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify(result)
+
+@app.route("/progress/history", methods=["GET"])
+@jwt_required()
+def progress_history():
+    email = get_jwt_identity()
+    bucket = request.args.get("bucket", "day")
+    if bucket not in BUCKETS:
+        return jsonify({"error": f"bucket must be one of {', '.join(BUCKETS)}"}), 400
+    try:
+        last = datetime.date.fromisoformat(request.args.get("to", today()))
+        first = request.args.get("from")
+        first = last - datetime.timedelta(days=29) if first is None else datetime.date.fromisoformat(first)
+    except (ValueError, OverflowError):
+        return jsonify({"error": "from and to must be YYYY-MM-DD dates"}), 400
+    if first > last or (last - first).days >= app.config['MAX_HISTORY_DAYS']:
+        return jsonify({"error": f"from must be before to and at most {app.config['MAX_HISTORY_DAYS']} days apart"}), 400
+
+    result = users.get_history(email, today())
+    if result is None:
+        return jsonify({"error": "User not found"}), 404
+    history, goals = result
+    return jsonify({
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "bucket": bucket,
+        "buckets": history.aggregate(first.toordinal(), last.toordinal(), bucket, goals),
+    })
+
 @app.route("/progress/reset", methods=["POST"])
 @jwt_required()
 def reset_progress():
     email = get_jwt_identity()
-    user = users.get(email)
-    if user:
-        user["profile"]["progress"] = {"carbs": 0, "sugar": 0, "exercise": 0}
-        user["profile"]["lastUpdated"] = datetime.date.today().isoformat()
+    if users.reset_progress(email, today()):
         return jsonify({"message": "Progress reset"})
     return jsonify({"error": "User not found"}), 404
 
+# === Glycemic Estimates ===
+def glycemic_day(email, day):
+    """DayEstimate for one local calendar day. Raises ValueError at the ends of the calendar."""
+    if not datetime.date.min < day < datetime.date.max:
+        raise ValueError("date out of range")
+    start = int(datetime.datetime.combine(day, datetime.time()).timestamp())
+    end = start + DAY_POINTS * STEP_MINUTES * 60
+    # Earlier meals still count while their response lasts
+    meals = users.get_meals(email, start - RESPONSE_MINUTES * 60, end)
+    ts, values, contexts = glucose.series(email).between(
+        start - app.config['GLYCEMIC_BASELINE_DAYS'] * 86400, end - 1)
+    fasting = (contexts == CONTEXT_CODES["fasting"]) | (contexts == CONTEXT_CODES["before meal"])
+    return DayEstimate(start, meals, ts, values, fasting)
+
+def iso_time(epoch):
+    return datetime.datetime.fromtimestamp(epoch).astimezone().isoformat()
+
+@app.route("/progress/glycemic", methods=["GET"])
+@jwt_required()
+def get_glycemic_day():
+    email = get_jwt_identity()
+    try:
+        day = datetime.date.fromisoformat(request.args.get("date", today()))
+        estimate = glycemic_day(email, day)
+    except (ValueError, OverflowError):
+        return jsonify({"error": "date must be a YYYY-MM-DD date"}), 400
+    curve = estimate.curve
+    in_day = [i for i, meal in enumerate(estimate.meals) if meal[0] >= estimate.start]
+    peak = int(curve.argmax())
+    return jsonify({
+        "date": day.isoformat(),
+        "glycemic_load": round(float(sum(estimate.loads[i] for i in in_day)), 1),
+        "meals": [{
+            "timestamp": iso_time(estimate.meals[i][0]),
+            "recipe_id": estimate.meals[i][1],
+            "carbs": estimate.meals[i][2],
+            "glycemic_index": estimate.meals[i][3],
+            "glycemic_load": round(float(estimate.loads[i]), 1),
+        } for i in in_day],
+        "baseline": {"value": round(estimate.baseline, 1), "source": estimate.baseline_source},
+        "curve": {
+            "start": iso_time(estimate.start),
+            "step_minutes": STEP_MINUTES,
+            "values": [round(v, 1) for v in curve.tolist()],
+        },
+        "peak": {"value": round(float(curve[peak]), 1), "timestamp": iso_time(estimate.time_at(peak))},
+        "minutes_above_180": int((curve > HIGH_GLUCOSE).sum()) * STEP_MINUTES,
+        "readings": estimate.readings,
+    })
+
+@app.route("/progress/glycemic/preview", methods=["POST"])
+@jwt_required()
+def preview_glycemic():
+    """What-if: the day's curve with each of many recipes eaten at one time."""
+    email = get_jwt_identity()
+    data = request.get_json() or {}
+    ids = data.get("recipe_ids")
+    if not isinstance(ids, list):
+        return jsonify({"error": "recipe_ids must be a list"}), 400
+    if len(ids) > app.config['MAX_GLYCEMIC_PREVIEW']:
+        return jsonify({"error": f"At most {app.config['MAX_GLYCEMIC_PREVIEW']} recipes per preview"}), 400
+    if not all(is_id(i) for i in ids):
+        return jsonify({"error": "recipe_ids must be integers"}), 400
+    servings = data.get("servings", 1)
+    if not positive_number(servings) or servings > app.config['MAX_SERVINGS']:
+        return jsonify({"error": f"servings must be a positive number up to {app.config['MAX_SERVINGS']}"}), 400
+    try:
+        moment = event_time(data["timestamp"]) if "timestamp" in data else datetime.datetime.now()
+        estimate = glycemic_day(email, moment.date())
+        at = moment.timestamp()
+    except (TypeError, ValueError, OverflowError, OSError):
+        return jsonify({"error": "timestamp is invalid"}), 400
+    found, missing = recipe_index.get_many(ids)
+    loads, peaks, peak_index, high = estimate.preview(
+        at, [r.get("glycemic_index") or DEFAULT_GI for r in found], [(r.get("carbs") or 0) * servings for r in found])
+    return jsonify({
+        "timestamp": iso_time(estimate.time_at(estimate.index_of(at))),
+        "baseline": {"value": round(estimate.baseline, 1), "source": estimate.baseline_source},
+        "current_peak": round(float(estimate.curve.max()), 1),
+        "recipes": [{
+            "id": r["id"],
+            "title": r.get("title"),
+            "glycemic_load": round(float(loads[i]), 1),
+            "peak": round(float(peaks[i]), 1),
+            "peak_timestamp": iso_time(estimate.time_at(peak_index[i])),
+            "minutes_above_180": int(high[i]),
+        } for i, r in enumerate(found)],
+        "missing": missing,
+    })
+
+# === Blood Glucose ===
+def int_arg(name, default, low, high, source=None):
+    """Integer `name` from the query string (or the `source` mapping) within low..high."""
+    raw = (request.args if source is None else source).get(name, default)
+    try:
+        if isinstance(raw, bool):
+            raise TypeError
+        value = int(raw)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError
+    if not low <= value <= high:
+        raise ValueError
+    return value
+
+def glucose_range():
+    """(first, last, utc_offset) in epoch seconds from ?from=&to=&utc_offset=; defaults to the last 14 days."""
+    utc_offset = int_arg("utc_offset", 0, -14 * 60, 14 * 60)
+    now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+    last = parse_timestamp(request.args["to"], utc_offset) if "to" in request.args else now
+    first = parse_timestamp(request.args["from"], utc_offset) if "from" in request.args else last - 14 * 86400
+    return first, last, utc_offset
+
+@app.route("/glucose/readings", methods=["POST"])
+@jwt_required()
+def add_glucose_readings():
+    email = get_jwt_identity()
+    try:
+        if request.mimetype == "text/csv":
+            rows = parse_csv_readings(request.get_data(as_text=True), int_arg("utc_offset", 0, -840, 840))
+        else:
+            data = request.get_json() or {}
+            readings = data.get("readings")
+            if not isinstance(readings, list):
+                raise ValueError("readings must be a list")
+            rows = parse_json_readings(readings, int_arg("utc_offset", 0, -840, 840, data))
+    except ValueError as e:
+        return jsonify({"error": str(e) or "utc_offset must be minutes from UTC"}), 400
+    if len(rows) > app.config['MAX_GLUCOSE_BATCH']:
+        return jsonify({"error": f"At most {app.config['MAX_GLUCOSE_BATCH']} readings per request"}), 400
+    added, duplicates, total = glucose.append(email, rows)
+    return jsonify({"added": added, "duplicates": duplicates, "total": total})
+
+@app.route("/glucose/readings", methods=["GET"])
+@jwt_required()
+def get_glucose_readings():
+    email = get_jwt_identity()
+    try:
+        first, last, _ = glucose_range()
+    except (ValueError, OverflowError):
+        return jsonify({"error": "Invalid from, to or utc_offset"}), 400
+    interior, edges = glucose.series(email).window(first, last)
+    pieces = [(c.ts, c.values, c.contexts) for c in interior] + edges
+    pieces.sort(key=lambda p: p[0][0])
+    return jsonify([
+        {
+            "timestamp": datetime.datetime.fromtimestamp(int(t), datetime.timezone.utc).isoformat(),
+            "value": round(float(v), 1),
+            "context": CONTEXTS[c],
+        }
+        for ts, values, contexts in pieces
+        for t, v, c in zip(ts, values, contexts)
+    ])
+
+@app.route("/glucose/stats", methods=["GET"])
+@jwt_required()
+def get_glucose_stats():
+    email = get_jwt_identity()
+    try:
+        first, last, utc_offset = glucose_range()
+        window = int_arg("window", 60, 5, 7 * 24 * 60)
+        step = int_arg("step", 60, 5, 7 * 24 * 60)
+        bin_minutes = int_arg("bin", 60, 5, 24 * 60)
+    except (ValueError, OverflowError):
+        return jsonify({"error": "Invalid from, to, utc_offset, window, step or bin"}), 400
+    return jsonify(glucose.series(email).analyze(first, last, utc_offset, window, step, bin_minutes))
+
+# === Spoonacular Proxy ===
+def spoonacular_response(call):
+    """Run a proxy call; bodies are passed through and X-Cache says hit, miss or stale."""
+    if spoonacular is None:
+        return jsonify({"error": "Spoonacular is not configured"}), 503
+    try:
+        spoonacular.user_quota.acquire(get_jwt_identity())
+        body, state = call()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except UpstreamError as e:
+        response = jsonify({"error": str(e)})
+        response.status_code = e.status
+        if e.retry_after is not None:
+            response.headers["Retry-After"] = str(e.retry_after)
+        return response
+    response = Response(body, mimetype="application/json") if isinstance(body, str) else jsonify(body)
+    response.headers["X-Cache"] = state
+    return response
+
+@app.route("/spoonacular/search", methods=["GET"])
+@jwt_required()
+def spoonacular_search():
+    return spoonacular_response(lambda: spoonacular.search(search_params(request.args)))
+
+@app.route("/spoonacular/diabetic-friendly", methods=["GET"])
+@jwt_required()
+def spoonacular_diabetic_friendly():
+    def call():
+        number = bounded_int(request.args, "number", 20, 1, app.config['MAX_SPOONACULAR_RECIPES'])
+        results, state = spoonacular.diabetic_friendly(number, request.args.get("type", ""))
+        return {"results": results}, state
+    return spoonacular_response(call)
+
+@app.route("/spoonacular/by-ingredients", methods=["GET"])
+@jwt_required()
+def spoonacular_by_ingredients():
+    def call():
+        results, state = spoonacular.by_ingredients(parse_ingredients(request.args.get("ingredients")))
+        return {"results": results}, state
+    return spoonacular_response(call)
+
+@app.route("/spoonacular/recipes/<int:recipe_id>", methods=["GET"])
+@jwt_required()
+def spoonacular_recipe(recipe_id):
+    return spoonacular_response(lambda: spoonacular.details(recipe_id))
+
+# === Packaged Products ===
+@app.route("/products/<barcode>", methods=["GET"])
+def get_product(barcode):
+    if products is None:
+        return jsonify({"error": "Product index not available"}), 503
+    product = products.get(barcode)
+    if product is None:
+        return jsonify({"error": "Product not found"}), 404
+    return jsonify(product)
+
+@app.route("/products/rate", methods=["POST"])
+def rate_product_batch():
+    """Rate indexed barcodes and/or raw per-100g nutrition in one call."""
+    data = request.get_json() or {}
+    barcodes = data.get("barcodes", [])
+    items = data.get("products", [])
+    if not isinstance(barcodes, list) or not all(isinstance(b, str) for b in barcodes):
+        return jsonify({"error": "barcodes must be a list of strings"}), 400
+    if not isinstance(items, list) or not all(isinstance(p, dict) for p in items):
+        return jsonify({"error": "products must be a list of objects"}), 400
+    if len(barcodes) + len(items) > app.config['MAX_PRODUCT_BATCH']:
+        return jsonify({"error": f"At most {app.config['MAX_PRODUCT_BATCH']} products per request"}), 400
+    result = {"products": rate_products(items) if items else []}
+    if barcodes:
+        if products is None:
+            return jsonify({"error": "Product index not available"}), 503
+        result["barcodes"] = products.ratings(barcodes)
+    return jsonify(result)
+
+# === Ingredient Insights ===
+@app.route("/ingredients/insight", methods=["GET"])
+@jwt_required()
+def get_ingredient_insight():
+    name = request.args.get("name", "")
+    if len(name) > MAX_INSIGHT_NAME:
+        return jsonify({"error": f"name must be at most {MAX_INSIGHT_NAME} characters"}), 400
+    key = insight_key(name)
+    if not key:
+        return jsonify({"error": "name is required"}), 400
+    try:
+        body, state = insights.get(key)
+    except InsightUnavailable as e:
+        return jsonify({"error": str(e)}), 503 if insights.client is None else 502
+    response = Response(body, mimetype="application/json")
+    response.headers["X-Cache"] = state
+    return response
+
+# === Grocery Lists ===
+@app.route("/ingredients/categorize", methods=["POST"])
+def categorize_ingredients():
+    items = (request.get_json() or {}).get("ingredients")
+    if not isinstance(items, list) or not all(isinstance(i, str) for i in items):
+        return jsonify({"error": "ingredients must be a list of strings"}), 400
+    if len(items) > app.config['MAX_CATEGORIZE_BATCH']:
+        return jsonify({"error": f"At most {app.config['MAX_CATEGORIZE_BATCH']} ingredients per request"}), 400
+    return jsonify({
+        "categories": categorizer.categorize_many(items),
+        # A list, because JSON object keys would lose the aisle order
+        "groups": [{"category": c, "items": i} for c, i in categorizer.group(items).items()],
+    })
+
+@app.route("/grocery/aggregate", methods=["POST"])
+def aggregate_grocery_list():
+    """One merged shopping list for {"recipes": [{"id": 1, "servings": 2}, ...]}."""
+    selections = (request.get_json() or {}).get("recipes")
+    if not isinstance(selections, list) or not all(isinstance(s, dict) for s in selections):
+        return jsonify({"error": "recipes must be a list of {id, servings} objects"}), 400
+    if len(selections) > app.config['MAX_GROCERY_RECIPES']:
+        return jsonify({"error": f"At most {app.config['MAX_GROCERY_RECIPES']} recipes per list"}), 400
+    parsed = []
+    for i, selection in enumerate(selections):
+        if not is_id(selection.get("id")):
+            return jsonify({"error": f"recipes[{i}].id must be an integer"}), 400
+        servings = selection.get("servings")
+        if servings is not None and not positive_number(servings):
+            return jsonify({"error": f"recipes[{i}].servings must be a positive number"}), 400
+        parsed.append((selection.get("id"), servings))
+    try:
+        groups = grocery_index.aggregate(parsed)
+    except KeyError as e:
+        return jsonify({"error": f"Recipe {e.args[0]} not found"}), 404
+    return jsonify({
+        "groups": [{"category": c, "items": groups[c]} for c in CATEGORIES if c in groups],
+        "item_count": sum(len(items) for items in groups.values()),
+    })
+
+# === Metrics Endpoints ===
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/metrics/profile", methods=["GET"])
+@jwt_required()
+def get_profile_stacks():
+    if not app.config['PROFILING_ENABLED']:
+        return jsonify({"error": "Profiling is disabled; set PROFILING_ENABLED=1"}), 404
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval = float(request.args.get("interval_ms", 5)) / 1000
+    except ValueError:
+        return jsonify({"error": "seconds and interval_ms must be numbers"}), 400
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0.001 <= interval <= 1:
+        return jsonify({"error": f"seconds must be in (0, {MAX_PROFILE_SECONDS}] and interval_ms in [1, 1000]"}), 400
+    stacks = metrics.profile(seconds, interval)
+    if stacks is None:
+        return jsonify({"error": "A profile is already running in this worker"}), 409
+    return Response(stacks, mimetype="text/plain")
+
+# Registered last so every endpoint above gets its own series
+metrics.init_app(app)
+
 # === Run Server ===
+# Development only; production runs `python server.py` (pre-fork, preloaded catalog)
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0', port=5001)
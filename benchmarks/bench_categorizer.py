@@ -0,0 +1,84 @@
+"""Ingredient categorization: the app's contains() chain vs the automaton.
+
+Builds --count realistic ingredient lines (quantities, units, preparation
+notes around the app's keywords and some unmatched foods), checks that both
+approaches agree everywhere the override phrases do not apply, then times:
+
+  naive      categorize_naive, the ported GroceryListService chain
+  automaton  one Aho-Corasick pass per line, cache disabled
+  cached     the automaton with its per-line LRU, as the server runs it
+
+    python benchmarks/bench_categorizer.py --count 10000 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ingredient_categorizer import OVERRIDES, TAXONOMY, Categorizer, categorize_naive  # noqa: E402
+
+QUANTITIES = ("1", "2", "1/2", "3/4", "1 1/2", "200g", "a pinch of", "")
+UNITS = ("cup", "cups", "tbsp", "tsp", "oz", "lb", "cloves", "slices", "")
+NOTES = ("", ", chopped", ", diced", ", finely minced", " (optional)", ", to taste", ", rinsed and drained")
+UNMATCHED = ("water", "sweet potato", "cauliflower florets", "honey", "maple syrup", "cocoa powder",
+             "baking soda", "vanilla extract", "coconut flakes", "cornstarch")
+
+
+def make_lines(count, seed=7):
+    rng = random.Random(seed)
+    keywords = [k for _, ks in TAXONOMY for k in ks] + [k for k, _ in OVERRIDES] + list(UNMATCHED)
+    lines = []
+    for _ in range(count):
+        food = rng.choice(keywords)
+        if rng.random() < 0.3:
+            food = f"{rng.choice(('fresh', 'organic', 'low-fat', 'Greek', 'smoked', 'whole'))} {food}"
+        line = " ".join(p for p in (rng.choice(QUANTITIES), rng.choice(UNITS), food) if p) + rng.choice(NOTES)
+        lines.append(line.capitalize() if rng.random() < 0.2 else line)
+    return lines
+
+
+def timed(fn, lines, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(lines)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = make_lines(args.count)
+    uncached = Categorizer(cache_size=0)
+    cached = Categorizer()
+
+    overridden = [k for k, _ in OVERRIDES]
+    disagree = [
+        line for line in lines
+        if uncached.categorize(line) != categorize_naive(line)
+        and not any(k in line.lower() for k in overridden)
+    ]
+    print(f"{len(lines)} lines, {len(set(lines))} distinct, "
+          f"{len(disagree)} disagreements outside the override phrases")
+
+    results = {
+        "naive": timed(lambda ls: [categorize_naive(l) for l in ls], lines, args.repeat),
+        "automaton": timed(uncached.categorize_many, lines, args.repeat),
+        "cached": timed(cached.categorize_many, lines, args.repeat),
+    }
+    for name, seconds in results.items():
+        print(f"{name:10} {seconds * 1000:8.2f} ms  {seconds / len(lines) * 1e6:6.2f} us/line  "
+              f"{results['naive'] / seconds:5.2f}x")
+    return 1 if disagree else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
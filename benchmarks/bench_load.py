@@ -0,0 +1,320 @@
+"""Mixed-workload load test of the API over real sockets, with baseline comparison.
+
+`run` seeds a throwaway database with --users accounts and a --recipes
+catalog, starts server.py on it, and drives each workload for --seconds
+with --concurrency client threads (one keep-alive connection each):
+
+    signup   burst of POST /signup with fresh emails
+    login    login storm: POST /login for random seeded users
+    browse   read-heavy: catalog pages, recipe details, search, suggest, profile
+    progress POST /progress mixed with profile and history reads
+
+Throughput and p50/p95/p99 latency per endpoint go to a JSON file.
+Requests are drawn from generators seeded with --seed, so two runs send
+the same sequence. The client threads share one GIL, so keep
+--concurrency moderate or the client becomes the bottleneck.
+
+`compare` diffs a result against a saved baseline and exits 1 if any
+endpoint got slower (or lost throughput) by more than --threshold percent.
+
+    python benchmarks/bench_load.py run --output baseline.json
+    # ... change application.py ...
+    python benchmarks/bench_load.py run --output current.json
+    python benchmarks/bench_load.py compare baseline.json current.json --threshold 10
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import bcrypt
+
+from bench_prefork import WORDS, seed as seed_catalog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "bench-password"
+WORKLOADS = ("signup", "login", "browse", "progress")
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def seed_users(db_path, count, rounds):
+    from user_store import UserStore
+
+    users = UserStore(db_path)
+    # One hash for everyone: seeding stays fast, logins still pay full cost
+    password_hash = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+    today = datetime.date.today().isoformat()
+    for i in range(count):
+        users.create_user(f"user{i}@example.com", password_hash, f"User {i}", today)
+    users.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# === Workloads ===
+# Each returns (label, method, path, body) for the next request; `token` is
+# the thread's session for authenticated endpoints.
+def signup_request(rng, state):
+    state["n"] = state.get("n", 0) + 1
+    email = f"burst-{state['thread']}-{state['n']}-{rng.getrandbits(32)}@example.com"
+    return "POST /signup", "POST", "/signup", {"email": email, "password": PASSWORD, "name": "Burst"}
+
+
+def login_request(rng, state):
+    email = f"user{rng.randrange(state['users'])}@example.com"
+    return "POST /login", "POST", "/login", {"email": email, "password": PASSWORD}
+
+
+def browse_request(rng, state):
+    pick = rng.random()
+    if pick < 0.05:
+        return "GET /recipes?view=summary", "GET", "/recipes?view=summary", None
+    if pick < 0.30:
+        carbs = rng.choice((20, 40, 60))
+        return "GET /recipes?<filters>", "GET", f"/recipes?limit=20&max_carbs={carbs}&sort=-glycemic_index", None
+    if pick < 0.60:
+        return "GET /recipes/<id>", "GET", f"/recipes/{rng.randint(1, state['recipes'])}", None
+    if pick < 0.75:
+        query = "+".join(rng.sample(WORDS, 2))
+        return "GET /recipes/search", "GET", f"/recipes/search?q={query}", None
+    if pick < 0.85:
+        word = rng.choice(WORDS)
+        return "GET /recipes/suggest", "GET", f"/recipes/suggest?prefix={word[:rng.randint(1, 4)]}", None
+    return "GET /profile", "GET", "/profile", None
+
+
+def progress_request(rng, state):
+    pick = rng.random()
+    if pick < 0.5:
+        body = {"carbs": rng.randint(0, 60), "sugar": rng.randint(0, 20), "exercise": rng.randint(0, 30)}
+        return "POST /progress", "POST", "/progress", body
+    if pick < 0.8:
+        return "GET /profile", "GET", "/profile", None
+    return "GET /progress/history", "GET", "/progress/history?bucket=week", None
+
+
+REQUESTS = {"signup": signup_request, "login": login_request, "browse": browse_request,
+            "progress": progress_request}
+
+
+def client(port, workload, state, deadline, record_after, samples):
+    rng = random.Random(f"{state['seed']}-{workload}-{state['thread']}")
+    make = REQUESTS[workload]
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    headers = {"Content-Type": "application/json"}
+    if state.get("token"):
+        headers["Authorization"] = f"Bearer {state['token']}"
+    while True:
+        label, method, path, body = make(rng, state)
+        start = time.perf_counter()
+        if start >= deadline:
+            break
+        try:
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            status = 0
+        if start >= record_after:
+            samples.append((label, (time.perf_counter() - start) * 1000, status))
+    conn.close()
+
+
+def login(port, email):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request("POST", "/login", body=json.dumps({"email": email, "password": PASSWORD}),
+                 headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    conn.close()
+    return data["access_token"]
+
+
+def run_workload(args, port, workload, tokens):
+    """Per-endpoint stats for one workload; the first --warmup seconds are not recorded."""
+    started = time.perf_counter()
+    record_after = started + args.warmup
+    deadline = record_after + args.seconds
+    per_thread = [[] for _ in range(args.concurrency)]
+    threads = []
+    for i in range(args.concurrency):
+        state = {"thread": i, "seed": args.seed, "users": args.users, "recipes": args.recipes,
+                 "token": tokens[i % len(tokens)]}
+        threads.append(threading.Thread(target=client, args=(port, workload, state, deadline, record_after,
+                                                               per_thread[i])))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    by_label = {}
+    for samples in per_thread:
+        for label, latency, status in samples:
+            by_label.setdefault(label, []).append((latency, status))
+    endpoints = {}
+    for label, samples in sorted(by_label.items()):
+        latencies = sorted(latency for latency, _ in samples)
+        statuses = {}
+        for _, status in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        endpoints[label] = {
+            "requests": len(samples),
+            "throughput": round(len(samples) / args.seconds, 1),
+            "errors": sum(1 for _, status in samples if not 200 <= status < 400),
+            "statuses": statuses,
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            **{f"p{pct}_ms": round(percentile(latencies, pct), 3) for pct in PERCENTILES},
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {"requests": total, "throughput": round(total / args.seconds, 1), "endpoints": endpoints}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    workloads = args.workloads.split(",")
+    unknown = set(workloads) - set(WORKLOADS)
+    if unknown:
+        sys.exit(f"unknown workloads: {', '.join(sorted(unknown))}")
+    results = {
+        "meta": {
+            "started": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(), "python": platform.python_version(), "cpus": os.cpu_count(),
+            **{k: v for k, v in vars(args).items() if k not in ("func", "command", "output")},
+        },
+        "workloads": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed_catalog(db_path, args.recipes)
+        seed_users(db_path, args.users, args.bcrypt_rounds)
+        port = free_port()
+        env = dict(os.environ, USER_DB_PATH=db_path, BCRYPT_LOG_ROUNDS=str(args.bcrypt_rounds),
+                   IMAGE_CACHE_DIR=os.path.join(tmp, "images"), PRODUCT_INDEX_PATH=os.path.join(tmp, "none.idx"))
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), "--bind", f"127.0.0.1:{port}",
+                                   "--workers", str(args.workers)], env=env, stderr=subprocess.PIPE, text=True,
+                                  cwd=ROOT)
+        try:
+            for line in server.stderr:
+                if "workers serving" in line:
+                    break
+            else:
+                sys.exit("server.py exited before serving")
+            # Drain the log so a chatty server never blocks on a full pipe
+            threading.Thread(target=server.stderr.read, daemon=True).start()
+            sessions = min(args.concurrency, args.users)
+            tokens = [login(port, f"user{i}@example.com") for i in range(sessions)]
+            for workload in workloads:
+                result = run_workload(args, port, workload, tokens)
+                results["workloads"][workload] = result
+                print(f"{workload:>9}  {result['throughput']:8.1f} req/s")
+                for label, stats in result["endpoints"].items():
+                    print(f"           {label:<28} n={stats['requests']:<7} p50={stats['p50_ms']:7.2f}ms "
+                          f"p95={stats['p95_ms']:7.2f}ms p99={stats['p99_ms']:7.2f}ms errors={stats['errors']}")
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(60)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"wrote {args.output}")
+
+
+# === Compare ===
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    limit = args.threshold / 100
+    regressions = 0
+    for workload, result in current["workloads"].items():
+        base = baseline["workloads"].get(workload)
+        if base is None:
+            print(f"{workload}: not in baseline")
+            continue
+        for label, stats in result["endpoints"].items():
+            before = base["endpoints"].get(label)
+            if before is None:
+                print(f"{workload} {label}: not in baseline")
+                continue
+            for metric in [f"p{pct}_ms" for pct in PERCENTILES] + ["throughput"]:
+                old, new = before[metric], stats[metric]
+                change = (new - old) / old if old else 0.0
+                if metric == "throughput":
+                    worse = change < -limit
+                else:
+                    # Sub-millisecond jitter on fast endpoints is not a regression
+                    worse = change > limit and new - old > args.min_ms
+                regressions += worse
+                if worse or args.verbose:
+                    flag = "REGRESSION" if worse else ""
+                    print(f"{workload:>9} {label:<28} {metric:<11} {old:10.2f} -> {new:10.2f} "
+                          f"({change:+7.1%}) {flag}")
+    if regressions:
+        print(f"{regressions} regression(s) beyond {args.threshold:g}%")
+        sys.exit(1)
+    print(f"no regressions beyond {args.threshold:g}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the workloads and write a result file")
+    run_parser.add_argument("--users", type=int, default=1000)
+    run_parser.add_argument("--recipes", type=int, default=5000)
+    run_parser.add_argument("--workloads", default=",".join(WORKLOADS), help="comma-separated subset")
+    run_parser.add_argument("--concurrency", type=int, default=16, help="client threads per workload")
+    run_parser.add_argument("--seconds", type=float, default=10, help="measured time per workload")
+    run_parser.add_argument("--warmup", type=float, default=2, help="unrecorded time before each workload")
+    run_parser.add_argument("--workers", type=int, default=2, help="server.py worker processes")
+    run_parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--output", default="bench_load.json")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="diff a result file against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10, help="percent change that counts")
+    compare_parser.add_argument("--min-ms", type=float, default=0.5,
+                                help="ignore latency increases smaller than this")
+    compare_parser.add_argument("--verbose", action="store_true", help="print every metric, not just regressions")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
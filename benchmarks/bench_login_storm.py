@@ -0,0 +1,95 @@
+"""/recipes latency while a login storm is hitting /login.
+
+Starts the app on a local threaded server, measures /recipes latency on its
+own, then again while --storm threads post logins as fast as they can.
+Because bcrypt runs in the password pool, /recipes p99 should stay close to
+the quiet baseline, and logins beyond the pool's queue get fast 503s.
+
+    python benchmarks/bench_login_storm.py --storm 32 --seconds 5
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def measure_recipes(port, seconds):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        conn.request("GET", "/recipes?view=summary")
+        conn.getresponse().read()
+        samples.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    return samples
+
+
+def storm(port, stop, statuses):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    body = json.dumps({"email": "storm@example.com", "password": "password"})
+    headers = {"Content-Type": "application/json"}
+    while not stop.is_set():
+        conn.request("POST", "/login", body=body, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        statuses[resp.status] = statuses.get(resp.status, 0) + 1
+    conn.close()
+
+
+def report(label, samples):
+    print(f"{label:>10}  n={len(samples):<6} p50={percentile(samples, 50):6.2f}ms "
+          f"p99={percentile(samples, 99):6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--storm", type=int, default=32, help="concurrent login threads")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("USER_DB_PATH", os.path.join(tmp, "bench.db"))
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import make_server
+    from application import app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client = app.test_client()
+    client.post("/signup", json={"email": "storm@example.com", "password": "password"})
+
+    report("quiet", measure_recipes(port, args.seconds))
+
+    stop = threading.Event()
+    statuses = {}
+    threads = [threading.Thread(target=storm, args=(port, stop, statuses)) for _ in range(args.storm)]
+    for t in threads:
+        t.start()
+    time.sleep(0.5)
+    report("storm", measure_recipes(port, args.seconds))
+    stop.set()
+    for t in threads:
+        t.join()
+    print(f"login statuses during storm: {dict(sorted(statuses.items()))}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
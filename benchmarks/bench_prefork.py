@@ -0,0 +1,120 @@
+"""Startup time and per-worker memory of server.py, with and without preload.
+
+Seeds a synthetic catalog into a throwaway database, starts server.py in
+each mode, waits for every worker to be up, warms them with some catalog
+and search requests, then reads RSS / PSS / USS of each worker from
+/proc/<pid>/smaps_rollup (Linux only).
+
+    python benchmarks/bench_prefork.py --recipes 20000 --workers 4
+"""
+import argparse
+import http.client
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = ("chicken beef tofu salmon shrimp lentil quinoa zucchini spinach kale tomato garlic onion "
+         "pepper lemon basil cilantro ginger curry pesto rice noodle salad soup stew bowl taco wrap "
+         "roasted grilled baked spicy creamy crispy").split()
+LINES = ("1 cup diced tomatoes", "2 cloves garlic, minced", "1 tbsp olive oil", "200 g chicken breast",
+         "1/2 cup quinoa", "salt and pepper to taste", "1 lemon, juiced", "2 cups spinach",
+         "1 tsp cumin", "3 tbsp soy sauce", "1 can chickpeas", "1 onion, chopped")
+STEPS = ("Heat the oil in a large pan.", "Add the onions and cook until soft.",
+         "Stir in the garlic and spices.", "Simmer for 20 minutes.",
+         "Season to taste and serve warm.", "Bake at 400F for 25 minutes.")
+
+
+def seed(db_path, count):
+    from recipe_store import RecipeStore
+    from user_store import UserStore
+
+    rng = random.Random(7)
+    users = UserStore(db_path)
+    store = RecipeStore(users)
+    recipes = [{
+        "id": i,
+        "title": " ".join(rng.sample(WORDS, rng.randint(2, 5))).title() + f" {i}",
+        "image": f"https://example.com/{i}.jpg",
+        "carbs": rng.randint(2, 90), "sugar": rng.randint(0, 30), "calories": rng.randint(80, 900),
+        "glycemic_index": rng.randint(10, 90),
+        "category": rng.choice(("Breakfast", "Lunch", "Dinner", "Snacks")),
+        "cuisine": rng.choice(("Italian", "Thai", "American", "Mexican")),
+        "ingredients": rng.sample(LINES, rng.randint(4, 9)),
+        "instructions": rng.sample(STEPS, rng.randint(3, 6)),
+    } for i in range(1, count + 1)]
+    store.upsert_many(recipes)
+    users.close()
+
+
+def memory(pid):
+    """(rss, pss, uss) in MB from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return fields["Rss"] / 1024, fields["Pss"] / 1024, uss / 1024
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def run_mode(args, env, preload):
+    cmd = [sys.executable, os.path.join(ROOT, "server.py"), "--bind", f"127.0.0.1:{args.port}",
+           "--workers", str(args.workers)]
+    if not preload:
+        cmd.append("--no-preload")
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stderr=subprocess.PIPE, text=True, cwd=ROOT)
+    try:
+        for line in proc.stderr:
+            if "workers serving" in line:
+                break
+        ready = time.perf_counter() - started
+        conn = http.client.HTTPConnection("127.0.0.1", args.port)
+        for i in range(args.warm):
+            for path in ("/recipes?view=summary", f"/recipes/{i + 1}", "/recipes/search?q=spicy+chicken"):
+                conn.request("GET", path)
+                conn.getresponse().read()
+        conn.close()
+        workers = [memory(pid) for pid in children(proc.pid)]
+        master = memory(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(60)
+    avg = [sum(w[i] for w in workers) / len(workers) for i in range(3)]
+    label = "--preload" if preload else "--no-preload"
+    print(f"{label:>13}  ready in {ready:5.1f}s  worker RSS {avg[0]:6.1f} MB  PSS {avg[1]:6.1f} MB  "
+          f"USS {avg[2]:6.1f} MB  master RSS {master[0]:6.1f} MB  total PSS {master[1] + avg[1] * len(workers):6.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--warm", type=int, default=20, help="warm-up request rounds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path, args.recipes)
+        env = dict(os.environ, USER_DB_PATH=db_path, IMAGE_CACHE_DIR=os.path.join(tmp, "images"),
+                   PRODUCT_INDEX_PATH=os.path.join(tmp, "none.idx"))
+        for preload in (True, False):
+            run_mode(args, env, preload)
+
+
+if __name__ == "__main__":
+    main()
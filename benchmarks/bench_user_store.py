@@ -0,0 +1,90 @@
+"""Request throughput of the profile endpoints with 1, 4 and 8 worker
+processes sharing one SQLite database file.
+
+Each worker imports the app against the same USER_DB_PATH and drives it
+through Flask's test client (no sockets, so the numbers isolate the app and
+the store). The mix is 80% GET /profile, 20% POST /progress.
+
+    python benchmarks/bench_user_store.py --seconds 5 --users 200
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(db_path, n_users):
+    sys.path.insert(0, ROOT)
+    import bcrypt
+    from user_store import UserStore
+
+    store = UserStore(db_path)
+    # One cheap hash shared by every synthetic user; logins aren't measured here
+    password_hash = bcrypt.hashpw(b"password", bcrypt.gensalt(4)).decode("utf-8")
+    for i in range(n_users):
+        store.create_user(f"user{i}@example.com", password_hash, f"User {i}", "1970-01-01")
+    store.close()
+
+
+def worker(db_path, n_users, seconds, start, results):
+    os.environ["USER_DB_PATH"] = db_path
+    sys.path.insert(0, ROOT)
+    from flask_jwt_extended import create_access_token
+    from application import app
+
+    client = app.test_client()
+    rng = random.Random(os.getpid())
+    with app.app_context():
+        tokens = [create_access_token(identity=f"user{i}@example.com") for i in range(n_users)]
+    start.wait()
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+        if rng.random() < 0.8:
+            resp = client.get("/profile", headers=headers)
+        else:
+            resp = client.post("/progress", json={"carbs": 5, "sugar": 1}, headers=headers)
+        assert resp.status_code == 200, resp.data
+        done += 1
+    results.put(done)
+
+
+def run(workers, n_users, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path, n_users)
+        start = multiprocessing.Barrier(workers + 1)
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=worker, args=(db_path, n_users, seconds, start, results))
+            for _ in range(workers)
+        ]
+        for p in procs:
+            p.start()
+        start.wait()
+        total = sum(results.get() for _ in procs)
+        for p in procs:
+            p.join()
+    return total / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'req/s':>10}")
+    for n in args.workers:
+        print(f"{n:>8} {run(n, args.users, args.seconds):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
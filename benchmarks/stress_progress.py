@@ -0,0 +1,101 @@
+"""Concurrency stress test for progress ingestion: no lost or doubled updates.
+
+Many client threads hammer one user over real sockets, mixing
+POST /progress/batch (every batch is sent twice, like a mobile retry after
+a dropped response) with single POST /progress calls. At the end the
+user's totals must equal exactly what was sent once. Exits non-zero on
+any mismatch.
+
+    python benchmarks/stress_progress.py --threads 32 --batches 50
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def client_thread(port, token, batches, batch_size, sent, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+    now_ms = int(time.time() * 1000)
+    carbs = 0
+    for _ in range(batches):
+        events = [
+            {"key": uuid.uuid4().hex, "timestamp": now_ms, "carbs": 1, "sugar": 2, "exercise": 3}
+            for _ in range(batch_size)
+        ]
+        body = json.dumps({"events": events})
+        for _ in range(2):
+            conn.request("POST", "/progress/batch", body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors.append(resp.status)
+        conn.request("POST", "/progress", body=json.dumps({"carbs": 1}), headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 200:
+            errors.append(resp.status)
+        carbs += batch_size + 1
+    conn.close()
+    sent.append(carbs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ.setdefault("USER_DB_PATH", os.path.join(tempfile.mkdtemp(), "stress.db"))
+    os.environ.setdefault("BCRYPT_LOG_ROUNDS", "4")
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import make_server
+    from application import app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client = app.test_client()
+    client.post("/signup", json={"email": "stress@example.com", "password": "password"})
+    token = client.post("/login", json={"email": "stress@example.com", "password": "password"}).json["access_token"]
+
+    sent, errors = [], []
+    threads = [
+        threading.Thread(target=client_thread,
+                         args=(server.server_port, token, args.batches, args.batch_size, sent, errors))
+        for _ in range(args.threads)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    requests = args.threads * args.batches * 3
+    progress = client.get("/profile", headers={"Authorization": f"Bearer {token}"}).json["progress"]
+    expected_carbs = sum(sent)
+    expected_events = args.threads * args.batches * args.batch_size
+    expected = {"carbs": expected_carbs, "sugar": 2 * expected_events, "exercise": 3 * expected_events}
+    print(f"{requests} requests in {elapsed:.1f}s ({requests / elapsed:.0f} req/s), errors: {len(errors)}")
+    print(f"expected {expected}")
+    print(f"got      {progress}")
+    if errors or progress != expected:
+        sys.exit(1)
+    print("OK: no lost or duplicated updates")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,31 @@
-import requests
-import time
-import os
-import json
-from supabase import create_client, Client
+"""Harvest diabetes-friendly recipes from Spoonacular into a JSONL file, then upload.
 
-# Load environment variables
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-API_KEY = os.getenv('SPOONACULAR_API_KEY')
+    python fetch_curated_recipes.py --concurrency 4 --rate 2 --upload
+    python fetch_curated_recipes.py --base-url http://127.0.0.1:8089   # against spoonacular_stub.py
 
-if not SUPABASE_URL or not SUPABASE_KEY or not API_KEY:
-    raise EnvironmentError("Missing SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, or SPOONACULAR_API_KEY environment variable.")
+Cuisines are harvested concurrently over one pooled HTTP session. Every
+request goes through a token bucket and an on-disk response cache, and
+each search page's hits are resolved with one informationBulk call.
+Progress is checkpointed after every page, so when the quota runs out
+(402) the run stops cleanly and the next run resumes where it left off
+instead of starting over. Any other request that fails for good stops
+only its cuisine, with the error noted in the checkpoint.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+import requests
+from requests.adapters import HTTPAdapter
 
 MAX_CARBS = 40
 MAX_SUGAR = 15
-RECIPE_LIMIT = 100
+PAGE_SIZE = 50  # fixed so cached search pages stay valid across runs
 
 CUISINE_COUNTS = {
     "American": 15,
@@ -28,128 +37,302 @@ CUISINE_COUNTS = {
     "French": 14,
 }
 
+
+class QuotaExhausted(Exception):
+    """Spoonacular answered 402: today's points are used up."""
+
+
+class RequestFailed(Exception):
+    """A request failed for good: a 4xx that retrying cannot fix, or retries ran out."""
+
+
+class TokenBucket:
+    """Allows `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SpoonacularClient:
+    def __init__(self, api_key, base_url, cache_dir, bucket, pool_size=8, max_retries=4):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.cache_dir = cache_dir
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.quota_left = None
+        self.requests_made = 0
+        self.cache_hits = 0
+        self.stats_lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, path, params):
+        # The API key is deliberately not part of the key
+        raw = json.dumps([path, sorted((k, str(v)) for k, v in params.items())])
+        return os.path.join(self.cache_dir, hashlib.sha256(raw.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, path, params):
+        cache_path = self._cache_path(path, params) if self.cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as f:
+                with self.stats_lock:
+                    self.cache_hits += 1
+                return json.load(f)
+
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            response = self.session.get(self.base_url + path, params={**params, "apiKey": self.api_key}, timeout=30)
+            with self.stats_lock:
+                self.requests_made += 1
+                if "X-API-Quota-Left" in response.headers:
+                    self.quota_left = float(response.headers["X-API-Quota-Left"])
+            if response.status_code == 402:
+                raise QuotaExhausted()
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == self.max_retries:
+                    break
+                retry_after = response.headers.get("Retry-After")
+                time.sleep(float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt)
+                continue
+            if response.status_code >= 400:
+                raise RequestFailed(f"Spoonacular answered {response.status_code} for {path}")
+            data = response.json()
+            if cache_path:
+                tmp = f"{cache_path}.{threading.get_ident()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(tmp, cache_path)
+            return data
+        raise RequestFailed(f"Spoonacular kept failing for {path}: {response.status_code}")
+
+
+class Checkpoint:
+    """Per-cuisine harvest state ({offset, ids, done[, error]}), saved atomically after every page."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def get(self, cuisine):
+        with self.lock:
+            entry = self.state.setdefault(cuisine, {"offset": 0, "ids": [], "done": False})
+            return entry["offset"], list(entry["ids"]), entry["done"]
+
+    def update(self, cuisine, offset, ids, done):
+        with self.lock:
+            self.state[cuisine] = {"offset": offset, "ids": ids, "done": done}
+            self._save()
+
+    def fail(self, cuisine, error):
+        """Note why a cuisine stopped; the next run resumes it from its last page."""
+        with self.lock:
+            self.state.setdefault(cuisine, {"offset": 0, "ids": [], "done": False})["error"] = error
+            self._save()
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+class JsonlSink:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, records):
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
 def safe_get_nutrient(nutrients, name):
     for n in nutrients:
         if n.get("name", "").lower() == name.lower():
             return n.get("amount")
     return None
 
-def fetch_recipes(cuisine, count):
-    all_results = []
-    offset = 0
 
-    while len(all_results) < count:
-        params = {
-            "apiKey": API_KEY,
+def to_recipe(info, cuisine):
+    """Map a Spoonacular information object to a curated_recipes row. Raises ValueError."""
+    nutrients = info.get("nutrition", {}).get("nutrients", [])
+    carbs = safe_get_nutrient(nutrients, "Carbohydrates")
+    sugar = safe_get_nutrient(nutrients, "Sugar")
+    calories = safe_get_nutrient(nutrients, "Calories")
+    if carbs is None or sugar is None or calories is None:
+        raise ValueError("Missing nutrition info")
+
+    if not isinstance(info.get("extendedIngredients"), list):
+        raise ValueError("Missing extendedIngredients")
+    ingredients = [i.get("nameClean") or i.get("name") or "" for i in info["extendedIngredients"]]
+
+    instructions = []
+    analyzed = info.get("analyzedInstructions")
+    if isinstance(analyzed, list) and analyzed and "steps" in analyzed[0]:
+        instructions = [step.get("step", "") for step in analyzed[0]["steps"]]
+
+    return {
+        "title": info.get("title", ""),
+        "image": info.get("image", ""),
+        "carbs": int(float(carbs)),
+        "sugar": int(float(sugar)),
+        "calories": int(float(calories)),
+        "category": info.get("dishTypes", ["Other"])[0] if info.get("dishTypes") else "Other",
+        "cuisine": cuisine,
+        "ingredients": ingredients,
+        "instructions": instructions,
+        "approved": False,
+        "quality_score": 0,
+    }
+
+
+def harvest_cuisine(client, cuisine, count, checkpoint, sink):
+    offset, ids, done = checkpoint.get(cuisine)
+    seen = set(ids)
+    while len(ids) < count and not done:
+        page = client.get("/recipes/complexSearch", {
             "cuisine": cuisine,
             "addRecipeNutrition": True,
-            "number": min(50, count - len(all_results)),
+            "number": PAGE_SIZE,
             "offset": offset,
             "maxCarbs": MAX_CARBS,
-            "maxSugar": MAX_SUGAR
-        }
+            "maxSugar": MAX_SUGAR,
+        })
+        results = page.get("results", [])
+        wanted = [r["id"] for r in results if r.get("id") and r["id"] not in seen][:count - len(ids)]
+        records = []
+        if wanted:
+            infos = client.get("/recipes/informationBulk", {
+                "ids": ",".join(str(i) for i in wanted),
+                "includeNutrition": True,
+            })
+            for info in infos:
+                try:
+                    records.append({"source_id": info["id"], "recipe": to_recipe(info, cuisine)})
+                except (KeyError, ValueError, TypeError) as e:
+                    print(f"⚠️ Skipped {cuisine} recipe {info.get('id')}: {e}")
+        # Output first, then checkpoint: a crash in between re-fetches one
+        # page from cache and the ids below drop the repeats
+        sink.write(records)
+        ids.extend(r["source_id"] for r in records)
+        seen.update(wanted)
+        offset += PAGE_SIZE
+        done = not results or offset >= page.get("totalResults", 0)
+        checkpoint.update(cuisine, offset, ids, done or len(ids) >= count)
+        print(f"✅ {len(ids)}/{count} {cuisine} recipes fetched...")
+    return len(ids)
 
-        response = requests.get("https://api.spoonacular.com/recipes/complexSearch", params=params)
-        
-        if response.status_code == 402 or response.status_code == 429:
-            print("❌ Spoonacular API limit reached or too many requests. Try again later or upgrade your plan.")
-            exit(1)
-        
-        data = response.json()
-        results = data.get("results", [])
 
-        for r in results:
-            try:
-                recipe_id = r.get("id")
-                if not recipe_id:
-                    raise ValueError("Missing recipe id")
-
-                # Fetch full recipe info
-                info_params = {"apiKey": API_KEY, "includeNutrition": True}
-                info_resp = requests.get(
-                    f"https://api.spoonacular.com/recipes/{recipe_id}/information",
-                    params=info_params
-                )
-                if info_resp.status_code != 200:
-                    print(f"❌ Info fetch failed for recipe {recipe_id}: {info_resp.status_code} {info_resp.text}")
-                    continue
-                info = info_resp.json()
-
-                # Nutrition
-                nutrients = []
-                if "nutrition" in info and "nutrients" in info["nutrition"]:
-                    nutrients = info["nutrition"]["nutrients"]
-                carbs = safe_get_nutrient(nutrients, "Carbohydrates")
-                sugar = safe_get_nutrient(nutrients, "Sugar")
-                calories = safe_get_nutrient(nutrients, "Calories")
-                if carbs is None or sugar is None or calories is None:
-                    raise ValueError("Missing nutrition info")
-
-                # Ingredients
-                if "extendedIngredients" in info and isinstance(info["extendedIngredients"], list):
-                    ingredients = [
-                        i.get("nameClean") or i.get("name") or "" for i in info["extendedIngredients"]
-                    ]
-                else:
-                    raise ValueError("Missing extendedIngredients")
-
-                # Instructions
-                instructions = []
-                if (
-                    "analyzedInstructions" in info and
-                    isinstance(info["analyzedInstructions"], list) and
-                    len(info["analyzedInstructions"]) > 0 and
-                    "steps" in info["analyzedInstructions"][0]
-                ):
-                    instructions = [
-                        step.get("step", "") for step in info["analyzedInstructions"][0]["steps"]
-                    ]
-
-                recipe = {
-                    "title": info.get("title", ""),
-                    "image": info.get("image", ""),
-                    "carbs": int(float(carbs)),
-                    "sugar": int(float(sugar)),
-                    "calories": int(float(calories)),
-                    "category": info.get("dishTypes", ["Other"])[0] if info.get("dishTypes") else "Other",
-                    "cuisine": cuisine,
-                    "ingredients": ingredients,
-                    "instructions": instructions,
-                    "approved": False,
-                    "quality_score": 0
-                }
-                all_results.append(recipe)
-                print(f"✅ {len(all_results)}/{count} {cuisine} recipes fetched...", end='\r')
-                if len(all_results) >= count:
-                    break
-            except Exception as e:
-                print(f"⚠️ Skipped one due to error: {e}")
+def load_output(path):
+    """Harvested records, keeping the first copy of each Spoonacular id."""
+    records, seen = [], set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record["source_id"] not in seen:
+                        seen.add(record["source_id"])
+                        records.append(record)
+    return records
 
-            time.sleep(0.1)  # Reduce delay for faster fetching
 
-        offset += 50
-        # time.sleep(1)  # You can comment this out or reduce it
+def upload(path, batch_size, workers):
+    # The shared batch importer lives at the repository root
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from recipe_importer import SupabaseTarget, run_import
 
-    return all_results
+    records = load_output(path)
+    report = run_import(
+        ((i, r["recipe"]) for i, r in enumerate(records, start=1)),
+        SupabaseTarget("curated_recipes"), batch_size, workers,
+    )
+    for line, reason in report.errors:
+        print(f"⚠️ Failed to upload record {line}: {reason}")
+    print(f"⬆️ {report.summary()}")
 
-def upload_to_supabase(recipes):
-    for recipe in recipes:
-        try:
-            supabase.table("curated_recipes").insert(recipe).execute()
-        except Exception as e:
-            print(f"⚠️ Failed to upload recipe '{recipe.get('title', 'Unknown')}': {e}")
 
 def main():
-    total_uploaded = 0
-    for cuisine, count in CUISINE_COUNTS.items():
-        print(f"🍽 Fetching {count} {cuisine} recipes...")
-        recipes = fetch_recipes(cuisine, count)
-        print(f"✅ {len(recipes)} recipes fetched for {cuisine}")
-        upload_to_supabase(recipes)
-        total_uploaded += len(recipes)
-        print(f"⬆️ Uploaded {len(recipes)} to Supabase.")
-
-    print(f"🎉 Done. {total_uploaded} total recipes uploaded.")
+    parser = argparse.ArgumentParser(description="Harvest curated recipes from Spoonacular.")
+    parser.add_argument("--output", default="curated_recipes_harvest.jsonl")
+    parser.add_argument("--checkpoint", default=None, help="default: <output>.checkpoint.json")
+    parser.add_argument("--cache-dir", default=".spoonacular_cache", help="'' disables the response cache")
+    parser.add_argument("--base-url", default=os.getenv("SPOONACULAR_BASE_URL", "https://api.spoonacular.com"))
+    parser.add_argument("--api-key", default=os.getenv("SPOONACULAR_API_KEY"))
+    parser.add_argument("--concurrency", type=int, default=4, help="cuisines harvested at once")
+    parser.add_argument("--rate", type=float, default=1.0, help="requests per second")
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--upload", action="store_true", help="upload the harvest to Supabase afterwards")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    if not args.api_key:
+        raise EnvironmentError("Missing SPOONACULAR_API_KEY environment variable (or --api-key).")
+
+    client = SpoonacularClient(args.api_key, args.base_url, args.cache_dir,
+                               TokenBucket(args.rate, args.burst), pool_size=args.concurrency * 2)
+    checkpoint = Checkpoint(args.checkpoint or args.output + ".checkpoint.json")
+    sink = JsonlSink(args.output)
+
+    exhausted, failed = False, []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = {
+            pool.submit(harvest_cuisine, client, cuisine, count, checkpoint, sink): cuisine
+            for cuisine, count in CUISINE_COUNTS.items()
+        }
+        for future, cuisine in futures.items():
+            try:
+                print(f"🍽 {cuisine}: {future.result()} recipes")
+            except QuotaExhausted:
+                exhausted = True
+                print(f"❌ Spoonacular quota reached while harvesting {cuisine}; progress saved.")
+            except RequestFailed as e:
+                failed.append(cuisine)
+                checkpoint.fail(cuisine, str(e))
+                print(f"❌ {cuisine} stopped: {e}; progress saved.")
+
+    print(f"📊 {client.requests_made} API requests, {client.cache_hits} cache hits"
+          + (f", {client.quota_left:g} quota points left" if client.quota_left is not None else ""))
+    if exhausted:
+        print("⏸ Rerun this command once the quota resets to resume.")
+        sys.exit(2)
+    if failed:
+        print(f"⏸ {', '.join(failed)} did not finish; rerun this command to resume them.")
+        sys.exit(1)
+
+    total = len(load_output(args.output))
+    print(f"🎉 Done. {total} recipes harvested into {args.output}.")
+    if args.upload:
+        upload(args.output, args.batch_size, args.concurrency)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+"""Local stand-in for the Spoonacular API, for exercising the harvester and proxy offline.
+
+    python spoonacular_stub.py --port 8089 --recipes-per-cuisine 200 --quota 1000
+
+Serves deterministic synthetic data for /recipes/complexSearch,
+/recipes/findByIngredients, /recipes/{id}/information and
+/recipes/informationBulk. After --quota requests every call returns 402,
+like an exhausted daily plan. GET /__stats reports request counts per path.
+"""
+import argparse
+import json
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CUISINES = ("American", "Italian", "Mexican", "Asian", "Mediterranean", "Indian", "French")
+DISH_TYPES = ("breakfast", "lunch", "main course", "snack", "dessert")
+INGREDIENTS = ("olive oil", "garlic", "chicken breast", "zucchini", "spinach", "tomato",
+               "onion", "greek yogurt", "almonds", "salmon", "lentils", "bell pepper")
+
+
+def recipe_id(cuisine, index):
+    return (zlib.crc32(cuisine.encode()) % 1000) * 100000 + index + 1
+
+
+def information(rid):
+    seed = rid * 2654435761 % 2 ** 32
+    cuisine = CUISINES[seed % len(CUISINES)]
+    ingredients = [INGREDIENTS[(seed >> s) % len(INGREDIENTS)] for s in range(0, 20, 4)]
+    return {
+        "id": rid,
+        "title": f"{cuisine} Stub Recipe {rid}",
+        "image": f"https://img.example.test/{rid}.jpg",
+        "dishTypes": [DISH_TYPES[seed % len(DISH_TYPES)]],
+        "cuisines": [cuisine],
+        "extendedIngredients": [{"name": i, "nameClean": i} for i in dict.fromkeys(ingredients)],
+        "analyzedInstructions": [{"steps": [{"step": f"Step {n} for recipe {rid}."} for n in range(1, 4)]}],
+        "nutrition": {"nutrients": [
+            {"name": "Calories", "amount": 150 + seed % 400},
+            {"name": "Carbohydrates", "amount": 5 + seed % 35},
+            {"name": "Sugar", "amount": seed % 15},
+        ]},
+    }
+
+
+class StubState:
+    def __init__(self, per_cuisine, quota):
+        self.per_cuisine = per_cuisine
+        self.quota = quota
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.total = 0
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, body):
+            raw = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            if state.quota is not None:
+                self.send_header("X-API-Quota-Left", str(max(state.quota - state.total, 0)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if url.path == "/__stats":
+                with state.lock:
+                    return self.send_json(200, {"total": state.total, "paths": state.counts})
+            with state.lock:
+                state.total += 1
+                key = "/recipes/{id}/information" if url.path.endswith("/information") else url.path
+                state.counts[key] = state.counts.get(key, 0) + 1
+                exhausted = state.quota is not None and state.total > state.quota
+            if exhausted:
+                return self.send_json(402, {"status": "failure", "message": "Your daily points limit has been reached."})
+
+            if url.path == "/recipes/complexSearch":
+                cuisine = params.get("cuisine", "American")
+                offset = int(params.get("offset", 0))
+                number = int(params.get("number", 10))
+                query = params.get("query", "").lower()
+                ids = [recipe_id(cuisine, i) for i in range(offset, min(offset + number, state.per_cuisine))]
+                results = [{"id": i, "title": information(i)["title"], "image": information(i)["image"]} for i in ids]
+                if query:
+                    results = [r for r in results if query in r["title"].lower()] or results
+                return self.send_json(200, {"results": results, "offset": offset, "number": number,
+                                            "totalResults": state.per_cuisine})
+            if url.path == "/recipes/findByIngredients":
+                wanted = [i.strip().lower() for i in params.get("ingredients", "").split(",") if i.strip()]
+                ids = [recipe_id("American", i) for i in range(int(params.get("number", 10)))]
+                return self.send_json(200, [
+                    {"id": i, "title": information(i)["title"], "image": information(i)["image"],
+                     "usedIngredientCount": len(wanted), "missedIngredientCount": 1}
+                    for i in ids
+                ])
+            if url.path == "/recipes/informationBulk":
+                ids = [int(i) for i in params.get("ids", "").split(",") if i.strip()]
+                return self.send_json(200, [information(i) for i in ids])
+            parts = url.path.strip("/").split("/")
+            if len(parts) == 3 and parts[0] == "recipes" and parts[2] == "information" and parts[1].isdigit():
+                return self.send_json(200, information(int(parts[1])))
+            return self.send_json(404, {"status": "failure", "message": "Not found"})
+
+    return Handler
+
+
+def serve(port=0, per_cuisine=200, quota=None):
+    """Start the stub in a background thread; returns the server (``server.server_port``)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(StubState(per_cuisine, quota)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Spoonacular API stub.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--recipes-per-cuisine", type=int, default=200)
+    parser.add_argument("--quota", type=int, default=None, help="requests before returning 402")
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                 make_handler(StubState(args.recipes_per_cuisine, args.quota)))
+    print(f"🧪 Spoonacular stub on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+import csv
+import datetime
+import io
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Same contexts the app logs (BloodSugarEntry.context); CGM rows use "Random"
+CONTEXTS = ("Fasting", "Before meal", "After meal", "Random")
+CONTEXT_CODES = {c.lower(): i for i, c in enumerate(CONTEXTS)}
+DEFAULT_CONTEXT = CONTEXT_CODES["random"]
+
+# mg/dL edges: very low < 54 <= low < 70 <= in range <= 180 < high <= 250 < very high
+RANGE_NAMES = ("very_low", "low", "in_range", "high", "very_high")
+RANGE_EDGES = np.array([54, 70, 180.5, 250.5])
+MMOL_TO_MGDL = 18.0182
+
+CHUNK_SIZE = 4096
+PERCENTILES = (5, 25, 50, 75, 95)
+RESULT_CACHE_SIZE = 8
+MAX_SERIES_CACHED = 1024
+# Epoch seconds datetime can represent, with a day to spare for any utc_offset; larger
+# numbers would also overflow the int64 arrays
+MIN_TIMESTAMP = int(datetime.datetime(1, 1, 2, tzinfo=datetime.timezone.utc).timestamp())
+MAX_TIMESTAMP = int(datetime.datetime(9999, 12, 30, tzinfo=datetime.timezone.utc).timestamp())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS glucose_chunks (
+    email TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    ts BLOB NOT NULL,
+    value BLOB NOT NULL,
+    context BLOB NOT NULL,
+    PRIMARY KEY (email, chunk)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS glucose_versions (
+    email TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+SELECT_CHUNKS = "SELECT ts, value, context FROM glucose_chunks WHERE email = ? ORDER BY chunk"
+UPSERT_CHUNK = (
+    "INSERT OR REPLACE INTO glucose_chunks (email, chunk, ts, value, context) VALUES (?, ?, ?, ?, ?)"
+)
+DELETE_CHUNKS_FROM = "DELETE FROM glucose_chunks WHERE email = ? AND chunk >= ?"
+SELECT_VERSION = "SELECT version FROM glucose_versions WHERE email = ?"
+BUMP_VERSION = (
+    "INSERT INTO glucose_versions (email, version) VALUES (?, 1) "
+    "ON CONFLICT (email) DO UPDATE SET version = version + 1 RETURNING version"
+)
+
+
+class Chunk:
+    """Up to CHUNK_SIZE time-sorted readings plus lazily cached partial aggregates."""
+
+    def __init__(self, ts, values, contexts):
+        self.ts = ts
+        self.values = values
+        self.contexts = contexts
+        self._stats = None
+
+    def __len__(self):
+        return len(self.ts)
+
+    def stats(self):
+        if self._stats is None:
+            self._stats = partial_stats(self.values, self.contexts)
+        return self._stats
+
+
+def partial_stats(values, contexts):
+    """Mergeable aggregates: everything in here can be summed across chunks."""
+    v = values.astype(np.float64)
+    bands = np.searchsorted(RANGE_EDGES, v, side="right")
+    in_range = bands == 2
+    n_ctx = len(CONTEXTS)
+    return {
+        "count": len(v),
+        "sum": v.sum(),
+        "sumsq": np.dot(v, v),
+        "min": v.min() if len(v) else np.inf,
+        "max": v.max() if len(v) else -np.inf,
+        "bands": np.bincount(bands, minlength=len(RANGE_NAMES)),
+        "ctx_count": np.bincount(contexts, minlength=n_ctx),
+        "ctx_sum": np.bincount(contexts, weights=v, minlength=n_ctx),
+        "ctx_in_range": np.bincount(contexts, weights=in_range, minlength=n_ctx),
+    }
+
+
+def merge_stats(parts):
+    merged = {
+        "count": sum(p["count"] for p in parts),
+        "sum": sum(p["sum"] for p in parts),
+        "sumsq": sum(p["sumsq"] for p in parts),
+        "min": min((p["min"] for p in parts), default=np.inf),
+        "max": max((p["max"] for p in parts), default=-np.inf),
+    }
+    for key in ("bands", "ctx_count", "ctx_sum", "ctx_in_range"):
+        merged[key] = np.sum([p[key] for p in parts], axis=0) if parts else None
+    return merged
+
+
+class GlucoseSeries:
+    """One user's readings as fixed-size chunks of parallel numpy arrays.
+
+    Appends normally only touch the tail chunk, so the cached aggregates of
+    every sealed chunk survive and a re-analysis only recomputes the tail.
+    """
+
+    def __init__(self, chunks=(), version=0):
+        self.chunks = list(chunks)
+        self.version = version
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(c) for c in self.chunks)
+
+    def arrays(self):
+        if not self.chunks:
+            return np.empty(0, np.int64), np.empty(0, np.float32), np.empty(0, np.uint8)
+        return (
+            np.concatenate([c.ts for c in self.chunks]),
+            np.concatenate([c.values for c in self.chunks]),
+            np.concatenate([c.contexts for c in self.chunks]),
+        )
+
+    def append(self, ts, values, contexts):
+        """Add sorted, de-duplicated readings. Returns (added, first dirty chunk index)."""
+        before = len(self)
+        if not self.chunks or ts[0] > self.chunks[-1].ts[-1]:
+            dirty = max(len(self.chunks) - 1, 0)
+            if self.chunks and len(self.chunks[-1]) < CHUNK_SIZE:
+                tail = self.chunks.pop()
+                ts = np.concatenate([tail.ts, ts])
+                values = np.concatenate([tail.values, values])
+                contexts = np.concatenate([tail.contexts, contexts])
+            else:
+                dirty = len(self.chunks)
+        else:
+            # Out-of-order or overlapping import: merge everything, newest wins
+            old_ts, old_values, old_contexts = self.arrays()
+            ts, values, contexts = dedupe(
+                np.concatenate([old_ts, ts]),
+                np.concatenate([old_values, values]),
+                np.concatenate([old_contexts, contexts]),
+            )
+            self.chunks = []
+            dirty = 0
+        for start in range(0, len(ts), CHUNK_SIZE):
+            end = start + CHUNK_SIZE
+            self.chunks.append(Chunk(ts[start:end], values[start:end], contexts[start:end]))
+        self.results.clear()
+        return len(self) - before, dirty
+
+    def window(self, first, last):
+        """(interior chunks, edge arrays) for readings with first <= ts <= last."""
+        interior, edges = [], []
+        for chunk in self.chunks:
+            if chunk.ts[-1] < first or chunk.ts[0] > last:
+                continue
+            if chunk.ts[0] >= first and chunk.ts[-1] <= last:
+                interior.append(chunk)
+            else:
+                lo = np.searchsorted(chunk.ts, first, side="left")
+                hi = np.searchsorted(chunk.ts, last, side="right")
+                if hi > lo:
+                    edges.append((chunk.ts[lo:hi], chunk.values[lo:hi], chunk.contexts[lo:hi]))
+        return interior, edges
+
+    def between(self, first, last):
+        """(ts, values, contexts) arrays for readings with first <= ts <= last."""
+        interior, edges = self.window(first, last)
+        pieces = [(c.ts, c.values, c.contexts) for c in interior] + edges
+        if not pieces:
+            return np.empty(0, np.int64), np.empty(0, np.float32), np.empty(0, np.uint8)
+        pieces.sort(key=lambda p: p[0][0])
+        return tuple(np.concatenate([p[i] for p in pieces]) for i in range(3))
+
+    def analyze(self, first, last, utc_offset=0, window=60, step=60, bin_minutes=60):
+        """Summary statistics for readings between epoch seconds first..last.
+
+        Results are cached per argument tuple until the next append.
+        """
+        key = (first, last, utc_offset, window, step, bin_minutes)
+        with self.lock:
+            cached = self.results.get(key)
+            if cached is not None:
+                self.results.move_to_end(key)
+                return cached
+        result = analyze(self, first, last, utc_offset, window, step, bin_minutes)
+        with self.lock:
+            self.results[key] = result
+            if len(self.results) > RESULT_CACHE_SIZE:
+                self.results.popitem(last=False)
+        return result
+
+
+def dedupe(ts, values, contexts):
+    """Sort by time and keep the last reading for each timestamp."""
+    order = np.argsort(ts, kind="stable")
+    ts, values, contexts = ts[order], values[order], contexts[order]
+    keep = np.ones(len(ts), dtype=bool)
+    keep[:-1] = ts[1:] != ts[:-1]
+    return ts[keep], values[keep], contexts[keep]
+
+
+def analyze(series, first, last, utc_offset, window, step, bin_minutes):
+    interior, edges = series.window(first, last)
+    parts = [c.stats() for c in interior] + [partial_stats(v, c) for _, v, c in edges]
+    stats = merge_stats(parts)
+    n = stats["count"]
+    if n == 0:
+        return {"count": 0}
+
+    mean = stats["sum"] / n
+    sd = np.sqrt(max(stats["sumsq"] / n - mean * mean, 0.0))
+    pieces = [(c.ts, c.values) for c in interior] + [(t, v) for t, v, _ in edges]
+    pieces.sort(key=lambda p: p[0][0])
+    ts = np.concatenate([p[0] for p in pieces])
+    values = np.concatenate([p[1] for p in pieces]).astype(np.float64)
+
+    ctx_count = stats["ctx_count"]
+    contexts = {}
+    for i, name in enumerate(CONTEXTS):
+        if ctx_count[i]:
+            contexts[name] = {
+                "count": int(ctx_count[i]),
+                "mean": round(float(stats["ctx_sum"][i] / ctx_count[i]), 1),
+                "time_in_range": round(float(stats["ctx_in_range"][i] / ctx_count[i]), 4),
+            }
+
+    return {
+        "count": int(n),
+        "from": int(ts[0]),
+        "to": int(ts[-1]),
+        "mean": round(float(mean), 1),
+        "sd": round(float(sd), 1),
+        "cv": round(float(sd / mean * 100), 1) if mean else None,
+        "min": float(stats["min"]),
+        "max": float(stats["max"]),
+        # Glucose management indicator (Bergenstal 2018) and ADAG estimated A1c
+        "gmi": round(3.31 + 0.02392 * float(mean), 2),
+        "estimated_a1c": round((float(mean) + 46.7) / 28.7, 2),
+        "time_in_range": {
+            name: round(float(c / n), 4) for name, c in zip(RANGE_NAMES, stats["bands"])
+        },
+        "rolling_mean": rolling_mean(ts, values, window * 60, step * 60),
+        "percentiles_by_time_of_day": time_of_day_bands(ts, values, utc_offset * 60, bin_minutes * 60),
+        "contexts": contexts,
+    }
+
+
+def rolling_mean(ts, values, window, step):
+    """Trailing-window mean sampled every `step` seconds, via prefix sums."""
+    grid = np.arange(ts[0] + step - 1 - (ts[0] - 1) % step, ts[-1] + 1, step)
+    if len(grid) == 0:
+        grid = ts[-1:]
+    csum = np.concatenate([[0.0], np.cumsum(values)])
+    hi = np.searchsorted(ts, grid, side="right")
+    lo = np.searchsorted(ts, grid - window, side="right")
+    counts = hi - lo
+    has = counts > 0
+    means = np.divide(csum[hi] - csum[lo], counts, out=np.zeros(len(grid)), where=has)
+    return [[int(t), round(float(m), 1)] for t, m in zip(grid[has], means[has])]
+
+
+def time_of_day_bands(ts, values, offset, bin_seconds):
+    """Ambulatory-glucose-profile style percentile bands per time-of-day bin."""
+    bins = ((ts + offset) % 86400) // bin_seconds
+    order = np.lexsort((values, bins))
+    bins, values = bins[order], values[order]
+    starts = np.flatnonzero(np.concatenate([[True], bins[1:] != bins[:-1]]))
+    bands = []
+    for start, end in zip(starts, np.append(starts[1:], len(bins))):
+        qs = np.percentile(values[start:end], PERCENTILES)
+        entry = {"minute": int(bins[start] * bin_seconds // 60), "count": int(end - start)}
+        entry.update({f"p{p}": round(float(q), 1) for p, q in zip(PERCENTILES, qs)})
+        bands.append(entry)
+    return bands
+
+
+# === Parsing ===
+def parse_timestamp(raw, utc_offset=0):
+    """Epoch seconds from ISO-8601 (naive = local at utc_offset minutes) or epoch milliseconds."""
+    if isinstance(raw, bool):
+        raise ValueError("timestamp")
+    if isinstance(raw, (int, float)):
+        seconds = raw // 1000
+    else:
+        moment = datetime.datetime.fromisoformat(raw.strip())
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=datetime.timezone(datetime.timedelta(minutes=utc_offset)))
+        seconds = moment.timestamp()
+    if not MIN_TIMESTAMP <= seconds <= MAX_TIMESTAMP:
+        raise ValueError("timestamp out of range")
+    return int(seconds)
+
+
+def valid_reading(value):
+    """NaN or infinite readings would make every later /glucose/stats invalid JSON."""
+    return math.isfinite(value) and value > 0
+
+
+def parse_json_readings(readings, utc_offset=0):
+    rows = []
+    for i, reading in enumerate(readings):
+        try:
+            value = reading["value"]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not valid_reading(value):
+                raise ValueError
+            context = CONTEXT_CODES.get(str(reading.get("context") or "random").lower())
+            if context is None:
+                raise ValueError
+            rows.append((parse_timestamp(reading["timestamp"], utc_offset), value, context))
+        except (KeyError, TypeError, ValueError, AttributeError, OverflowError):
+            raise ValueError(f"readings[{i}] needs a valid timestamp, positive numeric value and known context")
+    return rows
+
+
+def parse_csv_readings(text, utc_offset=0):
+    """Parse a CGM export: picks the first timestamp and glucose columns it finds.
+
+    Handles Dexcom/Libre-style headers; mmol/L columns are converted to mg/dL.
+    Rows without a reading (calibrations, events) are skipped.
+    """
+    reader = csv.reader(io.StringIO(text))
+    header = None
+    for row in reader:
+        lowered = [h.strip().lower() for h in row]
+        if any("time" in h for h in lowered) and any("glucose" in h or h == "value" for h in lowered):
+            header = lowered
+            break
+    if header is None:
+        raise ValueError("CSV needs a timestamp column and a glucose column")
+    ts_col = next(i for i, h in enumerate(header) if "time" in h)
+    value_col = next(i for i, h in enumerate(header) if "glucose" in h or h == "value")
+    ctx_col = next((i for i, h in enumerate(header) if h == "context"), None)
+    scale = MMOL_TO_MGDL if "mmol" in header[value_col] else 1.0
+
+    rows = []
+    for line, row in enumerate(reader, start=2):
+        if len(row) <= max(ts_col, value_col) or not row[value_col].strip() or not row[ts_col].strip():
+            continue
+        try:
+            value = float(row[value_col]) * scale
+            if not valid_reading(value):
+                raise ValueError
+            context = DEFAULT_CONTEXT
+            if ctx_col is not None and ctx_col < len(row) and row[ctx_col].strip():
+                context = CONTEXT_CODES[row[ctx_col].strip().lower()]
+            rows.append((parse_timestamp(row[ts_col], utc_offset), value, context))
+        except (KeyError, ValueError, OverflowError):
+            raise ValueError(f"Invalid reading on CSV row {line}")
+    return rows
+
+
+def to_arrays(rows):
+    ts = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    values = np.fromiter((r[1] for r in rows), dtype=np.float32, count=len(rows))
+    contexts = np.fromiter((r[2] for r in rows), dtype=np.uint8, count=len(rows))
+    return dedupe(ts, values, contexts)
+
+
+class GlucoseStore:
+    """Glucose series persisted next to the user tables, cached in memory per user.
+
+    Each append bumps a per-user version row; readers compare it before
+    using their cached series, so worker processes never serve stale data.
+    """
+
+    def __init__(self, users):
+        self.users = users
+        with users.transaction() as conn:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+
+    def _cached(self, email):
+        with self.lock:
+            series = self.cache.get(email)
+            if series is not None:
+                self.cache.move_to_end(email)
+            return series
+
+    def _remember(self, email, series):
+        with self.lock:
+            self.cache[email] = series
+            self.cache.move_to_end(email)
+            if len(self.cache) > MAX_SERIES_CACHED:
+                self.cache.popitem(last=False)
+
+    def _load(self, conn, email, version):
+        chunks = [
+            Chunk(np.frombuffer(t, dtype="<i8"), np.frombuffer(v, dtype="<f4"), np.frombuffer(c, dtype=np.uint8))
+            for t, v, c in conn.execute(SELECT_CHUNKS, (email,))
+        ]
+        return GlucoseSeries(chunks, version)
+
+    def series(self, email):
+        conn = self.users.connection()
+        row = conn.execute(SELECT_VERSION, (email,)).fetchone()
+        version = row[0] if row else 0
+        series = self._cached(email)
+        if series is None or series.version != version:
+            series = self._load(conn, email, version)
+            self._remember(email, series)
+        return series
+
+    def append(self, email, rows):
+        """Persist readings; returns (added, duplicates, total)."""
+        if not rows:
+            return 0, 0, len(self.series(email))
+        ts, values, contexts = to_arrays(rows)
+        with self.users.user_locks.hold(email), self.users.transaction() as conn:
+            row = conn.execute(SELECT_VERSION, (email,)).fetchone()
+            version = row[0] if row else 0
+            current = self._cached(email)
+            if current is None or current.version != version:
+                current = self._load(conn, email, version)
+            # Copy-on-write: readers keep analyzing the old series while the
+            # new one shares every untouched chunk and its cached aggregates
+            series = GlucoseSeries(current.chunks, version)
+            added, dirty = series.append(ts, values, contexts)
+            conn.execute(DELETE_CHUNKS_FROM, (email, dirty))
+            for index in range(dirty, len(series.chunks)):
+                chunk = series.chunks[index]
+                conn.execute(UPSERT_CHUNK, (
+                    email, index, chunk.ts.astype("<i8").tobytes(),
+                    chunk.values.astype("<f4").tobytes(), chunk.contexts.tobytes(),
+                ))
+            series.version = conn.execute(BUMP_VERSION, (email,)).fetchone()[0]
+        self._remember(email, series)
+        return added, len(rows) - added, len(series)
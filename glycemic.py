@@ -0,0 +1,140 @@
+"""Glycemic load and an approximate post-meal glucose curve.
+
+Each meal adds glycemic load GL = GI * carbs / 100, absorbed along a
+gamma-shaped response (rises, peaks, and returns to baseline within a
+few hours). Low-GI meals peak later and lower than high-GI ones with the
+same load. A day's curve is the baseline plus every meal's load
+convolved with its GI class's response, on a fixed 5-minute grid.
+
+This is a rough visual aid for comparing meals, not a clinical model:
+it ignores insulin, exercise, fat and protein, and individual response.
+"""
+import numpy as np
+
+STEP_MINUTES = 5
+DAY_POINTS = 24 * 60 // STEP_MINUTES
+# Responses are cut off after this long (under 5% of the area is left)
+RESPONSE_MINUTES = 5 * 60
+RESPONSE_POINTS = RESPONSE_MINUTES // STEP_MINUTES
+# GI classes (low < 56 <= medium < 70 <= high) and their time to peak
+GI_CLASS_EDGES = np.array([56, 70])
+PEAK_MINUTES = np.array([60.0, 45.0, 30.0])
+# mg/dL at the peak per unit of glycemic load, for a medium-GI meal
+RISE_PER_GL = 2.0
+DEFAULT_GI = 55
+DEFAULT_BASELINE = 100.0
+HIGH_GLUCOSE = 180.0
+
+
+def glycemic_load(gi, carbs):
+    return np.asarray(gi, dtype=np.float64) * np.asarray(carbs, dtype=np.float64) / 100
+
+
+def gi_class(gi):
+    return np.searchsorted(GI_CLASS_EDGES, np.asarray(gi, dtype=np.float64), side="right")
+
+
+def responses():
+    """(classes, RESPONSE_POINTS) mg/dL rise per unit GL, `STEP_MINUTES` apart.
+
+    Gamma(2) curves t/tau^2 * exp(-t/tau), each with the same area, scaled
+    so a medium-GI meal peaks at RISE_PER_GL.
+    """
+    t = np.arange(RESPONSE_POINTS) * STEP_MINUTES
+    tau = PEAK_MINUTES[:, None]
+    curves = t / tau ** 2 * np.exp(-t / tau)
+    medium_peak = 1 / (PEAK_MINUTES[1] * np.e)
+    return curves * (RISE_PER_GL / medium_peak)
+
+
+RESPONSES = responses()
+
+
+def project_day(start, meal_times, loads, classes, baseline):
+    """Glucose on the DAY_POINTS grid from epoch second `start`.
+
+    Meals up to RESPONSE_MINUTES before `start` still contribute their tail.
+    """
+    lead = RESPONSE_POINTS
+    impulses = np.zeros((len(PEAK_MINUTES), lead + DAY_POINTS))
+    index = np.floor((np.asarray(meal_times) - start) / (STEP_MINUTES * 60)).astype(np.int64) + lead
+    keep = (index >= 0) & (index < impulses.shape[1])
+    np.add.at(impulses, (np.asarray(classes)[keep], index[keep]), np.asarray(loads)[keep])
+    curve = np.full(DAY_POINTS, float(baseline))
+    for c, row in enumerate(impulses):
+        if row.any():
+            curve += np.convolve(row, RESPONSES[c])[lead:lead + DAY_POINTS]
+    return curve
+
+
+def preview_meals(curve, at, loads, classes):
+    """What-if for many candidate meals at grid index `at`, all at once.
+
+    Returns (peaks, peak indexes, minutes above HIGH_GLUCOSE), one entry per
+    candidate, for the curve with that one meal added.
+    """
+    loads = np.asarray(loads, dtype=np.float64)
+    span = min(RESPONSE_POINTS, DAY_POINTS - at)
+    # (candidates, span): the day's curve under each candidate's response
+    window = curve[at:at + span] + loads[:, None] * RESPONSES[np.asarray(classes)][:, :span]
+    outside = curve.copy()
+    outside[at:at + span] = -np.inf
+    outside_index = int(np.argmax(outside))
+    window_index = window.argmax(axis=1)
+    window_peak = window[np.arange(len(loads)), window_index]
+    peaks = np.maximum(window_peak, outside[outside_index])
+    peak_index = np.where(window_peak >= outside[outside_index], at + window_index, outside_index)
+    high = (outside > HIGH_GLUCOSE).sum() + (window > HIGH_GLUCOSE).sum(axis=1)
+    return peaks, peak_index, high * STEP_MINUTES
+
+
+def estimate_baseline(values, fasting):
+    """(mg/dL, source) from recent readings: fasting/pre-meal median, else all, else a default."""
+    if len(values) and fasting.any():
+        return float(np.median(values[fasting])), "fasting readings"
+    if len(values):
+        return float(np.median(values)), "readings"
+    return DEFAULT_BASELINE, "default"
+
+
+def bin_readings(start, ts, values):
+    """Mean reading per grid step for readings inside the day: [[minute, value], ...]."""
+    index = (ts - start) // (STEP_MINUTES * 60)
+    keep = (index >= 0) & (index < DAY_POINTS)
+    index, values = index[keep], values[keep].astype(np.float64)
+    if not len(index):
+        return []
+    sums = np.bincount(index, weights=values, minlength=DAY_POINTS)
+    counts = np.bincount(index, minlength=DAY_POINTS)
+    filled = np.flatnonzero(counts)
+    return [[int(i) * STEP_MINUTES, round(float(sums[i] / counts[i]), 1)] for i in filled]
+
+
+class DayEstimate:
+    """A day's projected curve from its meals and the user's recent readings.
+
+    `meals` are (epoch seconds, recipe_id, carbs, glycemic_index) rows,
+    including meals up to RESPONSE_MINUTES before `start`.
+    """
+
+    def __init__(self, start, meals, readings_ts, readings, fasting):
+        self.start = start
+        self.meals = meals
+        self.times = np.array([m[0] for m in meals], dtype=np.int64)
+        gis = np.array([m[3] for m in meals], dtype=np.float64)
+        self.loads = glycemic_load(gis, [m[2] for m in meals])
+        self.baseline, self.baseline_source = estimate_baseline(readings, fasting)
+        self.curve = project_day(start, self.times, self.loads, gi_class(gis), self.baseline)
+        self.readings = bin_readings(start, readings_ts, readings)
+
+    def time_at(self, index):
+        return self.start + int(index) * STEP_MINUTES * 60
+
+    def index_of(self, epoch):
+        return max(0, min(int((epoch - self.start) // (STEP_MINUTES * 60)), DAY_POINTS - 1))
+
+    def preview(self, at, gis, carbs):
+        """(loads, peaks, peak indexes, minutes above HIGH_GLUCOSE) for candidate meals."""
+        gis = np.asarray(gis, dtype=np.float64)
+        loads = glycemic_load(gis, carbs)
+        return (loads, *preview_meals(self.curve, self.index_of(at), loads, gi_class(gis)))
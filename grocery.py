@@ -0,0 +1,76 @@
+"""Shopping lists merged across recipes.
+
+Every recipe's ingredient lines are parsed once, when the catalog is
+loaded, into (key, dimension) -> base-unit quantity entries with the aisle
+category already attached. Aggregating a week of meals is then a merge of
+those small dicts; no ingredient text is scanned per request.
+"""
+from ingredient_parser import display_quantity, parse_ingredient
+
+
+class GroceryIndex:
+    def __init__(self, recipes, categorizer):
+        self.categorizer = categorizer
+        self.entries = {}
+        self.servings = {}
+        self.categories = {}
+        for recipe in recipes:
+            self.entries[recipe["id"]] = self.parse_recipe(recipe)
+            self.servings[recipe["id"]] = recipe.get("servings") or 1
+
+    def parse_recipe(self, recipe):
+        """{(key, dimension): (quantity, units seen)} for one recipe, per recipe serving."""
+        servings = recipe.get("servings") or 1
+        merged = {}
+        # Cleaned imports keep the lines with quantities alongside the display list
+        for line in recipe.get("ingredient_lines") or recipe.get("ingredients") or []:
+            item = parse_ingredient(line)
+            if not item.key:
+                continue
+            if item.key not in self.categories:
+                self.categories[item.key] = self.categorizer.categorize(item.key)
+            slot = (item.key, item.dimension)
+            quantity, units = merged.get(slot, (None, frozenset()))
+            if item.quantity is not None:
+                quantity = (quantity or 0.0) + item.quantity / servings
+            merged[slot] = (quantity, units | {item.unit} if item.unit else units)
+        return merged
+
+    def aggregate(self, selections):
+        """Merge [(recipe_id, servings)] into {category: [items]}.
+
+        servings=None means the recipe's own yield. Raises KeyError with
+        the first unknown recipe id.
+        """
+        totals = {}
+        for recipe_id, servings in selections:
+            if recipe_id not in self.entries:
+                raise KeyError(recipe_id)
+            if servings is None:
+                servings = self.servings[recipe_id]
+            for slot, (quantity, units) in self.entries[recipe_id].items():
+                total, seen, used_by = totals.get(slot, (None, frozenset(), ()))
+                if quantity is not None:
+                    total = (total or 0.0) + quantity * servings
+                if recipe_id not in used_by:
+                    used_by += (recipe_id,)
+                totals[slot] = (total, seen | units, used_by)
+
+        # An unmeasured mention ("olive oil") folds into a measured amount of the same key
+        unmeasured = {key: used_by for (key, _), (total, _, used_by) in totals.items() if total is None}
+        measured = {key for (key, _), (total, _, _) in totals.items() if total is not None}
+        groups = {}
+        for (key, dimension), (total, units, used_by) in sorted(totals.items(), key=lambda kv: (kv[0][0], str(kv[0][1]))):
+            if total is None and key in measured:
+                continue
+            if total is not None and key in unmeasured:
+                used_by += tuple(r for r in unmeasured[key] if r not in used_by)
+            amount, unit = display_quantity(total, dimension, units) if total is not None else (None, None)
+            groups.setdefault(self.categories[key], []).append({
+                "name": key.title(),
+                "key": key,
+                "quantity": amount,
+                "unit": unit,
+                "recipes": list(used_by),
+            })
+        return groups
@@ -0,0 +1,201 @@
+"""On-disk cache of recipe images and their thumbnails.
+
+    <root>/objects/ab/abcdef...   image bytes, named by their sha256
+    <root>/refs/<key>             symlink to the object for one (url, size)
+
+Objects are content-addressed, so recipes sharing a photo share its files,
+and an object never changes once written, so it can be served with
+sendfile (server.py's wsgi.file_wrapper, or gunicorn's) and a strong
+ETag. A ref is a symlink, so a hit is a readlink and a stat; a ref whose
+object was evicted simply dangles until the next miss rewrites it. Eviction is least-recently-used by total object size; each worker
+process tracks the objects it has seen, so the directory can overshoot
+the limit by what other workers added since they started.
+
+Each origin URL is fetched once: thumbnails are made from the cached
+original, and concurrent misses for the same ref share one fetch.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import urllib.request
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+from single_flight import SingleFlight
+
+# Longest side in pixels; None keeps the origin's bytes as they are
+SIZES = {"thumb": 150, "small": 320, "medium": 640, "large": 1080, "original": None}
+DEFAULT_SIZE = "medium"
+JPEG_QUALITY = 80
+MAX_ORIGIN_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT = 10
+
+SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+class ImageUnavailable(Exception):
+    """The origin could not be fetched or did not return a usable image."""
+
+
+def sniff_type(head):
+    for magic, mimetype in SIGNATURES:
+        if head.startswith(magic):
+            return mimetype
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def fetch_url(url, timeout=FETCH_TIMEOUT, max_bytes=MAX_ORIGIN_BYTES):
+    """Download an origin image; raises ImageUnavailable on any failure."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            body = response.read(max_bytes + 1)
+    except (OSError, ValueError) as e:
+        raise ImageUnavailable(f"Could not fetch image: {e}")
+    if len(body) > max_bytes:
+        raise ImageUnavailable("Image is too large")
+    return body
+
+
+def make_thumbnail(data, longest_side):
+    """Bytes of `data` scaled down to fit `longest_side`, or None if it already fits."""
+    try:
+        image = Image.open(io.BytesIO(data))
+        if max(image.size) <= longest_side:
+            return None
+        # Lets the JPEG decoder skip detail we would throw away anyway
+        image.draft("RGB", (longest_side, longest_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((longest_side, longest_side), Image.LANCZOS)
+        out = io.BytesIO()
+        if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+            image.convert("RGBA").save(out, "PNG", optimize=True)
+        else:
+            image.convert("RGB").save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageUnavailable(f"Unreadable image: {e}")
+    return out.getvalue()
+
+
+class ImageCache:
+    def __init__(self, root, max_bytes, fetch=fetch_url):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fetch = fetch
+        self.objects = os.path.join(root, "objects")
+        self.refs = os.path.join(root, "refs")
+        self.tmp = os.path.join(root, "tmp")
+        for path in (self.objects, self.refs, self.tmp):
+            os.makedirs(path, exist_ok=True)
+        self.flights = SingleFlight()
+        self.lock = threading.Lock()
+        # digest -> size, least recently used first; seeded oldest-first from disk
+        self.lru = OrderedDict()
+        self.total = 0
+        self.types = {}
+        found = []
+        for shard in os.listdir(self.objects):
+            for entry in os.scandir(os.path.join(self.objects, shard)):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, digest, size in sorted(found):
+            self.lru[digest] = size
+            self.total += size
+
+    def object_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest)
+
+    def ref_path(self, url, size):
+        return os.path.join(self.refs, hashlib.sha256(f"{size}\n{url}".encode("utf-8")).hexdigest())
+
+    # === Lookups ===
+    def get(self, url, size=DEFAULT_SIZE):
+        """(path, digest, mimetype) of the cached image, fetching on a miss."""
+        hit = self.lookup(url, size)
+        if hit is not None:
+            return hit
+        return self.flights.do((url, size), lambda: self.lookup(url, size) or self.materialize(url, size))
+
+    def lookup(self, url, size):
+        try:
+            digest = os.path.basename(os.readlink(self.ref_path(url, size)))
+            path = self.object_path(digest)
+            mimetype = self.types.get(digest)
+            if mimetype is None:
+                with open(path, "rb") as f:
+                    mimetype = self.types[digest] = sniff_type(f.read(16))
+            elif not os.path.exists(path):
+                return None
+        except OSError:
+            return None
+        self.touch(digest, path)
+        return path, digest, mimetype
+
+    def materialize(self, url, size):
+        if SIZES[size] is None:
+            data = self.fetch(url)
+            if sniff_type(data[:16]) == "application/octet-stream":
+                raise ImageUnavailable("Origin did not return an image")
+        else:
+            path, digest, _ = self.get(url, "original")
+            with open(path, "rb") as f:
+                original = f.read()
+            data = make_thumbnail(original, SIZES[size])
+            if data is None:
+                # Already small enough: the thumbnail is the original object
+                self.link(url, size, digest)
+                return self.lookup(url, size)
+        self.link(url, size, self.store(data))
+        return self.lookup(url, size)
+
+    # === Storage ===
+    def store(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.tmp)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        self.touch(digest, path, len(data))
+        return digest
+
+    def link(self, url, size, digest):
+        ref = self.ref_path(url, size)
+        tmp = os.path.join(self.tmp, os.path.basename(ref) + f".{os.getpid()}.{threading.get_ident()}")
+        os.symlink(os.path.relpath(self.object_path(digest), self.refs), tmp)
+        os.replace(tmp, ref)
+
+    def touch(self, digest, path, size=None):
+        evict = []
+        with self.lock:
+            if digest in self.lru:
+                self.lru.move_to_end(digest)
+                return
+            if size is None:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    return
+            self.lru[digest] = size
+            self.total += size
+            while self.total > self.max_bytes and len(self.lru) > 1:
+                old, old_size = self.lru.popitem(last=False)
+                self.total -= old_size
+                evict.append(old)
+        for old in evict:
+            self.types.pop(old, None)
+            try:
+                os.remove(self.object_path(old))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,127 @@
+"""Grocery aisle categories for free-text ingredient lines.
+
+The keyword taxonomy used to live in GroceryListService._categorizeIngredient
+as a chain of `contains()` checks whose order decided ties ("pepper" is a
+Vegetable because that branch came before Condiments). Here the same
+keywords are data: every keyword carries an explicit priority, all of them
+are compiled into one Aho-Corasick automaton, and an ingredient is
+categorized in a single pass over its characters, keeping the
+highest-priority keyword seen.
+"""
+from collections import deque
+from functools import lru_cache
+
+OTHER = "Other"
+
+# In priority order, as the app checked them
+TAXONOMY = (
+    ("Protein", ("chicken", "beef", "pork", "turkey", "fish", "salmon", "tofu", "tempeh")),
+    ("Dairy & Eggs", ("milk", "cheese", "yogurt", "butter", "cream", "egg")),
+    ("Fruits", ("apple", "banana", "berry", "orange", "grape", "lemon", "lime", "avocado")),
+    ("Vegetables", ("lettuce", "spinach", "broccoli", "carrot", "onion", "tomato", "pepper",
+                    "cucumber", "zucchini", "mushroom", "celery", "kale")),
+    ("Grains & Bread", ("bread", "rice", "pasta", "cereal", "oats", "flour", "quinoa", "barley")),
+    ("Condiments & Spices", ("oil", "vinegar", "sauce", "salt", "pepper", "spice", "herb", "garlic",
+                             "ginger", "cumin", "paprika", "basil", "oregano", "thyme", "rosemary")),
+    ("Nuts & Seeds", ("nuts", "almond", "walnut", "peanut", "cashew", "pistachio", "seeds", "chia", "flax")),
+    ("Legumes", ("beans", "lentil", "chickpea", "kidney bean", "black bean", "pinto")),
+)
+CATEGORIES = tuple(category for category, _ in TAXONOMY) + (OTHER,)
+
+# Phrases that must beat the category order above, e.g. "peanut butter" is
+# not dairy and "black pepper" is not a vegetable
+OVERRIDES = (
+    ("black pepper", "Condiments & Spices"),
+    ("white pepper", "Condiments & Spices"),
+    ("cayenne pepper", "Condiments & Spices"),
+    ("pepper flakes", "Condiments & Spices"),
+    ("peppercorn", "Condiments & Spices"),
+    ("peanut butter", "Nuts & Seeds"),
+    ("almond butter", "Nuts & Seeds"),
+    ("almond milk", "Nuts & Seeds"),
+    ("eggplant", "Vegetables"),
+    ("green beans", "Vegetables"),
+)
+
+
+def keyword_rules():
+    """(keyword, category, priority) triples; a lower priority number wins."""
+    rules = [(keyword, category, 0) for keyword, category in OVERRIDES]
+    for rank, (category, keywords) in enumerate(TAXONOMY, start=1):
+        rules.extend((keyword, category, rank) for keyword in keywords)
+    return rules
+
+
+class Categorizer:
+    """Aho-Corasick automaton over every taxonomy keyword.
+
+    Failure links are folded into a full transition table at build time,
+    so matching is one dict lookup per character. Each state stores the
+    best (priority, category) of every keyword ending there, including the
+    ones reached through failure links.
+    """
+
+    def __init__(self, rules=None, cache_size=65536):
+        self.delta = [{}]
+        best = [None]
+        for keyword, category, priority in rules or keyword_rules():
+            state = 0
+            for ch in keyword:
+                nxt = self.delta[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.delta)
+                    self.delta[state][ch] = nxt
+                    self.delta.append({})
+                    best.append(None)
+                state = nxt
+            if best[state] is None or priority < best[state][0]:
+                best[state] = (priority, category)
+
+        # Breadth-first: a state's failure target is always finished before it
+        fail = [0] * len(self.delta)
+        root = self.delta[0]
+        queue = deque(root.values())
+        while queue:
+            state = queue.popleft()
+            inherited = best[fail[state]]
+            if inherited is not None and (best[state] is None or inherited[0] < best[state][0]):
+                best[state] = inherited
+            for ch, nxt in self.delta[state].items():
+                queue.append(nxt)
+                fail[nxt] = self.delta[fail[state]].get(ch, 0) if state else 0
+            # Complete the row with the failure target's transitions
+            for ch, target in self.delta[fail[state]].items():
+                self.delta[state].setdefault(ch, target)
+        self.best = best
+        self.categorize = lru_cache(maxsize=cache_size)(self._categorize)
+
+    def _categorize(self, ingredient):
+        delta, best = self.delta, self.best
+        state, found = 0, None
+        for ch in ingredient.lower():
+            state = delta[state].get(ch, 0)
+            hit = best[state]
+            if hit is not None and (found is None or hit[0] < found[0]):
+                found = hit
+                if not found[0]:
+                    break
+        return found[1] if found else OTHER
+
+    def categorize_many(self, ingredients):
+        return [self.categorize(i) for i in ingredients]
+
+    def group(self, ingredients):
+        """{category: [ingredients]} in aisle order, skipping empty aisles."""
+        groups = {category: [] for category in CATEGORIES}
+        for ingredient in ingredients:
+            groups[self.categorize(ingredient)].append(ingredient)
+        return {category: items for category, items in groups.items() if items}
+
+
+def categorize_naive(ingredient):
+    """The app's original sequential `contains()` chain, for comparison."""
+    lower = ingredient.lower()
+    for category, keywords in TAXONOMY:
+        if any(keyword in lower for keyword in keywords):
+            return category
+    return OTHER
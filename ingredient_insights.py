@@ -0,0 +1,384 @@
+"""Ingredient insights (role in a dish, diabetes context, substitutions), computed once and shared.
+
+    python ingredient_insights.py --workers 8
+    python ingredient_insights.py recipes.jsonl --client stub --stub-latency 0.2
+
+Insights are keyed on the normalized ingredient name (ingredient_parser's
+key, so "2 cups chopped Tomatoes" and "tomato" are one entry), not on the
+recipe, and live in a table in the user database that every worker and
+restart shares. Each row records the prompt version and model that made
+it; rows from an older version are recomputed on their next use (and
+served as they are if the model is unavailable). The table is capped at
+`max_entries`, dropping the least recently read rows.
+
+Reads go through a per-process LRU of encoded response bodies, so a hot
+ingredient costs a dict lookup. Misses call the model client; concurrent
+misses for one ingredient share a single call.
+
+Run as a script, this is the warm-up job: it collects every distinct
+ingredient in the catalog (the app's recipe store, or a CSV/JSONL file)
+and computes the missing or outdated insights with at most --workers
+model calls in flight.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from ingredient_parser import parse_ingredient
+from single_flight import SingleFlight
+
+# Bump when the prompt or the stored shape changes; older rows are recomputed
+PROMPT_VERSION = 1
+DEFAULT_MODEL = "gpt-3.5-turbo"
+OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+MODEL_TIMEOUT = 15
+MEMORY_ENTRIES = 20000
+MAX_ENTRIES = 200_000
+MAX_NAME_LENGTH = 100
+SUBSTITUTIONS = 3
+# Reads refresh a row's last_used at most this often, so hits rarely write
+TOUCH_EVERY = 86400
+# Stores between checks of the row cap
+PRUNE_EVERY = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingredient_insights (
+    key TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    last_used INTEGER NOT NULL,
+    body TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_ingredient_insights_last_used ON ingredient_insights (last_used)
+"""
+SELECT_INSIGHT = "SELECT version, last_used, body FROM ingredient_insights WHERE key = ?"
+SELECT_CURRENT = "SELECT key FROM ingredient_insights WHERE version = ?"
+UPSERT_INSIGHT = (
+    "INSERT OR REPLACE INTO ingredient_insights (key, version, created_at, last_used, body) VALUES (?, ?, ?, ?, ?)"
+)
+TOUCH_INSIGHT = "UPDATE ingredient_insights SET last_used = ? WHERE key = ?"
+COUNT_INSIGHTS = "SELECT COUNT(*) FROM ingredient_insights"
+EVICT_INSIGHTS = (
+    "DELETE FROM ingredient_insights WHERE key IN "
+    "(SELECT key FROM ingredient_insights ORDER BY last_used LIMIT ?)"
+)
+
+SYSTEM_PROMPT = """You are a diabetes-friendly cooking assistant. Analyze ingredients and provide helpful substitutions for people managing diabetes.
+
+Always respond with valid JSON in exactly this format:
+{
+  "ingredient": "ingredient name",
+  "quickInsight": "Brief explanation of what this ingredient does in recipes (flavor, texture, nutrition) - 1-2 sentences max, friendly tone",
+  "diabetesContext": "How this ingredient affects blood sugar and diabetes management - 1-2 sentences, educational but not medical advice",
+  "substitutions": [
+    {
+      "name": "Substitute name",
+      "icon": "appropriate single emoji like 🧀🥑🌿🥜🍄",
+      "description": "Brief description of the substitute - how it compares",
+      "benefit": "Why it's better for diabetes/health - be specific"
+    }
+  ]
+}
+
+Provide exactly 3 practical substitutions that are:
+1. Diabetes-friendly (lower carbs/sugar/glycemic index)
+2. Available in most grocery stores
+3. Similar cooking behavior or flavor profile
+
+Keep all text concise, friendly, and health-literate. No medical advice, just nutritional information."""
+
+
+class InsightUnavailable(Exception):
+    pass
+
+
+def insight_key(name):
+    """Cache key for an ingredient as written in a recipe; '' if nothing is left."""
+    return parse_ingredient(str(name)[:MAX_NAME_LENGTH]).key
+
+
+def validate_insight(key, data):
+    """The stored shape of a model answer; raises InsightUnavailable if it does not fit."""
+    try:
+        insight = {
+            "ingredient": key,
+            "quickInsight": str(data["quickInsight"]).strip(),
+            "diabetesContext": str(data["diabetesContext"]).strip(),
+            "substitutions": [{
+                "name": str(sub["name"]).strip(),
+                "icon": str(sub.get("icon") or "🥄").strip(),
+                "description": str(sub.get("description", "")).strip(),
+                "benefit": str(sub.get("benefit", "")).strip(),
+            } for sub in data["substitutions"][:SUBSTITUTIONS]],
+        }
+    except (KeyError, TypeError, AttributeError) as e:
+        raise InsightUnavailable(f"Malformed insight for {key!r}: {e}")
+    if not insight["quickInsight"] or not insight["substitutions"]:
+        raise InsightUnavailable(f"Incomplete insight for {key!r}")
+    return insight
+
+
+# === Model clients ===
+class OpenAIClient:
+    """Chat completions with the app's prompt; `insight(key)` returns the parsed JSON."""
+
+    def __init__(self, api_key, model=DEFAULT_MODEL, url=OPENAI_URL, timeout=MODEL_TIMEOUT):
+        self.api_key = api_key
+        self.model = model
+        self.url = url
+        self.timeout = timeout
+
+    def insight(self, key):
+        payload = json.dumps({
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f'Analyze the ingredient "{key}". Provide insights about its role '
+                                            "in recipes and 3 diabetes-friendly substitutions."},
+            ],
+            "max_tokens": 800,
+            "temperature": 0.7,
+        }).encode("utf-8")
+        request = urllib.request.Request(self.url, data=payload, headers={
+            "Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}",
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                content = json.load(response)["choices"][0]["message"]["content"]
+        except urllib.error.HTTPError as e:
+            raise InsightUnavailable(f"Model request failed: {e.code}")
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            raise InsightUnavailable(f"Model request failed: {e}")
+        try:
+            return json.loads(content.replace("```json", "").replace("```", "").strip())
+        except ValueError:
+            raise InsightUnavailable(f"Model answer for {key!r} is not JSON")
+
+
+class StubClient:
+    """Canned insights (the app's offline fallback); `latency` simulates a model round trip."""
+
+    model = "stub"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def insight(self, key):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls += 1
+        if "sugar" in key or "honey" in key:
+            subs = [("Stevia", "🌿", "Natural zero-calorie sweetener", "No impact on blood sugar"),
+                    ("Monk Fruit Sweetener", "🍈", "Natural sweetener with no calories", "Zero glycemic index"),
+                    ("Erythritol", "❄️", "Sugar alcohol with minimal calories", "Very low impact on blood glucose")]
+        elif "rice" in key:
+            subs = [("Cauliflower Rice", "🥦", "Low-carb vegetable alternative", "90% fewer carbs than regular rice"),
+                    ("Brown Rice", "🌾", "Whole grain with more fiber", "Lower glycemic index than white rice"),
+                    ("Quinoa", "🌱", "Protein-rich whole grain", "More protein and fiber")]
+        else:
+            subs = [("Whole Grain Alternative", "🌾", "Choose whole grain versions when possible", "Higher fiber content"),
+                    ("Fresh Herbs", "🌿", "Add flavor without calories", "Rich in antioxidants"),
+                    ("Lean Protein", "🐟", "Help stabilize blood sugar", "Promotes satiety")]
+        return {
+            "ingredient": key,
+            "quickInsight": "This ingredient adds flavor and nutrition to your recipe.",
+            "diabetesContext": "Consider portion size and pairing with protein or fiber for blood sugar management.",
+            "substitutions": [dict(zip(("name", "icon", "description", "benefit"), sub)) for sub in subs],
+        }
+
+
+# === Service ===
+class IngredientInsights:
+    def __init__(self, users, client=None, memory_entries=MEMORY_ENTRIES, max_entries=MAX_ENTRIES):
+        self.users = users
+        self.client = client
+        self.version = f"{PROMPT_VERSION}/{client.model if client else DEFAULT_MODEL}"
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.memory = OrderedDict()  # key -> encoded body, current version only
+        self.lock = threading.Lock()
+        self.flights = SingleFlight()
+        self.stores = 0
+        with users.transaction() as conn:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+
+    def get(self, key):
+        """(encoded JSON body, "hit" | "miss" | "stale") for a normalized key.
+
+        Raises InsightUnavailable when there is no row and the model cannot answer.
+        """
+        with self.lock:
+            body = self.memory.get(key)
+            if body is not None:
+                self.memory.move_to_end(key)
+                return body, "hit"
+        row = self.users.connection().execute(SELECT_INSIGHT, (key,)).fetchone()
+        if row is not None and row[0] == self.version:
+            now = int(time.time())
+            if row[1] + TOUCH_EVERY < now:
+                with self.users.transaction() as conn:
+                    conn.execute(TOUCH_INSIGHT, (now, key))
+            body = row[2].encode("utf-8")
+            self._remember(key, body)
+            return body, "hit"
+        try:
+            return self.flights.do(key, lambda: self.compute(key)), "miss"
+        except InsightUnavailable:
+            if row is None:
+                raise
+            return row[2].encode("utf-8"), "stale"
+
+    def compute(self, key):
+        """Ask the model, store the answer and return its encoded body."""
+        if self.client is None:
+            raise InsightUnavailable("Ingredient insights are not configured")
+        body = json.dumps(validate_insight(key, self.client.insight(key)), ensure_ascii=False)
+        now = int(time.time())
+        with self.users.transaction() as conn:
+            conn.execute(UPSERT_INSIGHT, (key, self.version, now, now, body))
+            self.stores += 1
+            if self.stores % PRUNE_EVERY == 0:
+                self._prune(conn)
+        body = body.encode("utf-8")
+        self._remember(key, body)
+        return body
+
+    def _remember(self, key, body):
+        with self.lock:
+            self.memory[key] = body
+            self.memory.move_to_end(key)
+            if len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def _prune(self, conn):
+        extra = conn.execute(COUNT_INSIGHTS).fetchone()[0] - self.max_entries
+        if extra > 0:
+            conn.execute(EVICT_INSIGHTS, (extra,))
+
+    def prune(self):
+        with self.users.transaction() as conn:
+            self._prune(conn)
+
+    # === Warm-up ===
+    def warm(self, keys, workers=4, progress=None):
+        """Compute insights for `keys` that have no current row, `workers` model calls at a time."""
+        current = {row[0] for row in self.users.connection().execute(SELECT_CURRENT, (self.version,))}
+        report = WarmReport()
+        slots = threading.BoundedSemaphore(workers * 2)
+
+        def run(key):
+            try:
+                self.flights.do(key, lambda: self.compute(key))
+            except InsightUnavailable as e:
+                with report.lock:
+                    report.errors.append((key, str(e)))
+            else:
+                with report.lock:
+                    report.computed += 1
+                    if progress:
+                        progress(report)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for key in keys:
+                report.total += 1
+                if key in current:
+                    report.skipped += 1
+                    continue
+                slots.acquire()
+                pool.submit(run, key)
+        self.prune()
+        return report
+
+
+class WarmReport:
+    def __init__(self):
+        self.total = 0
+        self.computed = 0
+        self.skipped = 0  # already current
+        self.errors = []  # (key, reason)
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        rate = self.computed / self.elapsed if self.elapsed else 0.0
+        return (f"{self.computed}/{self.total} insights computed in {self.elapsed:.1f}s "
+                f"({rate:.1f}/s), {self.skipped} already current, {len(self.errors)} errors")
+
+
+def catalog_ingredients(recipes):
+    """Distinct insight keys over every recipe's ingredients, sorted."""
+    keys = set()
+    for recipe in recipes:
+        for line in recipe.get("ingredients") or ():
+            keys.add(insight_key(line))
+    keys.discard("")
+    return sorted(keys)
+
+
+def make_client(args):
+    if args.client == "stub":
+        return StubClient(args.stub_latency)
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise SystemExit("OPENAI_API_KEY is not set (use --client stub to try the job without it)")
+    return OpenAIClient(api_key, args.model)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Precompute ingredient insights for the recipe catalog.")
+    parser.add_argument("path", nargs="?", help="CSV or JSONL recipes (default: the app's recipe store)")
+    parser.add_argument("--db", help="SQLite path (default $USER_DB_PATH or users.db)")
+    parser.add_argument("--workers", type=int, default=4, help="model calls in flight")
+    parser.add_argument("--client", choices=("openai", "stub"), default="openai")
+    parser.add_argument("--model", default=os.environ.get("INSIGHT_MODEL", DEFAULT_MODEL))
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="stub client: seconds per insight")
+    return parser
+
+
+def main(argv=None):
+    from recipe_store import RecipeStore
+    from user_store import UserStore
+
+    args = build_parser().parse_args(argv)
+    users = UserStore(args.db or os.environ.get("USER_DB_PATH", "users.db"))
+    if args.path:
+        from recipe_importer import ImportReport, normalized, read_rows
+        recipes = [recipe for _, recipe in normalized(read_rows(args.path), ImportReport())]
+    else:
+        recipes = RecipeStore(users).load()
+    keys = catalog_ingredients(recipes)
+    print(f"🥕 {len(keys)} distinct ingredients in {len(recipes)} recipes")
+    insights = IngredientInsights(users, make_client(args))
+
+    def progress(report):
+        print(f"🧠 {report.computed} insights computed ({report.computed / report.elapsed:.1f}/s)", end="\r")
+
+    report = insights.warm(keys, args.workers, progress)
+    print()
+    for key, reason in report.errors[:20]:
+        print(f"⚠️ {key}: {reason}")
+    if len(report.errors) > 20:
+        print(f"⚠️ ... and {len(report.errors) - 20} more")
+    print(f"🎉 {report.summary()}")
+    return report
+
+
+if __name__ == "__main__":
+    report = main()
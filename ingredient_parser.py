@@ -0,0 +1,142 @@
+"""Split free-text ingredient lines into quantity, unit and a normalized key.
+
+    >>> parse_ingredient("1 1/2 cups chopped fresh tomatoes")
+    Ingredient(key='tomato', quantity=354.882, dimension='volume', unit='cup')
+
+The key is what grocery aggregation merges on: lower case, no quantity,
+unit, size or preparation words (RecipeCleanerService's
+ingredientStandardization table), no trailing notes, last word singular.
+Quantities are converted to a base unit per dimension (ml, g or a plain
+count) so "2 tbsp" and "1/4 cup" of the same thing add up.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# RecipeCleanerService.ingredientStandardization, verbatim
+INGREDIENT_STANDARDIZATION = {
+    "saut": "sauté", "saute": "sauté", "sautee": "sauté",
+    "diced": "", "chopped": "", "minced": "", "sliced": "",
+    "to taste": "", "as needed": "", "optional": "", "preferably": "",
+    "fresh or frozen": "", "fresh": "", "frozen": "", "canned": "", "organic": "",
+    "for serving": "", "for garnish": "", "for drizzling": "",
+    "about": "", "approximately": "", "roughly": "",
+    "1 cup": "", "2 cups": "", "1 tablespoon": "", "1 tbsp": "",
+    "1 teaspoon": "", "1 tsp": "", "1/2 cup": "", "1/4 cup": "",
+    "1/3 cup": "", "2/3 cup": "", "3/4 cup": "",
+}
+SIZE_WORDS = ("extra large", "large", "medium", "small", "jumbo")
+
+# canonical unit -> (dimension, amount in the dimension's base unit)
+UNITS = {
+    "cup": ("volume", 236.588), "tbsp": ("volume", 14.787), "tsp": ("volume", 4.929),
+    "ml": ("volume", 1.0), "l": ("volume", 1000.0),
+    "oz": ("mass", 28.3495), "lb": ("mass", 453.592), "g": ("mass", 1.0), "kg": ("mass", 1000.0),
+    "clove": ("clove", 1.0), "slice": ("slice", 1.0), "can": ("can", 1.0), "package": ("package", 1.0),
+    "pinch": ("pinch", 1.0), "dash": ("dash", 1.0), "handful": ("handful", 1.0),
+    "bunch": ("bunch", 1.0), "sprig": ("sprig", 1.0), "stalk": ("stalk", 1.0), "piece": ("count", 1.0),
+}
+UNIT_ALIASES = {
+    "cups": "cup", "c": "cup", "tablespoon": "tbsp", "tablespoons": "tbsp", "tbsps": "tbsp", "tbs": "tbsp",
+    "teaspoon": "tsp", "teaspoons": "tsp", "tsps": "tsp", "milliliter": "ml", "milliliters": "ml",
+    "liter": "l", "liters": "l", "litre": "l", "litres": "l", "ounce": "oz", "ounces": "oz",
+    "pound": "lb", "pounds": "lb", "lbs": "lb", "gram": "g", "grams": "g", "kilogram": "kg",
+    "kilograms": "kg", "cloves": "clove", "slices": "slice", "cans": "can", "packages": "package",
+    "pkg": "package", "pinches": "pinch", "dashes": "dash", "handfuls": "handful", "bunches": "bunch",
+    "sprigs": "sprig", "stalks": "stalk", "pieces": "piece",
+}
+# Units offered back to the user, largest first, per dimension
+DISPLAY_UNITS = {"volume": ("l", "cup", "tbsp", "tsp", "ml"), "mass": ("kg", "lb", "oz", "g")}
+
+FRACTIONS = {"½": 0.5, "¼": 0.25, "¾": 0.75, "⅓": 1 / 3, "⅔": 2 / 3, "⅛": 0.125}
+_NUMBER = r"(?:\d+\s+\d+/\d+|\d+/\d+|\d*\.\d+|\d+(?:\s*[½¼¾⅓⅔⅛])?|[½¼¾⅓⅔⅛]|an?\b)"
+QUANTITY_RE = re.compile(rf"^\s*({_NUMBER})(?:\s*(?:-|–|to)\s*({_NUMBER}))?\s*")
+UNIT_RE = re.compile(
+    r"^(" + "|".join(sorted(map(re.escape, set(UNITS) | set(UNIT_ALIASES)), key=len, reverse=True))
+    + r")\b\.?\s*(?:of\s+)?"
+)
+PARENTHETICAL_RE = re.compile(r"\([^)]*\)")
+# One alternation for the whole standardization table and the size words
+STANDARDIZE_RE = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, list(INGREDIENT_STANDARDIZATION) + list(SIZE_WORDS)),
+                             key=len, reverse=True)) + r")\b"
+)
+PUNCTUATION_RE = re.compile(r"[^\w\sé&'-]+")
+SPACES_RE = re.compile(r"\s+")
+
+Ingredient = namedtuple("Ingredient", "key quantity dimension unit")
+
+
+def parse_number(text):
+    text = text.strip()
+    if text in ("a", "an"):
+        return 1.0
+    total = 0.0
+    for part in text.split():
+        if "/" in part:
+            num, den = part.split("/")
+            total += int(num) / int(den) if int(den) else 0.0
+        elif part[-1] in FRACTIONS:
+            total += (float(part[:-1]) if part[:-1] else 0.0) + FRACTIONS[part[-1]]
+        else:
+            total += float(part)
+    return total
+
+
+def singular(word):
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("aves", "lves")):
+        return word[:-3] + "f"
+    if word.endswith(("oes", "ches", "shes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")) and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def normalize_name(text):
+    """Merge key for an ingredient name with quantity and unit already removed."""
+    name = text.split(",", 1)[0]
+    name = STANDARDIZE_RE.sub(lambda m: INGREDIENT_STANDARDIZATION.get(m.group(1), ""), name)
+    name = SPACES_RE.sub(" ", PUNCTUATION_RE.sub(" ", name)).strip(" -'")
+    if not name:
+        return ""
+    words = name.split(" ")
+    words[-1] = singular(words[-1])
+    return " ".join(words)
+
+
+@lru_cache(maxsize=65536)
+def parse_ingredient(line):
+    """Parse one ingredient line. Quantity is in the dimension's base unit, or None."""
+    text = PARENTHETICAL_RE.sub(" ", str(line).lower()).strip()
+    quantity = dimension = unit = None
+    match = QUANTITY_RE.match(text)
+    if match:
+        # For ranges ("2-3 cloves") shop for the upper bound
+        quantity = parse_number(match.group(2) or match.group(1))
+        text = text[match.end():]
+    unit_match = UNIT_RE.match(text)
+    if unit_match and (quantity is not None or unit_match.group(1) in UNITS):
+        unit = UNIT_ALIASES.get(unit_match.group(1), unit_match.group(1))
+        text = text[unit_match.end():]
+    key = normalize_name(text)
+    if quantity is not None:
+        dimension, factor = UNITS[unit] if unit else ("count", 1.0)
+        quantity *= factor
+    elif unit is not None:
+        dimension = UNITS[unit][0]
+    return Ingredient(key, quantity, dimension, unit)
+
+
+def display_quantity(quantity, dimension, units_seen):
+    """(amount, unit) for a merged base-unit quantity, preferring units the recipes used."""
+    if dimension not in DISPLAY_UNITS:
+        return round(quantity, 2), (None if dimension == "count" else dimension)
+    candidates = [u for u in DISPLAY_UNITS[dimension] if u in units_seen] or list(DISPLAY_UNITS[dimension])
+    if len(candidates) == 1:
+        unit = candidates[0]
+    else:
+        unit = next((u for u in candidates if quantity / UNITS[u][1] >= 1), candidates[-1])
+    return round(quantity / UNITS[unit][1], 2), unit
@@ -0,0 +1,227 @@
+"""Multi-day meal plans that stay within a user's daily goals.
+
+Each day is a breakfast/lunch/dinner/snack choice solved exactly as a
+multiple-choice knapsack over discretized macros: a numpy DP table over
+(carb, sugar, calorie) units, one pass per meal slot. What makes that
+cheap is the per-slot candidate table built once at startup: recipes of
+the slot's categories, bucketed by their macro units and sorted by cost
+within each bucket. A day's DP only sees the best unused recipe of each
+bucket, minus buckets another bucket dominates.
+
+Recipe macros are rounded up and goals down, so a plan that fits in units
+always fits the real goals. A recipe's cost is its glycemic-index penalty
+minus the share of the budget it fills, so plans use the budget and, among
+similar fills, pick lower-GI recipes. Recipes are never repeated within
+one plan.
+
+Goals beyond what four recipes of the catalog can add up to are clamped
+to that, so the table is sized by the catalog, not by the goals. Days are
+solved one after another against a deadline, checked between candidate
+passes; a day cut short and the days after it are filled greedily, so a
+plan always comes back in bounded time.
+"""
+import math
+import time
+
+import numpy as np
+
+SLOTS = ("breakfast", "lunch", "dinner", "snack")
+# Recipe categories each slot draws from (lower case)
+SLOT_CATEGORIES = {
+    "breakfast": ("breakfast",),
+    "lunch": ("lunch",),
+    "dinner": ("dinner",),
+    "snack": ("snack", "snacks", "dessert"),
+}
+CARB_UNIT = 5.0
+SUGAR_UNIT = 2.5
+CALORIE_UNIT = 100.0
+GI_WEIGHT = 0.5
+DEFAULT_GI = 55
+# Cost of leaving a slot empty; only taken when nothing else fits
+SKIP_COST = 1.0
+DEFAULT_TIME_BUDGET = 0.5
+# Days whose DP table would be larger are planned greedily (about 32 bytes a cell)
+MAX_TABLE_CELLS = 1_000_000
+
+
+def units(value, unit):
+    return int(math.ceil(round(value / unit, 6)))
+
+
+def bucket_key(recipe):
+    return (units(recipe["carbs"], CARB_UNIT), units(recipe["sugar"], SUGAR_UNIT),
+            units(recipe.get("calories") or 0, CALORIE_UNIT))
+
+
+def gi_order(recipe):
+    return (recipe.get("glycemic_index") or DEFAULT_GI, recipe["id"])
+
+
+class SlotTable:
+    """One slot's candidates: recipes grouped by macro units, cheapest first."""
+
+    def __init__(self, recipes):
+        self.buckets = {}
+        for recipe in recipes:
+            self.buckets.setdefault(bucket_key(recipe), []).append(recipe)
+        for members in self.buckets.values():
+            members.sort(key=gi_order)
+        self.ranked = sorted(recipes, key=gi_order)
+
+    def best_unused(self, key, used):
+        for recipe in self.buckets[key]:
+            if recipe["id"] not in used:
+                return recipe
+        return None
+
+
+def recipe_cost(recipe, goals):
+    """GI penalty minus the share of the daily budget the recipe fills."""
+    fill = recipe["carbs"] / max(goals["carbs"], CARB_UNIT)
+    dims = 1
+    if goals.get("calories"):
+        fill += (recipe.get("calories") or 0) / goals["calories"]
+        dims += 1
+    gi = recipe.get("glycemic_index") or DEFAULT_GI
+    return GI_WEIGHT * gi / 100.0 - fill / dims
+
+
+class MealPlanner:
+    def __init__(self, recipes):
+        usable = [r for r in recipes if r.get("carbs") is not None and r.get("sugar") is not None]
+        self.tables = {}
+        for slot in SLOTS:
+            members = [r for r in usable if str(r.get("category", "")).lower() in SLOT_CATEGORIES[slot]]
+            # A catalog without the slot's category still gets a full plan
+            self.tables[slot] = SlotTable(members or usable)
+        # Most units of each macro one recipe per slot can add up to
+        self.max_units = tuple(
+            sum(max((key[d] for key in self.tables[slot].buckets), default=0) for slot in SLOTS) for d in range(3))
+
+    def plan(self, goals, days, time_budget=DEFAULT_TIME_BUDGET):
+        """Plan `days` days for goals {carbs, sugar[, calories]}.
+
+        Returns (days, complete): each day is {slot: recipe or None};
+        complete is False when the deadline forced greedy days.
+        """
+        deadline = time.perf_counter() + time_budget
+        carbs, sugar, calories = self.max_units
+        limits = (min(int(goals["carbs"] // CARB_UNIT), carbs), min(int(goals["sugar"] // SUGAR_UNIT), sugar),
+                  min(int(goals["calories"] // CALORIE_UNIT), calories) if goals.get("calories") else None)
+        exact = (limits[0] + 1) * (limits[1] + 1) * ((limits[2] or 0) + 1) <= MAX_TABLE_CELLS
+        used = set()
+        plan = []
+        complete = True
+        for _ in range(days):
+            day = self.solve_day(goals, limits, used, deadline) if complete and exact else None
+            if day is None:
+                complete = False
+                day = self.greedy_day(goals, used)
+            used.update(r["id"] for r in day.values() if r is not None)
+            plan.append(day)
+        return plan, complete
+
+    # === Exact day ===
+    def candidates(self, slot, goals, limits, used):
+        """(unit keys, costs, recipes) for the slot's non-dominated buckets that fit the limits."""
+        table = self.tables[slot]
+        keys, costs, picks = [], [], []
+        for key in table.buckets:
+            if key[0] > limits[0] or key[1] > limits[1] or (limits[2] is not None and key[2] > limits[2]):
+                continue
+            recipe = table.best_unused(key, used)
+            if recipe is None:
+                continue
+            keys.append(key if limits[2] is not None else key[:2] + (0,))
+            costs.append(recipe_cost(recipe, goals))
+            picks.append(recipe)
+        if not keys:
+            return np.zeros((0, 3), dtype=np.int64), np.zeros(0), []
+        keys, costs = np.array(keys, dtype=np.int64), np.array(costs)
+        # Drop buckets that a bucket with no more of any macro beats on cost:
+        # a prefix minimum over the unit grid, excluding the bucket's own cell
+        grid = np.full(tuple(keys.max(axis=0) + 2), np.inf)
+        grid[tuple((keys + 1).T)] = costs
+        for axis in range(3):
+            np.minimum.accumulate(grid, axis=axis, out=grid)
+        a, b, c = (keys + 1).T
+        cheaper = np.minimum(np.minimum(grid[a - 1, b, c], grid[a, b - 1, c]), grid[a, b, c - 1])
+        keep = np.flatnonzero(cheaper > costs)
+        return keys[keep], costs[keep], [picks[i] for i in keep]
+
+    def solve_day(self, goals, limits, used, deadline=math.inf):
+        """{slot: recipe or None} for the cheapest day, or None if `deadline` passes first."""
+        shape = (limits[0] + 1, limits[1] + 1, (limits[2] if limits[2] is not None else 0) + 1)
+        cost = np.full(shape, np.inf)
+        cost[0, 0, 0] = 0.0
+        steps = []
+        for slot in SLOTS:
+            keys, costs, picks = self.candidates(slot, goals, limits, used)
+            # Choice -1 means the slot stays empty
+            new = cost + SKIP_COST
+            choice = np.full(shape, -1, dtype=np.int32)
+            for j, ((a, b, c), w) in enumerate(zip(keys.tolist(), costs.tolist())):
+                if time.perf_counter() > deadline:
+                    return None
+                source = cost[:shape[0] - a, :shape[1] - b, :shape[2] - c] + w
+                target = new[a:, b:, c:]
+                better = source < target
+                target[better] = source[better]
+                choice[a:, b:, c:][better] = j
+            cost = new
+            steps.append((slot, keys, picks, choice))
+
+        state = np.unravel_index(int(np.argmin(cost)), shape)
+        day = {}
+        taken = set()
+        for slot, keys, picks, choice in reversed(steps):
+            j = int(choice[state])
+            if j < 0:
+                day[slot] = None
+                continue
+            recipe = picks[j]
+            if recipe["id"] in taken:
+                # Only possible when slots share a category table
+                recipe = self.tables[slot].best_unused(bucket_key(recipe), used | taken)
+            day[slot] = recipe
+            if recipe is not None:
+                taken.add(recipe["id"])
+            state = tuple(int(s - k) for s, k in zip(state, keys[j]))
+        return {slot: day[slot] for slot in SLOTS}
+
+    # === Fallback ===
+    def greedy_day(self, goals, used):
+        """Lowest-GI unused recipe per slot within an even share of what is left."""
+        left = [goals["carbs"], goals["sugar"], goals.get("calories") or math.inf]
+        day = {}
+        for n, slot in enumerate(SLOTS):
+            share = [amount / (len(SLOTS) - n) for amount in left]
+            pick = None
+            # Prefer a recipe within the slot's share, else anything that still fits
+            for limit in (share, left):
+                pick = next((r for r in self.tables[slot].ranked if r["id"] not in used and fits(r, limit)), None)
+                if pick is not None:
+                    break
+            day[slot] = pick
+            if pick is not None:
+                used = used | {pick["id"]}
+                left = [amount - value for amount, value in zip(left, macros(pick))]
+        return day
+
+
+def macros(recipe):
+    return recipe["carbs"], recipe["sugar"], recipe.get("calories") or 0
+
+
+def fits(recipe, limit):
+    return all(value <= amount for value, amount in zip(macros(recipe), limit))
+
+
+def day_totals(day):
+    meals = [r for r in day.values() if r is not None]
+    return {
+        "carbs": round(sum(r["carbs"] for r in meals), 1),
+        "sugar": round(sum(r["sugar"] for r in meals), 1),
+        "calories": round(sum(r.get("calories") or 0 for r in meals), 1),
+    }
@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+DEFAULT_ROUNDS = 12
+
+
+class PasswordPoolBusy(Exception):
+    """Raised instead of queueing when every hashing slot is taken."""
+
+
+# Run inside the worker processes
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _verify(password, password_hash):
+    return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+
+
+def hash_rounds(password_hash):
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12), or None if unparseable."""
+    try:
+        return int(password_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """bcrypt in a dedicated process pool so hashing never runs on request threads.
+
+    At most ``workers + queue_size`` jobs are admitted at once; beyond that
+    callers get PasswordPoolBusy straight away rather than waiting behind a
+    login storm. The pool is started on first use, so a pre-fork server gets
+    one pool per worker process.
+    """
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=None, queue_size=None, timeout=10):
+        self.rounds = rounds
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.queue_size = self.workers * 4 if queue_size is None else queue_size
+        self.timeout = timeout
+        self.pool = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+
+    def _executor(self):
+        with self.lock:
+            if self.pool is None or self.pid != os.getpid():
+                # forkserver/spawn: workers start clean instead of inheriting
+                # the server's threads, sockets and database connections
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(method),
+                )
+                self.pid = os.getpid()
+            return self.pool
+
+    def _submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise PasswordPoolBusy()
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def _run(self, fn, *args):
+        try:
+            return self._submit(fn, *args).result(self.timeout)
+        except TimeoutError:
+            raise PasswordPoolBusy()
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for the next caller
+            with self.lock:
+                self.pool = None
+            raise PasswordPoolBusy()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, password_hash):
+        return self._run(_verify, password, password_hash)
+
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
+
+    def rehash_later(self, password, on_done):
+        """Re-hash at the current cost in the background and hand the new hash to on_done.
+
+        Best effort: skipped when the pool is saturated, it will be retried
+        on the user's next login.
+        """
+        try:
+            future = self._submit(_hash, password, self.rounds)
+        except PasswordPoolBusy:
+            return
+        future.add_done_callback(lambda f: f.exception() is None and on_done(f.result()))
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None and self.pid == os.getpid():
+                self.pool.shutdown(wait=True)
+            self.pool = None
@@ -0,0 +1,304 @@
+"""Offline OpenFoodFacts product index with precomputed diabetes ratings.
+
+    python product_index.py build openfoodfacts-products.jsonl.gz products.idx
+    python product_index.py build en.openfoodfacts.org.products.csv.gz products.idx
+    python product_index.py lookup products.idx 3017620422003
+
+The index file is one sorted array of fixed-width barcode keys, a parallel
+array of fixed-width nutrition records (with the rating already computed)
+and a heap of JSON blobs for the display strings. It is memory-mapped, so a
+lookup is a binary search that touches a few pages, and a server with
+millions of products only keeps the pages it actually reads.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import struct
+import sys
+from array import array
+
+import numpy as np
+
+MAGIC = b"DMPIDX01"
+HEADER = struct.Struct("<8sQQ")  # magic, product count, heap offset
+KEY_WIDTH = 16
+NUTRIENTS = ("calories", "carbs", "sugars", "added_sugars", "fiber", "protein", "fat", "sodium")
+# OpenFoodFacts per-100g field for each nutrient
+OFF_FIELDS = {
+    "calories": "energy-kcal_100g",
+    "carbs": "carbohydrates_100g",
+    "sugars": "sugars_100g",
+    "added_sugars": "added-sugars_100g",
+    "fiber": "fiber_100g",
+    "protein": "proteins_100g",
+    "fat": "fat_100g",
+    "sodium": "sodium_100g",
+}
+RECORD = np.dtype(
+    [(n, "<f4") for n in NUTRIENTS]
+    + [("heap_offset", "<u8"), ("heap_length", "<u4"), ("score", "<i2"), ("rating", "u1"), ("reasons", "<u2")]
+)
+
+# Same thresholds as BarcodeScannerService._calculateDiabetesRating in the app
+RATINGS = ("friendly", "caution", "avoid")
+RATING_TEXT = {
+    "friendly": ("Diabetes-Friendly", "🟢", "This product has characteristics that make it suitable for people managing diabetes. It's relatively low in sugar and/or high in fiber."),
+    "caution": ("Use Caution", "🟡", "This product should be consumed mindfully. Consider portion sizes and pair with protein or healthy fats to minimize blood sugar impact."),
+    "avoid": ("Consider Avoiding", "🔴", "This product is high in sugar and/or carbohydrates with little fiber, which may cause significant blood sugar spikes."),
+}
+# (bit, template) in the order the app lists reasons
+REASONS = (
+    (1 << 0, "High sugar content ({sugars:.1f}g per 100g)"),
+    (1 << 1, "Moderate sugar content ({sugars:.1f}g per 100g)"),
+    (1 << 2, "Low sugar content ({sugars:.1f}g per 100g)"),
+    (1 << 3, "High carbohydrate content ({carbs:.1f}g per 100g)"),
+    (1 << 4, "Moderate carbohydrate content ({carbs:.1f}g per 100g)"),
+    (1 << 5, "Good fiber content ({fiber:.1f}g per 100g)"),
+    (1 << 6, "Low fiber content ({fiber:.1f}g per 100g)"),
+    (1 << 7, "High net carbs ({net_carbs:.1f}g per 100g)"),
+    (1 << 8, "Contains added sugars ({added_sugars:.1f}g per 100g)"),
+    (1 << 9, "Good protein content helps stabilize blood sugar"),
+)
+
+
+# === Scoring ===
+def score_arrays(columns):
+    """Vectorized diabetes rating over parallel nutrient arrays (per 100 g).
+
+    Missing values (NaN) count as 0, as in the app. Returns
+    (score clamped to 0..100, rating index into RATINGS, reason bitmask).
+    """
+    get = lambda name: np.nan_to_num(np.asarray(columns.get(name, 0), dtype=np.float64), nan=0.0)
+    sugars, carbs, fiber = get("sugars"), get("carbs"), get("fiber")
+    added, protein = get("added_sugars"), get("protein")
+    n = np.broadcast(sugars, carbs, fiber, added, protein).shape
+    net = np.clip(carbs - fiber, 0, None)
+
+    conditions = (
+        (sugars > 20, -40),
+        ((sugars > 10) & (sugars <= 20), -20),
+        (sugars < 5, 0),
+        (carbs > 45, -30),
+        ((carbs > 30) & (carbs <= 45), -15),
+        (fiber >= 5, 10),
+        (fiber < 2, -10),
+        (net > 40, -25),
+        (added > 15, -20),
+        (protein >= 10, 5),
+    )
+    score = np.full(n, 100, dtype=np.int64)
+    reasons = np.zeros(n, dtype=np.uint16)
+    for (bit, _), (mask, delta) in zip(REASONS, conditions):
+        score += np.where(mask, delta, 0)
+        reasons |= np.where(mask, bit, 0).astype(np.uint16)
+    rating = np.where(score >= 70, 0, np.where(score >= 40, 1, 2)).astype(np.uint8)
+    return np.clip(score, 0, 100).astype(np.int16), rating, reasons
+
+
+def describe_rating(score, rating, reasons, nutrition):
+    values = {k: (v if v is not None else 0.0) for k, v in nutrition.items()}
+    values["net_carbs"] = max(values.get("carbs", 0.0) - values.get("fiber", 0.0), 0.0)
+    name = RATINGS[int(rating)]
+    display_text, emoji, explanation = RATING_TEXT[name]
+    return {
+        "rating": name,
+        "display_text": display_text,
+        "emoji": emoji,
+        "explanation": explanation,
+        "reasons": [template.format(**values) for bit, template in REASONS if int(reasons) & bit],
+        "score": int(score),
+    }
+
+
+def rate_products(products):
+    """Rate a batch of {nutrient: value} dicts in one vectorized pass."""
+    columns = {
+        name: np.array([_number(p.get(name)) for p in products], dtype=np.float64)
+        for name in NUTRIENTS
+    }
+    scores, ratings, reasons = score_arrays(columns)
+    return [
+        describe_rating(scores[i], ratings[i], reasons[i], {n: _number(p.get(n)) for n in NUTRIENTS})
+        for i, p in enumerate(products)
+    ]
+
+
+def _number(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+
+def normalize_barcode(code):
+    """Digits-only barcode left-padded to the key width (UPC-A and EAN-13 forms collide on purpose)."""
+    code = str(code or "").strip()
+    if not code.isdigit() or len(code) > KEY_WIDTH:
+        return None
+    return code.zfill(KEY_WIDTH).encode("ascii")
+
+
+# === Lookups ===
+class ProductIndex:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, count, heap_offset = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a product index")
+        self.count = count
+        keys_offset = HEADER.size
+        records_offset = keys_offset + count * KEY_WIDTH
+        self.keys = np.memmap(path, dtype=f"S{KEY_WIDTH}", mode="r", offset=keys_offset, shape=(count,)) if count else np.empty(0, f"S{KEY_WIDTH}")
+        self.records = np.memmap(path, dtype=RECORD, mode="r", offset=records_offset, shape=(count,)) if count else np.empty(0, RECORD)
+        self.heap = np.memmap(path, dtype=np.uint8, mode="r", offset=heap_offset) if os.path.getsize(path) > heap_offset else np.empty(0, np.uint8)
+
+    def find(self, barcode):
+        key = normalize_barcode(barcode)
+        if key is None or not self.count:
+            return None
+        pos = int(np.searchsorted(self.keys, key))
+        if pos < self.count and self.keys[pos] == key:
+            return pos
+        return None
+
+    def get(self, barcode):
+        pos = self.find(barcode)
+        if pos is None:
+            return None
+        record = self.records[pos]
+        start = int(record["heap_offset"])
+        info = json.loads(self.heap[start:start + int(record["heap_length"])].tobytes())
+        nutrition = {n: (None if np.isnan(record[n]) else round(float(record[n]), 2)) for n in NUTRIENTS}
+        return {
+            "barcode": self.keys[pos].decode("ascii").lstrip("0") or "0",
+            "product_name": info.get("n") or "Unknown Product",
+            "brand": info.get("b") or "Unknown Brand",
+            "image_url": info.get("img") or "",
+            "ingredients": [i.strip() for i in (info.get("i") or "").split(",") if i.strip()],
+            "nutrition": nutrition,
+            "net_carbs": round(max((nutrition["carbs"] or 0.0) - (nutrition["fiber"] or 0.0), 0.0), 2),
+            "diabetes_rating": describe_rating(record["score"], record["rating"], record["reasons"], nutrition),
+        }
+
+    def ratings(self, barcodes):
+        """Precomputed ratings for many barcodes; None where the barcode is unknown."""
+        results = {}
+        for barcode in barcodes:
+            pos = self.find(barcode)
+            if pos is None:
+                results[barcode] = None
+                continue
+            record = self.records[pos]
+            nutrition = {n: (None if np.isnan(record[n]) else float(record[n])) for n in NUTRIENTS}
+            results[barcode] = describe_rating(record["score"], record["rating"], record["reasons"], nutrition)
+        return results
+
+
+# === Building ===
+def _open_text(path):
+    raw = gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+    return io.TextIOWrapper(raw, encoding="utf-8", errors="replace", newline="")
+
+
+def read_dump(path):
+    """Yield (code, nutrients, info) from an OFF JSONL dump or tab-separated CSV export."""
+    name = path[:-3] if path.endswith(".gz") else path
+    with _open_text(path) as f:
+        if name.endswith((".jsonl", ".json")):
+            for line in f:
+                try:
+                    product = json.loads(line)
+                except ValueError:
+                    continue
+                nutriments = product.get("nutriments") or {}
+                yield (product.get("code"),
+                       {n: _number(nutriments.get(field)) for n, field in OFF_FIELDS.items()},
+                       {"n": product.get("product_name"), "b": product.get("brands"),
+                        "i": product.get("ingredients_text"), "img": product.get("image_front_url")})
+        else:
+            csv.field_size_limit(sys.maxsize)
+            for row in csv.DictReader(f, delimiter="\t"):
+                yield (row.get("code"),
+                       {n: _number(row.get(field)) for n, field in OFF_FIELDS.items()},
+                       {"n": row.get("product_name"), "b": row.get("brands"),
+                        "i": row.get("ingredients_text"), "img": row.get("image_url")})
+
+
+def build(dump_path, out_path):
+    """Stream a dump into a sorted, memory-mappable index. Returns the product count.
+
+    Only the fixed-width columns are held in memory while building; display
+    strings go straight to a temporary heap file. Later duplicates of a
+    barcode win.
+    """
+    tmp_heap = out_path + ".heap.tmp"
+    # Compact typed buffers rather than lists of Python objects
+    keys, offsets, lengths = bytearray(), array("Q"), array("I")
+    columns = {n: array("f") for n in NUTRIENTS}
+    heap_size = 0
+    with open(tmp_heap, "wb") as heap:
+        for code, nutrients, info in read_dump(dump_path):
+            key = normalize_barcode(code)
+            if key is None:
+                continue
+            blob = json.dumps({k: v for k, v in info.items() if v}, separators=(",", ":")).encode("utf-8")
+            heap.write(blob)
+            keys += key
+            for n in NUTRIENTS:
+                columns[n].append(np.nan if nutrients[n] is None else nutrients[n])
+            offsets.append(heap_size)
+            lengths.append(len(blob))
+            heap_size += len(blob)
+
+    keys = np.frombuffer(bytes(keys), dtype=f"S{KEY_WIDTH}")
+    # Stable sort, then keep the last row of each run of equal keys
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    keep = np.ones(len(keys), dtype=bool)
+    keep[:-1] = keys[1:] != keys[:-1]
+    order, keys = order[keep], keys[keep]
+
+    records = np.zeros(len(keys), dtype=RECORD)
+    for n in NUTRIENTS:
+        records[n] = np.frombuffer(columns[n], dtype=np.float32)[order]
+    records["heap_offset"] = np.frombuffer(offsets, dtype=np.uint64)[order]
+    records["heap_length"] = np.frombuffer(lengths, dtype=np.uint32)[order]
+    records["score"], records["rating"], records["reasons"] = score_arrays({n: records[n] for n in NUTRIENTS})
+
+    heap_offset = HEADER.size + keys.nbytes + records.nbytes
+    tmp_out = out_path + ".tmp"
+    with open(tmp_out, "wb") as out, open(tmp_heap, "rb") as heap:
+        out.write(HEADER.pack(MAGIC, len(keys), heap_offset))
+        out.write(keys.tobytes())
+        out.write(records.tobytes())
+        while True:
+            block = heap.read(1 << 20)
+            if not block:
+                break
+            out.write(block)
+    os.remove(tmp_heap)
+    os.replace(tmp_out, out_path)
+    return len(keys)
+
+
+def main(argv):
+    if len(argv) == 3 and argv[0] == "build":
+        count = build(argv[1], argv[2])
+        print(f"✅ Indexed {count} products into {argv[2]}")
+    elif len(argv) == 3 and argv[0] == "lookup":
+        print(json.dumps(ProductIndex(argv[1]).get(argv[2]), indent=2, ensure_ascii=False))
+    else:
+        print("Usage: python product_index.py build <dump.jsonl[.gz]|dump.csv[.gz]> <out.idx>\n"
+              "       python product_index.py lookup <index.idx> <barcode>")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
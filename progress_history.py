@@ -0,0 +1,114 @@
+import datetime
+
+import numpy as np
+
+BUCKETS = ("day", "week", "month")
+# date(1970, 1, 1).toordinal(); converts ordinals to datetime64[D]
+EPOCH_ORDINAL = 719163
+
+
+class DayColumns:
+    """Per-day totals for one user as one float64 array per field.
+
+    Slot ``i`` holds the totals of day ``start + i`` (proleptic ordinal);
+    days with no data are NaN. Serialized as raw little-endian bytes, so a
+    year of history is ~3 KB per field.
+    """
+
+    def __init__(self, fields, start=None, arrays=None):
+        self.fields = tuple(fields)
+        self.start = start
+        self.arrays = arrays or {f: np.empty(0) for f in self.fields}
+
+    @classmethod
+    def from_blobs(cls, fields, start, blobs):
+        arrays = {f: np.frombuffer(b, dtype="<f8").copy() for f, b in zip(fields, blobs)}
+        return cls(fields, start, arrays)
+
+    def to_blobs(self):
+        return [self.arrays[f].astype("<f8").tobytes() for f in self.fields]
+
+    def __len__(self):
+        return len(self.arrays[self.fields[0]])
+
+    def add(self, day, amounts):
+        """Add amounts to `day` (an ordinal), growing the columns as needed."""
+        if self.start is None:
+            self.start = day
+        if day < self.start:
+            pad = np.full(self.start - day, np.nan)
+            self.arrays = {f: np.concatenate([pad, a]) for f, a in self.arrays.items()}
+            self.start = day
+        index = day - self.start
+        if index >= len(self):
+            pad = np.full(index + 1 - len(self), np.nan)
+            self.arrays = {f: np.concatenate([a, pad]) for f, a in self.arrays.items()}
+        for field in self.fields:
+            column = self.arrays[field]
+            if np.isnan(column[index]):
+                column[index] = 0
+            column[index] += amounts.get(field, 0)
+
+    def window(self, first, last):
+        """Columns for days first..last inclusive, NaN outside the stored range."""
+        length = last - first + 1
+        out = {f: np.full(length, np.nan) for f in self.fields}
+        if self.start is None:
+            return out
+        lo = max(first, self.start)
+        hi = min(last, self.start + len(self) - 1)
+        if lo <= hi:
+            for field in self.fields:
+                out[field][lo - first:hi - first + 1] = self.arrays[field][lo - self.start:hi - self.start + 1]
+        return out
+
+    def aggregate(self, first, last, bucket="day", goals=None):
+        """Sum, mean and days-over-goal per bucket over days first..last.
+
+        Means only count days that have data. Days-over-goal compares each
+        day against the user's current goals.
+        """
+        # Goals predating validation may be any JSON value
+        goals = goals if isinstance(goals, dict) else {}
+        columns = self.window(first, last)
+        days = (np.arange(first, last + 1) - EPOCH_ORDINAL).astype("datetime64[D]")
+        if bucket == "week":
+            # 1970-01-01 was a Thursday; shift to the Monday of each ISO week
+            keys = days - (days.astype(np.int64) + 3) % 7
+        elif bucket == "month":
+            keys = days.astype("datetime64[M]")
+        else:
+            keys = days
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+
+        has_data = ~np.isnan(columns[self.fields[0]])
+        counts = np.add.reduceat(has_data.astype(np.int64), starts)
+        stats = {}
+        for field in self.fields:
+            values = columns[field]
+            valid = ~np.isnan(values)
+            sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+            goal = goals.get(field)
+            over = None
+            if isinstance(goal, (int, float)) and not isinstance(goal, bool):
+                over = np.add.reduceat((valid & (values > goal)).astype(np.int64), starts)
+            stats[field] = (sums, over)
+
+        buckets = []
+        for i, start in enumerate(starts):
+            entry = {
+                "start": str(keys[start].astype("datetime64[D]")),
+                "days": int(counts[i]),
+            }
+            for field, (sums, over) in stats.items():
+                entry[field] = {
+                    "sum": float(sums[i]),
+                    "mean": float(sums[i] / counts[i]) if counts[i] else None,
+                    "days_over_goal": int(over[i]) if over is not None else None,
+                }
+            buckets.append(entry)
+        return buckets
+
+
+def to_ordinal(day):
+    return datetime.date.fromisoformat(day).toordinal()
@@ -0,0 +1,334 @@
+"""Near-duplicate recipe detection with MinHash signatures and LSH banding.
+
+    python recipe_dedup.py curated_recipes_harvest.jsonl --report dedup_report.json --output canonical.jsonl
+    python recipe_dedup.py new_batch.jsonl --state dedup_state.npz --output new_canonical.jsonl
+    python recipe_importer.py new_canonical.jsonl --target app --clean
+
+Each recipe becomes a set of shingles (title words and word pairs without
+filler like "easy" or "keto", plus normalized ingredient keys), hashed into
+a NUM_PERM-value MinHash signature. Signatures are cut into BANDS bands;
+recipes sharing any band are candidates, and candidates whose signatures
+agree on at least `threshold` of their values are merged into one
+cluster. Each cluster's canonical recipe is the one with the best
+quality_score (then approved, then the most detailed).
+
+Band tables are sorted numpy arrays, so matching a batch is a few
+searchsorted calls per band and never compares all pairs. With --state the
+index is saved after each run, and later batches are matched against
+everything seen before.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import zlib
+
+import numpy as np
+
+from ingredient_parser import parse_ingredient
+from recipe_store import source_key
+
+NUM_PERM = 64
+BANDS = 16  # 4 rows per band: a pair at 0.7 similarity shares a band 99% of the time, at 0.6 89%
+DEFAULT_THRESHOLD = 0.6
+# Candidates per band bucket; popular buckets are compared against their first members only
+MAX_BUCKET = 16
+
+FILLER_WORDS = frozenset((
+    "a", "an", "and", "the", "with", "of", "in", "on", "for", "to", "style",
+    "easy", "quick", "simple", "best", "homemade", "healthy", "perfect", "recipe",
+    "keto", "low", "carb", "sugar", "free", "diabetic", "friendly", "gluten", "paleo",
+))
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+_rng = np.random.default_rng(20240611)
+PERM_MUL = (_rng.integers(1, 2 ** 32, NUM_PERM, dtype=np.uint64) | 1).astype(np.uint32)
+PERM_XOR = _rng.integers(0, 2 ** 32, NUM_PERM, dtype=np.uint64).astype(np.uint32)
+BAND_MUL = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5],
+                    dtype=np.uint64)
+
+
+# === Signatures ===
+def shingles(recipe):
+    words = [w[:-1] if w.endswith("s") and len(w) > 3 else w
+             for w in WORD_RE.findall(str(recipe.get("title", "")).lower()) if w not in FILLER_WORDS]
+    tokens = {"t:" + w for w in words}
+    tokens.update(f"b:{a} {b}" for a, b in zip(words, words[1:]))
+    for line in recipe.get("ingredient_lines") or recipe.get("ingredients") or []:
+        key = parse_ingredient(line).key
+        if key:
+            tokens.add("i:" + key)
+    return tokens or {"k:" + source_key(recipe)}
+
+
+def signatures(shingle_sets, chunk=8):
+    """(n, NUM_PERM) uint32 MinHash signatures for a list of shingle sets."""
+    counts = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    hashes = np.fromiter((zlib.crc32(t.encode("utf-8")) for s in shingle_sets for t in s),
+                         dtype=np.uint32, count=int(counts.sum()))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = np.empty((len(shingle_sets), NUM_PERM), dtype=np.uint32)
+    for lo in range(0, NUM_PERM, chunk):
+        # xor-multiply-xorshift: a cheap family of 32-bit permutations
+        mixed = (hashes[None, :] ^ PERM_XOR[lo:lo + chunk, None]) * PERM_MUL[lo:lo + chunk, None]
+        mixed ^= mixed >> 16
+        result[:, lo:lo + chunk] = np.minimum.reduceat(mixed, starts, axis=1).T
+    return result
+
+
+def band_keys(sigs):
+    """(n, BANDS) uint64 hash of each band's rows."""
+    rows = NUM_PERM // BANDS
+    parts = sigs.reshape(len(sigs), BANDS, rows).astype(np.uint64)
+    return (parts * BAND_MUL[:rows]).sum(axis=2, dtype=np.uint64)
+
+
+def rank_key(recipe):
+    """Larger is a better canonical choice."""
+    return (
+        int(recipe.get("quality_score") or 0),
+        1 if recipe.get("approved") else 0,
+        len(recipe.get("ingredients") or []) + len(recipe.get("instructions") or []),
+    )
+
+
+# === Index ===
+class DedupIndex:
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.keys = []
+        self.titles = []
+        self.ranks = np.empty((0, 3), dtype=np.int64)
+        self.sigs = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self.parent = np.empty(0, dtype=np.int64)
+        self.position = {}
+        # Per band: (sorted band keys, positions in that order)
+        self.bands = [(np.empty(0, np.uint64), np.empty(0, np.int64)) for _ in range(BANDS)]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, pos):
+        parent = self.parent
+        root = pos
+        while parent[root] != root:
+            root = parent[root]
+        while parent[pos] != root:
+            parent[pos], pos = root, parent[pos]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+    def candidates(self, keys, offset):
+        """(a, b) position pairs sharing a band bucket, for new rows starting at `offset`."""
+        pairs = []
+        new = np.arange(offset, offset + len(keys), dtype=np.int64)
+        for band, (old_keys, old_pos) in enumerate(self.bands):
+            mine = keys[:, band]
+            # Against what was indexed before
+            if len(old_keys):
+                lo = np.searchsorted(old_keys, mine, "left")
+                hi = np.minimum(np.searchsorted(old_keys, mine, "right"), lo + MAX_BUCKET)
+                hit = np.nonzero(hi > lo)[0]
+                for i in hit:
+                    pairs.append(np.column_stack((old_pos[lo[i]:hi[i]], np.full(hi[i] - lo[i], new[i]))))
+            # Within the batch: each row against the bucket's first few rows
+            order = np.argsort(mine, kind="stable")
+            sorted_keys = mine[order]
+            run_start = np.concatenate(([0], np.nonzero(sorted_keys[1:] != sorted_keys[:-1])[0] + 1))
+            run_id = np.repeat(np.arange(len(run_start)), np.diff(np.append(run_start, len(mine))))
+            rank_in_run = np.arange(len(mine)) - run_start[run_id]
+            for lead in range(min(MAX_BUCKET, int(rank_in_run.max(initial=0)))):
+                follower = np.nonzero(rank_in_run > lead)[0]
+                leader = run_start[run_id[follower]] + lead
+                pairs.append(np.column_stack((new[order[leader]], new[order[follower]])))
+        if not pairs:
+            return np.empty((0, 2), dtype=np.int64)
+        pairs = np.concatenate(pairs)
+        # One row per distinct pair (1-D unique on a packed code is much faster than axis=0)
+        size = offset + len(keys)
+        codes = np.unique(pairs[:, 0] * size + pairs[:, 1])
+        return np.column_stack((codes // size, codes % size))
+
+    def add(self, recipes):
+        """Index a batch; returns the positions assigned to it."""
+        fresh = {}
+        for recipe in recipes:
+            fresh.setdefault(source_key(recipe), recipe)
+        recipes = [r for key, r in fresh.items() if key not in self.position]
+        offset = len(self.keys)
+        if not recipes:
+            return range(offset, offset)
+        sigs = signatures([shingles(r) for r in recipes])
+        keys = band_keys(sigs)
+        self.sigs = np.concatenate((self.sigs, sigs))
+        self.ranks = np.concatenate((self.ranks, np.array([rank_key(r) for r in recipes], dtype=np.int64)))
+        self.parent = np.concatenate((self.parent, np.arange(offset, offset + len(recipes))))
+        for i, recipe in enumerate(recipes):
+            key = source_key(recipe)
+            self.position[key] = offset + i
+            self.keys.append(key)
+            self.titles.append(str(recipe.get("title", "")))
+
+        pairs = self.candidates(keys, offset)
+        if len(pairs):
+            similarity = (self.sigs[pairs[:, 0]] == self.sigs[pairs[:, 1]]).mean(axis=1)
+            for a, b in pairs[similarity >= self.threshold]:
+                self.union(int(a), int(b))
+
+        for band in range(BANDS):
+            old_keys, old_pos = self.bands[band]
+            merged_keys = np.concatenate((old_keys, keys[:, band]))
+            merged_pos = np.concatenate((old_pos, np.arange(offset, offset + len(recipes))))
+            order = np.argsort(merged_keys, kind="stable")
+            self.bands[band] = (merged_keys[order], merged_pos[order])
+        return range(offset, offset + len(recipes))
+
+    def similarity(self, a, b):
+        return float((self.sigs[a] == self.sigs[b]).mean())
+
+    def clusters(self, positions=None):
+        """{root: [positions]} for clusters with more than one recipe.
+
+        With `positions`, only clusters containing one of them.
+        """
+        roots = np.array([self.find(p) for p in range(len(self))], dtype=np.int64)
+        wanted = None if positions is None else {int(roots[p]) for p in positions}
+        groups = {}
+        for pos, root in enumerate(roots.tolist()):
+            if wanted is None or root in wanted:
+                groups.setdefault(root, []).append(pos)
+        return {root: members for root, members in groups.items() if len(members) > 1}
+
+    def canonical(self, members):
+        # Best rank wins; ties go to the recipe indexed first
+        members = np.asarray(members)
+        ranks = self.ranks[members]
+        order = np.lexsort((members, -ranks[:, 2], -ranks[:, 1], -ranks[:, 0]))
+        return int(members[order[0]])
+
+    def resolve(self, members):
+        """(canonical, duplicates, related) for one cluster.
+
+        Clusters are connected components, so a long chain of pairwise
+        matches can link recipes that are not alike themselves. Only members
+        similar to the canonical recipe count as its duplicates; the rest
+        are reported as related and kept.
+        """
+        best = self.canonical(members)
+        others = np.array([p for p in members if p != best], dtype=np.int64)
+        similarity = (self.sigs[others] == self.sigs[best]).mean(axis=1)
+        close = similarity >= self.threshold
+        return (best,
+                list(zip(others[close].tolist(), similarity[close].tolist())),
+                list(zip(others[~close].tolist(), similarity[~close].tolist())))
+
+    # === Persistence ===
+    def save(self, path):
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, keys=np.array(self.keys, dtype=str), titles=np.array(self.titles, dtype=str),
+                            ranks=self.ranks, sigs=self.sigs, parent=self.parent,
+                            threshold=np.array(self.threshold))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, threshold=None):
+        with np.load(path) as data:
+            index = cls(float(data["threshold"]) if threshold is None else threshold)
+            index.keys = data["keys"].tolist()
+            index.titles = data["titles"].tolist()
+            index.ranks = data["ranks"]
+            index.sigs = data["sigs"]
+            index.parent = data["parent"].astype(np.int64)
+        index.position = {key: pos for pos, key in enumerate(index.keys)}
+        keys = band_keys(index.sigs)
+        for band in range(BANDS):
+            order = np.argsort(keys[:, band], kind="stable")
+            index.bands[band] = (keys[order, band], order.astype(np.int64))
+        return index
+
+
+def report(index, positions=None):
+    """Clusters as {canonical, duplicates, related}, most duplicates first."""
+    def entry(pos, similarity=None):
+        item = {"key": index.keys[pos], "title": index.titles[pos]}
+        if similarity is not None:
+            item["similarity"] = round(similarity, 3)
+        return item
+
+    clusters = []
+    for members in index.clusters(positions).values():
+        best, duplicates, related = index.resolve(members)
+        clusters.append({
+            "canonical": entry(best),
+            "duplicates": [entry(p, sim) for p, sim in duplicates],
+            "related": [entry(p, sim) for p, sim in related],
+        })
+    clusters.sort(key=lambda c: (-len(c["duplicates"]), c["canonical"]["key"]))
+    return {
+        "recipes": len(index),
+        "clusters": len(clusters),
+        "duplicates": sum(len(c["duplicates"]) for c in clusters),
+        "threshold": index.threshold,
+        "groups": clusters,
+    }
+
+
+# === CLI ===
+def read_recipes(paths):
+    """Normalized recipes from importer CSV/JSONL files or harvester output ({source_id, recipe})."""
+    from recipe_importer import normalize_row, read_rows
+
+    for path in paths:
+        for line, raw in read_rows(path):
+            if isinstance(raw, dict) and isinstance(raw.get("recipe"), dict):
+                raw = raw["recipe"]
+            try:
+                yield normalize_row(raw) if isinstance(raw, dict) else None
+            except ValueError as e:
+                print(f"⚠️ {path}:{line}: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find near-duplicate recipes.")
+    parser.add_argument("paths", nargs="+", help="CSV or JSONL recipe files")
+    parser.add_argument("--state", help="index file (.npz) to match against and update")
+    parser.add_argument("--threshold", type=float, default=None, help=f"default {DEFAULT_THRESHOLD}")
+    parser.add_argument("--report", default="dedup_report.json")
+    parser.add_argument("--output", help="write the input's canonical recipes (JSONL) here")
+    args = parser.parse_args(argv)
+
+    if args.state and os.path.exists(args.state):
+        index = DedupIndex.load(args.state, args.threshold)
+    else:
+        index = DedupIndex(args.threshold or DEFAULT_THRESHOLD)
+    before = len(index)
+    recipes = [r for r in read_recipes(args.paths) if r is not None]
+    positions = index.add(recipes)
+    result = report(index, positions)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.state:
+        index.save(args.state)
+
+    if args.output:
+        dropped = {p for members in index.clusters(positions).values()
+                   for p, _ in index.resolve(members)[1]}
+        written = set()
+        with open(args.output, "w", encoding="utf-8") as f:
+            for recipe in recipes:
+                pos = index.position[source_key(recipe)]
+                if pos in positions and pos not in dropped and pos not in written:
+                    written.add(pos)
+                    f.write(json.dumps(recipe, ensure_ascii=False) + "\n")
+    print(f"🔎 {len(positions)} new recipes ({before} already indexed): "
+          f"{result['duplicates']} near-duplicates in {result['clusters']} clusters. Report: {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""Recipes that fit what is left of today's carb and sugar budget.
+
+Recipes are bucketed once into a grid over (carbs, sugar, calories). A query
+starts at the cell holding the budget and walks towards zero best-first,
+ordered by a lower bound on the score any recipe in a cell can reach, and
+stops as soon as no unvisited cell can beat the k-th result. Only the cells
+near the budget corner are ever opened, whatever the catalog size.
+
+Score (lower is better) is the mean unused share of each budget dimension
+plus a glycemic-index penalty, so a 45 g recipe for a 50 g budget beats a
+10 g one, and of two equally close recipes the lower-GI one wins.
+"""
+import heapq
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Grid cell size per dimension
+CARB_STEP = 10.0
+SUGAR_STEP = 4.0
+CALORIE_STEP = 100.0
+# Budgets are floored to these before querying, so nearby budgets share a
+# cache entry and every result still fits the exact budget
+BUDGET_BUCKETS = {"carbs": 1.0, "sugar": 1.0, "calories": 10.0}
+GI_WEIGHT = 0.5
+DEFAULT_GI = 55
+DEFAULT_K = 10
+MAX_K = 50
+CACHE_SIZE = 4096
+# Rows scored in the first batch; doubled for every further batch
+FIRST_BATCH = 256
+
+
+def bucket_budget(carbs, sugar, calories=None):
+    """Floor a budget onto BUDGET_BUCKETS; negative budgets become 0."""
+    def floor(value, step):
+        return math.floor(max(value, 0.0) / step) * step
+    return (
+        floor(carbs, BUDGET_BUCKETS["carbs"]),
+        floor(sugar, BUDGET_BUCKETS["sugar"]),
+        None if calories is None else floor(calories, BUDGET_BUCKETS["calories"]),
+    )
+
+
+class FitIndex:
+    """Grid-bucketed (carbs, sugar, calories) index over a RecipeIndex's recipes."""
+
+    def __init__(self, recipe_index):
+        self.recipe_index = recipe_index
+        recipes = recipe_index.recipes
+        usable = [pos for pos, r in enumerate(recipes)
+                  if r.get("carbs") is not None and r.get("sugar") is not None]
+        carbs = np.array([recipes[p]["carbs"] for p in usable], dtype=np.float64)
+        sugar = np.array([recipes[p]["sugar"] for p in usable], dtype=np.float64)
+        calories = np.array([recipes[p].get("calories") or 0 for p in usable], dtype=np.float64)
+        gi = np.array([recipes[p].get("glycemic_index") or DEFAULT_GI for p in usable], dtype=np.float64)
+
+        cells = np.stack([
+            np.floor(carbs / CARB_STEP), np.floor(sugar / SUGAR_STEP), np.floor(calories / CALORIE_STEP),
+        ], axis=1).astype(np.int64)
+        cells = np.maximum(cells, 0)
+        self.shape = tuple(int(v) + 1 for v in cells.max(axis=0)) if len(usable) else (1, 1, 1)
+        flat = np.ravel_multi_index(cells.T, self.shape) if len(usable) else np.zeros(0, dtype=np.int64)
+        order = np.argsort(flat, kind="stable")
+
+        # Recipes laid out cell by cell; self.cells maps a cell to its slice
+        self.positions = np.array(usable, dtype=np.int64)[order]
+        self.carbs, self.sugar, self.calories = carbs[order], sugar[order], calories[order]
+        self.gi_penalty = GI_WEIGHT * gi[order] / 100.0
+        flat = flat[order]
+        starts = np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]]) if len(flat) else np.zeros(0, dtype=np.int64)
+        ends = np.r_[starts[1:], len(flat)]
+        self.cells = {}
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            cell = np.unravel_index(int(flat[start]), self.shape)
+            best_gi = float(self.gi_penalty[start:end].min())
+            self.cells[tuple(int(v) for v in cell)] = (start, end, best_gi)
+        self.min_gi = min((slot[2] for slot in self.cells.values()), default=0.0)
+        # Calories vary fastest in the layout, so a (carbs, sugar) column is
+        # one contiguous slice too; used when calories are unconstrained
+        self.columns = {}
+        for (i, j, _), (start, end, best_gi) in self.cells.items():
+            lo, hi, gi = self.columns.get((i, j), (start, end, best_gi))
+            self.columns[(i, j)] = (min(lo, start), max(hi, end), min(gi, best_gi))
+
+        self.masks = OrderedDict()
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    # === Filters ===
+    def mask(self, categories):
+        """Bool array over catalog positions for category/cuisine filters, or None."""
+        if not categories:
+            return None
+        key = tuple(sorted((f, tuple(sorted(v.lower() for v in values))) for f, values in categories.items()))
+        with self.lock:
+            mask = self.masks.get(key)
+            if mask is not None:
+                self.masks.move_to_end(key)
+                return mask
+        bits = self.recipe_index.match(categories)
+        size = self.recipe_index.size
+        packed = np.frombuffer(bits.to_bytes((size + 7) // 8 or 1, "little"), dtype=np.uint8)
+        mask = np.unpackbits(packed, bitorder="little")[:size].astype(bool)
+        with self.lock:
+            self.masks[key] = mask
+            if len(self.masks) > 64:
+                self.masks.popitem(last=False)
+        return mask
+
+    # === Queries ===
+    def fit(self, carbs, sugar, calories=None, categories=None, k=DEFAULT_K):
+        """Top-k [(recipe, score)] for a remaining budget, best first.
+
+        calories=None leaves calories unconstrained. Cached per bucketed
+        budget, filters and k.
+        """
+        budget = bucket_budget(carbs, sugar, calories)
+        filters = tuple(sorted((f, tuple(sorted(v.lower() for v in values)))
+                               for f, values in (categories or {}).items() if values))
+        key = (budget, filters, k)
+        with self.lock:
+            hit = self.cache.get(key)
+            if hit is not None:
+                self.cache.move_to_end(key)
+                return hit
+        results = self._search(*budget, self.mask(categories), k)
+        results = [(self.recipe_index.recipes[pos], score) for score, pos in results]
+        with self.lock:
+            self.cache[key] = results
+            if len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return results
+
+    def _search(self, carbs, sugar, calories, mask, k):
+        if not self.cells or k < 1:
+            return []
+        limits = (carbs, sugar, calories)
+        steps = (CARB_STEP, SUGAR_STEP, CALORIE_STEP)
+        # Normalizers; a zero budget still admits zero-carb recipes
+        scale = [max(limit, step) if limit is not None else None for limit, step in zip(limits, steps)]
+        dims = sum(s is not None for s in scale)
+        start = (min(int(carbs // CARB_STEP), self.shape[0] - 1), min(int(sugar // SUGAR_STEP), self.shape[1] - 1))
+        if calories is None:
+            grid = self.columns
+        else:
+            grid = self.cells
+            start += (min(int(calories // CALORIE_STEP), self.shape[2] - 1),)
+
+        def bound(cell):
+            """Lowest unused-budget share any recipe in `cell` can have."""
+            gap = 0.0
+            for axis in range(len(cell)):
+                highest = min((cell[axis] + 1) * steps[axis], limits[axis])
+                gap += (limits[axis] - highest) / scale[axis]
+            return gap / dims
+
+        # Cells are opened in batches so the numpy work per query is a
+        # handful of vectorized passes rather than one per cell
+        scores, positions = np.empty(0), np.empty(0, dtype=np.int64)
+        frontier = [(bound(start), start)]
+        seen = {start}
+        limit = FIRST_BATCH
+        while frontier:
+            worst = scores[-1] if len(scores) == k else math.inf
+            batch, rows = [], 0
+            while frontier and rows < limit:
+                lower, cell = frontier[0]
+                if lower + self.min_gi >= worst:
+                    frontier = []
+                    break
+                heapq.heappop(frontier)
+                for axis in range(len(cell)):
+                    if cell[axis] > 0:
+                        nxt = cell[:axis] + (cell[axis] - 1,) + cell[axis + 1:]
+                        if nxt not in seen:
+                            seen.add(nxt)
+                            heapq.heappush(frontier, (bound(nxt), nxt))
+                slot = grid.get(cell)
+                if slot is not None and lower + slot[2] < worst:
+                    batch.append(np.arange(slot[0], slot[1]))
+                    rows += slot[1] - slot[0]
+            limit *= 2
+            if batch:
+                scores, positions = self._merge(np.concatenate(batch), limits, scale, dims, mask, k,
+                                                scores, positions)
+        return list(zip(scores.tolist(), positions.tolist()))
+
+    def _merge(self, rows, limits, scale, dims, mask, k, scores, positions):
+        """Score grid rows against the budget and keep the best k with the running results."""
+        carbs, sugar = self.carbs[rows], self.sugar[rows]
+        fits = (carbs <= limits[0]) & (sugar <= limits[1])
+        gap = (limits[0] - carbs) / scale[0] + (limits[1] - sugar) / scale[1]
+        if limits[2] is not None:
+            calories = self.calories[rows]
+            fits &= calories <= limits[2]
+            gap += (limits[2] - calories) / scale[2]
+        if mask is not None:
+            fits &= mask[self.positions[rows]]
+        scores = np.concatenate([scores, (gap / dims + self.gi_penalty[rows])[fits]])
+        positions = np.concatenate([positions, self.positions[rows][fits]])
+        # Ties go to the earlier catalog position
+        order = np.lexsort((positions, scores))[:k]
+        return scores[order], positions[order]
+
+
+def parse_fit_args(args):
+    """Read ?k=&max_calories=&category=&cuisine= for /recipes/fit.
+
+    Returns (calories, categories, k). Raises ValueError with a
+    client-facing message on bad input.
+    """
+    try:
+        k = int(args.get("k", DEFAULT_K))
+    except ValueError:
+        raise ValueError("k must be an integer")
+    if k < 1:
+        raise ValueError("k must be positive")
+    calories = args.get("max_calories")
+    if calories is not None and calories != "":
+        try:
+            calories = float(calories)
+        except ValueError:
+            raise ValueError("max_calories must be a number")
+        if not math.isfinite(calories):
+            raise ValueError("max_calories must be a finite number")
+    else:
+        calories = None
+    categories = {}
+    for field in ("category", "cuisine"):
+        raw = args.get(field)
+        if raw:
+            categories[field] = [v.strip() for v in raw.split(",") if v.strip()]
+    return calories, categories, min(k, MAX_K)
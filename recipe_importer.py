@@ -0,0 +1,373 @@
+"""Stream recipes from CSV/JSONL into a catalog target in batches.
+
+    python recipe_importer.py recipes.csv --target app --batch-size 500 --workers 4
+    python recipe_importer.py recipes.jsonl --target supabase --replace
+    python recipe_importer.py recipes.csv --target dynamodb --table diabetes_recipes
+    python recipe_importer.py recipes.jsonl --target app --clean --clean-workers 4
+
+Rows are read lazily, validated and normalized one at a time, grouped into
+batches and written by a bounded pool of writer threads, so memory stays
+flat whatever the file size. Rows that fail validation or whose batch
+fails to write are reported with their line numbers instead of aborting
+the import. With --clean, recipes go through recipe_cleaner on the way in
+and, for the app target, recipes whose content hash matches the stored
+copy are skipped.
+"""
+import argparse
+import ast
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+NUMERIC_FIELDS = ("carbs", "sugar", "calories")
+LIST_FIELDS = ("ingredients", "instructions")
+TRUE_VALUES = ("true", "1", "t", "yes", "y")
+
+
+# === Parsing ===
+def parse_list_field(value):
+    """Parse every list encoding the curated CSV exports have used.
+
+    Accepts real lists, JSON/Python list literals ("['a', 'b']"), Postgres
+    array literals ("{a,\"b, c\"}"), newline-separated text and, as a last
+    resort, comma-separated text.
+    """
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    text = str(value).strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            try:
+                parsed = ast.literal_eval(text)
+            except (ValueError, SyntaxError):
+                parsed = None
+        if isinstance(parsed, list):
+            return [str(v).strip() for v in parsed if str(v).strip()]
+    if text.startswith("{") and text.endswith("}"):
+        items = next(csv.reader([text[1:-1]], skipinitialspace=True), [])
+        return [i.strip(" '\"") for i in items if i.strip(" '\"")]
+    if "\n" in text:
+        return [line.strip() for line in text.splitlines() if line.strip()]
+    return [part.strip() for part in text.split(",") if part.strip()]
+
+
+def normalize_row(row):
+    """Validate one raw row into a catalog recipe. Raises ValueError with the reason."""
+    title = " ".join(str(row.get("title") or "").split())
+    if not title:
+        raise ValueError("missing title")
+    recipe = {"title": title, "image": str(row.get("image") or "").strip()}
+    if row.get("id") not in (None, ""):
+        try:
+            recipe["id"] = int(row["id"])
+        except (TypeError, ValueError):
+            raise ValueError(f"bad id {row['id']!r}")
+    for field in NUMERIC_FIELDS:
+        try:
+            recipe[field] = int(float(row[field]))
+        except KeyError:
+            raise ValueError(f"missing {field}")
+        except (TypeError, ValueError):
+            raise ValueError(f"bad {field} {row[field]!r}")
+        if recipe[field] < 0:
+            raise ValueError(f"negative {field}")
+    recipe["category"] = str(row.get("category") or "Other").strip()
+    recipe["cuisine"] = str(row.get("cuisine") or "American").strip()
+    if row.get("glycemic_index") not in (None, ""):
+        try:
+            recipe["glycemic_index"] = int(float(row["glycemic_index"]))
+        except (TypeError, ValueError):
+            raise ValueError(f"bad glycemic_index {row['glycemic_index']!r}")
+    for field in LIST_FIELDS:
+        recipe[field] = parse_list_field(row.get(field))
+    if not recipe["ingredients"]:
+        raise ValueError("no ingredients")
+    approved = row.get("approved", False)
+    recipe["approved"] = approved if isinstance(approved, bool) else str(approved).strip().lower() in TRUE_VALUES
+    try:
+        recipe["quality_score"] = int(float(row.get("quality_score") or 0))
+    except (TypeError, ValueError):
+        raise ValueError(f"bad quality_score {row['quality_score']!r}")
+    return recipe
+
+
+# === Sources ===
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if line.strip():
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError:
+                    yield line_no, None
+
+
+def read_rows(path, fmt=None):
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    return read_jsonl(path) if fmt == "jsonl" else read_csv(path)
+
+
+# === Targets ===
+class StubTarget:
+    """Counts rows instead of writing them; `latency` simulates a remote round trip."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.written = 0
+        self.lock = threading.Lock()
+
+    def clear(self):
+        self.written = 0
+
+    def write(self, batch):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.written += len(batch)
+
+
+class AppStoreTarget:
+    """The Flask app's own catalog (recipe_store.RecipeStore)."""
+
+    def __init__(self, db_path):
+        from recipe_store import RecipeStore
+        from user_store import UserStore
+
+        self.store = RecipeStore(UserStore(db_path))
+
+    def clear(self):
+        self.store.clear()
+
+    def content_hashes(self):
+        return self.store.content_hashes()
+
+    def write(self, batch):
+        self.store.upsert_many(batch)
+
+
+class DynamoTarget:
+    """A DynamoDB(-compatible) table written through batch_writer (25 items per call)."""
+
+    def __init__(self, table, region="us-east-1", profile=None, endpoint_url=None):
+        import boto3
+
+        self.session = boto3.Session(profile_name=profile, region_name=region)
+        self.table_name = table
+        self.endpoint_url = endpoint_url
+        self.local = threading.local()
+
+    def _table(self):
+        # boto3 resources are not thread-safe; one per writer thread
+        table = getattr(self.local, "table", None)
+        if table is None:
+            dynamodb = self.session.resource("dynamodb", endpoint_url=self.endpoint_url)
+            table = self.local.table = dynamodb.Table(self.table_name)
+        return table
+
+    def clear(self):
+        raise ValueError("--replace is not supported for DynamoDB targets")
+
+    def write(self, batch):
+        with self._table().batch_writer(overwrite_by_pkeys=["id"]) as writer:
+            for recipe in batch:
+                item = dict(recipe)
+                item["id"] = str(item.get("id") or item["title"])  # DynamoDB keys are strings here
+                writer.put_item(Item=item)
+
+
+class SupabaseTarget:
+    """The curated_recipes table in Supabase, one multi-row upsert per batch."""
+
+    def __init__(self, table="curated_recipes", url=None, key=None):
+        from supabase import create_client
+
+        url = url or os.getenv("SUPABASE_URL")
+        key = key or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not key:
+            raise EnvironmentError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variable.")
+        self.client = create_client(url, key)
+        self.table = table
+
+    def clear(self):
+        self.client.table(self.table).delete().neq("id", 0).execute()
+
+    def write(self, batch):
+        self.client.table(self.table).upsert(batch).execute()
+
+
+# === Pipeline ===
+class ImportReport:
+    def __init__(self):
+        self.read = 0
+        self.written = 0
+        self.skipped = 0  # unchanged since the last import
+        self.errors = []  # (line, reason)
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        rate = self.written / self.elapsed if self.elapsed else 0.0
+        return (f"{self.written}/{self.read} rows written in {self.elapsed:.1f}s "
+                f"({rate:.0f} rows/s), {self.skipped} unchanged, {len(self.errors)} errors")
+
+
+def normalized(rows, report):
+    """(line, recipe) for every row that validates; the rest go to report.errors."""
+    for line, raw in rows:
+        report.read += 1
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError("not an object")
+            yield line, normalize_row(raw)
+        except ValueError as e:
+            with report.lock:
+                report.errors.append((line, str(e)))
+
+
+def run_import(rows, target, batch_size=500, workers=4, transform=None, progress=None, stage=None):
+    """Normalize `rows` ((line, raw) pairs) and write them to `target` in parallel batches.
+
+    At most ``2 * workers`` batches are buffered at once. `stage` may wrap
+    the stream of normalized (line, recipe) pairs, yielding (line, result)
+    where result is a recipe, None to skip it as unchanged, or a ValueError
+    to report. `transform` may then map or drop (return None) each recipe
+    before it is batched.
+    """
+    report = ImportReport()
+    slots = threading.BoundedSemaphore(workers * 2)
+
+    def flush(batch, lines):
+        try:
+            target.write(batch)
+        except Exception as e:
+            with report.lock:
+                report.errors.extend((line, f"write failed: {e}") for line in lines)
+        else:
+            with report.lock:
+                report.written += len(batch)
+                if progress:
+                    progress(report)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        batch, lines = [], []
+        pairs = normalized(rows, report)
+        for line, recipe in (stage(pairs) if stage else pairs):
+            if isinstance(recipe, ValueError):
+                with report.lock:
+                    report.errors.append((line, str(recipe)))
+                continue
+            if recipe is None:
+                report.skipped += 1
+                continue
+            try:
+                if transform is not None:
+                    recipe = transform(recipe)
+            except ValueError as e:
+                with report.lock:
+                    report.errors.append((line, str(e)))
+                continue
+            if recipe is None:
+                continue
+            batch.append(recipe)
+            lines.append(line)
+            if len(batch) >= batch_size:
+                slots.acquire()
+                pool.submit(flush, batch, lines)
+                batch, lines = [], []
+        if batch:
+            slots.acquire()
+            pool.submit(flush, batch, lines)
+    return report
+
+
+def make_target(args):
+    if args.target == "app":
+        return AppStoreTarget(args.db or os.environ.get("USER_DB_PATH", "users.db"))
+    if args.target == "dynamodb":
+        return DynamoTarget(args.table or "diabetes_recipes", args.region, args.profile, args.endpoint_url)
+    if args.target == "supabase":
+        return SupabaseTarget(args.table or "curated_recipes")
+    return StubTarget(args.stub_latency)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Batch-import recipes from CSV or JSONL.")
+    parser.add_argument("path", help="CSV or JSONL file")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="defaults to the file extension")
+    parser.add_argument("--target", choices=("app", "dynamodb", "supabase", "stub"), default="app")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--replace", action="store_true", help="delete existing recipes first")
+    parser.add_argument("--errors", help="write per-row errors to this JSONL file")
+    parser.add_argument("--clean", action="store_true", help="run recipe_cleaner on every recipe")
+    parser.add_argument("--clean-workers", type=int, default=1, help="processes for --clean")
+    parser.add_argument("--db", help="app target: SQLite path (default $USER_DB_PATH or users.db)")
+    parser.add_argument("--table", help="dynamodb/supabase target: table name")
+    parser.add_argument("--region", default="us-east-1")
+    parser.add_argument("--profile", default=None)
+    parser.add_argument("--endpoint-url", default=None, help="dynamodb target: e.g. DynamoDB Local")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="stub target: seconds per batch")
+    return parser
+
+
+def main(argv=None, transform=None):
+    args = build_parser().parse_args(argv)
+    target = make_target(args)
+    if args.replace:
+        print("⚠️ Deleting existing recipes...")
+        target.clear()
+
+    stage = None
+    if args.clean:
+        from recipe_cleaner import clean_stream
+
+        hashes_of = getattr(target, "content_hashes", None)
+        known = hashes_of() if hashes_of and not args.replace else None
+
+        def stage(pairs):
+            return clean_stream(pairs, args.clean_workers, known)
+
+    def progress(report):
+        print(f"⬆️ {report.written} rows written ({report.written / report.elapsed:.0f} rows/s)", end="\r")
+
+    report = run_import(read_rows(args.path, args.format), target, args.batch_size, args.workers,
+                        transform=transform, progress=progress, stage=stage)
+    print()
+    for line, reason in report.errors[:20]:
+        print(f"⚠️ line {line}: {reason}")
+    if len(report.errors) > 20:
+        print(f"⚠️ ... and {len(report.errors) - 20} more")
+    if args.errors:
+        with open(args.errors, "w", encoding="utf-8") as f:
+            for line, reason in report.errors:
+                f.write(json.dumps({"line": line, "error": reason}) + "\n")
+    print(f"🎉 {report.summary()}")
+    return report
+
+
+if __name__ == "__main__":
+    report = main()
+    sys.exit(1 if report.errors and not report.written else 0)
@@ -0,0 +1,229 @@
+import base64
+import json
+import math
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+# Fields answered from sorted arrays (range filters / sort keys)
+NUMERIC_FIELDS = ("carbs", "sugar", "calories", "glycemic_index")
+# Fields answered from per-value bitsets (equality filters / facets)
+CATEGORICAL_FIELDS = ("category", "cuisine")
+SORT_FIELDS = ("id", "title") + NUMERIC_FIELDS
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# query-string name -> (field, bound)
+RANGE_PARAMS = {
+    "max_carbs": ("carbs", "max"),
+    "max_sugar": ("sugar", "max"),
+    "max_calories": ("calories", "max"),
+    "min_gi": ("glycemic_index", "min"),
+    "max_gi": ("glycemic_index", "max"),
+}
+
+
+class RecipeIndex:
+    """Read-only indexes over an immutable recipe list.
+
+    Recipes are addressed by their position in the list. Numeric fields keep
+    a sorted array of (value, position) so a range filter is two bisections;
+    categorical fields keep one int bitset per value so filters and facet
+    counts are a handful of big-int ANDs and popcounts.
+    """
+
+    def __init__(self, recipes):
+        self.recipes = list(recipes)
+        self.size = len(self.recipes)
+        self.all_bits = (1 << self.size) - 1
+        self.by_id = {r["id"]: pos for pos, r in enumerate(self.recipes)}
+
+        self.numeric = {}
+        for field in NUMERIC_FIELDS:
+            pairs = sorted(
+                (r[field], pos) for pos, r in enumerate(self.recipes)
+                if r.get(field) is not None
+            )
+            self.numeric[field] = ([v for v, _ in pairs], np.array([p for _, p in pairs], dtype=np.int64))
+
+        self.categorical = {}
+        for field in CATEGORICAL_FIELDS:
+            members = {}
+            for pos, r in enumerate(self.recipes):
+                value = r.get(field)
+                if value is not None:
+                    members.setdefault(str(value).lower(), []).append(pos)
+            self.categorical[field] = {key: self.to_bits(pos) for key, pos in members.items()}
+        # Display spelling for facet keys
+        self.labels = {
+            field: {str(r[field]).lower(): r[field] for r in self.recipes if r.get(field) is not None}
+            for field in CATEGORICAL_FIELDS
+        }
+
+        self.sort_orders = {}
+        for field in SORT_FIELDS:
+            self.sort_orders[field] = sorted(
+                range(self.size), key=lambda p, f=field: _sort_key(self.recipes[p], f)
+            )
+
+    # === Lookups ===
+    def get(self, recipe_id):
+        pos = self.by_id.get(recipe_id)
+        return None if pos is None else self.recipes[pos]
+
+    def get_many(self, ids):
+        found, missing = [], []
+        for recipe_id in ids:
+            recipe = self.get(recipe_id)
+            if recipe is None:
+                missing.append(recipe_id)
+            else:
+                found.append(recipe)
+        return found, missing
+
+    # === Filtering ===
+    def to_bits(self, positions):
+        """Int bitset with the given positions set (packed in one numpy pass)."""
+        mask = np.zeros(self.size, dtype=bool)
+        mask[positions] = True
+        return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+    def range_bits(self, field, low=None, high=None):
+        values, positions = self.numeric[field]
+        start = 0 if low is None else bisect_left(values, low)
+        end = len(values) if high is None else bisect_right(values, high)
+        return self.to_bits(positions[start:end])
+
+    def category_bits(self, field, wanted):
+        bitsets = self.categorical[field]
+        bits = 0
+        for value in wanted:
+            bits |= bitsets.get(value.lower(), 0)
+        return bits
+
+    def match(self, categories=None, ranges=None):
+        bits = self.all_bits
+        for field, wanted in (categories or {}).items():
+            bits &= self.category_bits(field, wanted)
+        for field, (low, high) in (ranges or {}).items():
+            if bits:
+                bits &= self.range_bits(field, low, high)
+        return bits
+
+    def facets(self, bits):
+        return {
+            field: {
+                self.labels[field][value]: (bits & valuebits).bit_count()
+                for value, valuebits in bitsets.items()
+                if bits & valuebits
+            }
+            for field, bitsets in self.categorical.items()
+        }
+
+    def page(self, bits, sort="id", descending=False, offset=0, limit=DEFAULT_LIMIT):
+        """Walk the precomputed sort order and return up to `limit` matches after `offset`."""
+        order = self.sort_orders[sort]
+        if descending:
+            order = reversed(order)
+        # Materialize once so membership tests are O(1) per position
+        packed = bits.to_bytes((self.size + 7) // 8 or 1, "little")
+        results = []
+        skipped = 0
+        for pos in order:
+            if not packed[pos >> 3] >> (pos & 7) & 1:
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            results.append(self.recipes[pos])
+            if len(results) == limit:
+                break
+        return results
+
+    def query(self, categories=None, ranges=None, sort="id", descending=False,
+              offset=0, limit=DEFAULT_LIMIT):
+        bits = self.match(categories, ranges)
+        total = bits.bit_count()
+        results = self.page(bits, sort, descending, offset, limit) if bits else []
+        next_offset = offset + len(results)
+        return {
+            "recipes": results,
+            "total": total,
+            "next_cursor": encode_cursor(next_offset) if next_offset < total else None,
+            "facets": self.facets(bits),
+        }
+
+
+def _sort_key(recipe, field):
+    value = recipe.get(field)
+    if field == "title":
+        value = (value or "").lower()
+    # Missing values sort last, ties broken by id for a stable cursor
+    return (value is None, value if value is not None else 0, recipe["id"])
+
+
+# === Query-string parsing ===
+def encode_cursor(offset):
+    raw = json.dumps({"o": offset}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded))["o"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+
+def parse_query(args):
+    """Turn request args into keyword arguments for `RecipeIndex.query`.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    categories = {}
+    for field in CATEGORICAL_FIELDS:
+        raw = args.get(field)
+        if raw:
+            categories[field] = [v.strip() for v in raw.split(",") if v.strip()]
+
+    ranges = {}
+    for param, (field, bound) in RANGE_PARAMS.items():
+        raw = args.get(param)
+        if raw is None or raw == "":
+            continue
+        try:
+            value = float(raw)
+        except ValueError:
+            raise ValueError(f"{param} must be a number")
+        if not math.isfinite(value):
+            raise ValueError(f"{param} must be a number")
+        low, high = ranges.get(field, (None, None))
+        ranges[field] = (value, high) if bound == "min" else (low, value)
+
+    sort = args.get("sort", "id")
+    descending = sort.startswith("-")
+    sort = sort.lstrip("-")
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_FIELDS)}")
+
+    try:
+        limit = int(args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+
+    cursor = args.get("cursor")
+    return {
+        "categories": categories,
+        "ranges": ranges,
+        "sort": sort,
+        "descending": descending,
+        "offset": decode_cursor(cursor) if cursor else 0,
+        "limit": min(limit, MAX_LIMIT),
+    }
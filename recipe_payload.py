@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip covers every client we ship
+    brotli = None
+
+# Fields the list view actually renders
+SUMMARY_FIELDS = (
+    "id", "title", "image", "carbs", "sugar", "calories",
+    "category", "cuisine", "glycemic_index",
+)
+VIEWS = ("summary", "full")
+MAX_CUSTOM_PROJECTIONS = 32
+
+
+def catalog_version(recipes):
+    """Content hash of the catalog; changes whenever any recipe changes."""
+    raw = json.dumps(recipes, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def project(recipe, fields):
+    if fields is None:
+        return recipe
+    return {f: recipe[f] for f in fields if f in recipe}
+
+
+class Payload:
+    """One serialized projection of the catalog with its encoded variants."""
+
+    def __init__(self, version, name, body):
+        self.body = body
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f"{version}-{name}-{digest}"
+        self.encoded = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(body, quality=11)
+
+    def variant(self, accept_encodings):
+        """Pick the smallest encoding the client accepts.
+
+        Returns (body, content_encoding, etag); each encoding gets its own
+        strong ETag since the bytes differ.
+        """
+        best = (self.body, None, self.etag)
+        for encoding, body in self.encoded.items():
+            if accept_encodings[encoding] and len(body) < len(best[0]):
+                best = (body, encoding, f"{self.etag}-{encoding}")
+        return best
+
+    def etags(self):
+        return [self.etag] + [f"{self.etag}-{e}" for e in self.encoded]
+
+
+class RecipePayloads:
+    """Serialized catalog payloads, built once per catalog version."""
+
+    def __init__(self, recipes):
+        self.recipes = list(recipes)
+        self.version = catalog_version(self.recipes)
+        self.fields = set().union(*self.recipes) if self.recipes else set()
+        self.views = {
+            None: self._build("full", None),
+            SUMMARY_FIELDS: self._build("summary", SUMMARY_FIELDS),
+        }
+        # ?fields= projections are built on first use and kept in a small LRU
+        self.custom = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _build(self, name, fields):
+        items = [project(r, fields) for r in self.recipes]
+        body = json.dumps(items, separators=(",", ":")).encode("utf-8")
+        return Payload(self.version, name, body)
+
+    def get(self, fields=None):
+        payload = self.views.get(fields)
+        if payload is not None:
+            return payload
+        key = ",".join(fields)
+        with self.lock:
+            payload = self.custom.get(key)
+            if payload is not None:
+                self.custom.move_to_end(key)
+                return payload
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()[:8]
+        payload = self._build(name, fields)
+        with self.lock:
+            self.custom[key] = payload
+            if len(self.custom) > MAX_CUSTOM_PROJECTIONS:
+                self.custom.popitem(last=False)
+        return payload
+
+
+def parse_projection(args, known_fields):
+    """Read ?view= / ?fields= into a field tuple (None means every field).
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    view = args.get("view", "full")
+    if view not in VIEWS:
+        raise ValueError(f"view must be one of {', '.join(VIEWS)}")
+    raw = args.get("fields")
+    if not raw:
+        return SUMMARY_FIELDS if view == "summary" else None
+    fields = sorted({f.strip() for f in raw.split(",") if f.strip()})
+    unknown = [f for f in fields if f not in known_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in fields:
+        fields.insert(0, "id")
+    return tuple(fields)
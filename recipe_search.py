@@ -0,0 +1,169 @@
+"""Full-text recipe search (BM25) and title typeahead.
+
+The inverted index is built once per catalog and kept in CSR form: one
+sorted vocabulary, an offsets array, and flat int32 doc / float32 term
+frequency arrays, so 100k recipes cost a few bytes per posting instead of
+a Python object each. Term frequencies are field-weighted (a title match
+counts more than an instruction match) and scored with BM25.
+
+Typeahead uses sorted arrays of title and word starts into one string
+holding every title, so "chi" finds "Chili" first and then "Grilled
+Chicken Salad"; a prefix lookup is two bisections per array.
+"""
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+import numpy as np
+
+from ingredient_parser import UNIT_ALIASES, UNITS, singular
+
+FIELD_WEIGHTS = {"title": 3.0, "ingredients": 2.0, "instructions": 1.0}
+K1 = 1.2
+B = 0.75
+STOP_WORDS = frozenset((
+    "a", "an", "and", "the", "with", "of", "in", "on", "for", "to", "or", "into",
+    "until", "about", "over", "at", "it", "is", "be", "from", "your", "then",
+)) | frozenset(UNITS) | frozenset(UNIT_ALIASES)
+WORD_RE = re.compile(r"[^\W\d_]+")
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 25
+# Title matches examined per suggest call before ranking
+SUGGEST_SCAN = 500
+
+
+@lru_cache(maxsize=65536)
+def tokenize(text):
+    """Search terms of one line; cached since ingredient and step lines repeat across recipes."""
+    return tuple(singular(w) for w in WORD_RE.findall(text.lower()) if w not in STOP_WORDS)
+
+
+def field_lines(recipe, field):
+    value = recipe.get(field)
+    if field == "ingredients":
+        value = recipe.get("ingredient_lines") or value
+    if isinstance(value, list):
+        return [str(v) for v in value]
+    return [str(value or "")]
+
+
+class SearchIndex:
+    def __init__(self, recipes):
+        self.recipes = list(recipes)
+        self.size = len(self.recipes)
+        term_ids = {}
+        post_terms, post_docs, post_tfs = [], [], []
+        lengths = []
+        for doc, recipe in enumerate(self.recipes):
+            weights = {}
+            length = 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                for line in field_lines(recipe, field):
+                    tokens = tokenize(line)
+                    length += weight * len(tokens)
+                    for token in tokens:
+                        weights[token] = weights.get(token, 0.0) + weight
+            lengths.append(length)
+            for token, tf in weights.items():
+                post_terms.append(term_ids.setdefault(token, len(term_ids)))
+                post_docs.append(doc)
+                post_tfs.append(tf)
+
+        # Renumber terms alphabetically and group postings by term (CSR)
+        self.vocabulary = sorted(term_ids)
+        rank = np.empty(len(term_ids), dtype=np.int32)
+        rank[[term_ids[t] for t in self.vocabulary]] = np.arange(len(term_ids), dtype=np.int32)
+        terms = rank[np.array(post_terms, dtype=np.int32)] if post_terms else np.zeros(0, dtype=np.int32)
+        order = np.argsort(terms, kind="stable")
+        self.docs = np.array(post_docs, dtype=np.int32)[order]
+        self.tfs = np.array(post_tfs, dtype=np.float32)[order]
+        self.offsets = np.searchsorted(terms[order], np.arange(len(self.vocabulary) + 1)).astype(np.int64)
+        self.doc_freq = np.diff(self.offsets)
+        lengths = np.array(lengths, dtype=np.float32)
+        self.norms = K1 * (1 - B + B * lengths / (lengths.mean() if self.size else 1.0))
+
+        # Typeahead: every title in one string; title starts and later word
+        # starts in two arrays, each sorted by the text that follows
+        titles = [" ".join(str(r.get("title", "")).lower().split()) for r in self.recipes]
+        self.title_starts = np.cumsum([0] + [len(t) + 1 for t in titles])[:-1]
+        self.blob = blob = "\n".join(titles) + "\n"
+        words = [m.start() for m in re.finditer(r"(?<= )\S", blob)]
+
+        def by_text(start):
+            return blob[start:blob.index("\n", start)]
+
+        # array rather than numpy: bisect indexes it element by element
+        self.title_order = array("q", sorted(self.title_starts.tolist(), key=by_text))
+        self.word_order = array("q", sorted(words, key=by_text))
+
+    # === Search ===
+    def term(self, token):
+        i = bisect_left(self.vocabulary, token)
+        return i if i < len(self.vocabulary) and self.vocabulary[i] == token else None
+
+    def search(self, query, limit=DEFAULT_LIMIT, offset=0):
+        """([(recipe, score)], total) for recipes matching any query term, best first."""
+        terms = {t for t in (self.term(tok) for tok in tokenize(query)) if t is not None}
+        if not terms:
+            return [], 0
+        scores = np.zeros(self.size, dtype=np.float32)
+        for t in terms:
+            lo, hi = self.offsets[t], self.offsets[t + 1]
+            docs, tfs = self.docs[lo:hi], self.tfs[lo:hi]
+            df = hi - lo
+            idf = np.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tfs * (K1 + 1) / (tfs + self.norms[docs])
+        matched = np.flatnonzero(scores)
+        wanted = min(offset + limit, len(matched))
+        if wanted == 0:
+            return [], len(matched)
+        top = matched[np.argpartition(-scores[matched], wanted - 1)[:wanted]]
+        # Ties keep catalog order so pages are stable
+        top = top[np.lexsort((top, -scores[top]))][offset:]
+        return [(self.recipes[d], float(scores[d])) for d in top], len(matched)
+
+    # === Typeahead ===
+    def prefix_matches(self, starts, prefix, limit):
+        """Recipe positions for up to `limit` entries of `starts` whose text begins with `prefix`."""
+        blob, size = self.blob, len(prefix)
+        lo = bisect_left(starts, prefix, key=lambda s: blob[s:s + size])
+        hi = bisect_right(starts, prefix, lo=lo, key=lambda s: blob[s:s + size])
+        hits = starts[lo:min(hi, lo + limit)]
+        return (np.searchsorted(self.title_starts, hits, side="right") - 1).tolist()
+
+    def suggest(self, prefix, limit=DEFAULT_SUGGESTIONS):
+        """Recipes whose title has a word run starting with `prefix`, plus completions of its last word.
+
+        Titles that start with the prefix rank first, then shorter titles.
+        """
+        prefix = " ".join(prefix.lower().split())
+        if not prefix:
+            return [], []
+        found = {}
+        for starts in (self.title_order, self.word_order):
+            for doc in self.prefix_matches(starts, prefix, SUGGEST_SCAN):
+                found.setdefault(doc, (starts is self.word_order, len(self.recipes[doc].get("title", "")), doc))
+            if len(found) >= limit:
+                break
+        recipes = [self.recipes[doc] for *_, doc in sorted(found.values())[:limit]]
+
+        last = prefix.rsplit(" ", 1)[-1]
+        lo = bisect_left(self.vocabulary, last)
+        hi = bisect_left(self.vocabulary, last + "\uffff", lo=lo)
+        ranked = (lo + np.argsort(-self.doc_freq[lo:hi], kind="stable")[:limit]).tolist()
+        terms = [{"term": self.vocabulary[t], "count": int(self.doc_freq[t])} for t in ranked]
+        return recipes, terms
+
+
+def parse_limit(args, name, default, maximum):
+    try:
+        value = int(args.get(name, default))
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if value < 1:
+        raise ValueError(f"{name} must be positive")
+    return min(value, maximum)
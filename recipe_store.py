@@ -0,0 +1,76 @@
+import json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY,
+    source_key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    content_hash TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_recipes_source_key ON recipes (source_key);
+"""
+# Databases created before content hashes were stored
+ADD_CONTENT_HASH = "ALTER TABLE recipes ADD COLUMN content_hash TEXT"
+SELECT_ALL = "SELECT id, data FROM recipes ORDER BY id"
+SELECT_HASHES = "SELECT source_key, content_hash FROM recipes WHERE content_hash IS NOT NULL"
+COUNT = "SELECT COUNT(*) FROM recipes"
+# Re-importing the same recipe updates it in place and keeps its id
+UPSERT = (
+    "INSERT INTO recipes (id, source_key, data, content_hash) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (source_key) DO UPDATE SET data = excluded.data, content_hash = excluded.content_hash"
+)
+DELETE_ALL = "DELETE FROM recipes"
+
+
+def source_key(recipe):
+    """Stable identity for upserts: the explicit id if any, else title + cuisine."""
+    if recipe.get("id") is not None:
+        return f"id:{recipe['id']}"
+    return "title:" + " ".join(f"{recipe['title']} {recipe.get('cuisine', '')}".lower().split())
+
+
+class RecipeStore:
+    """The app's recipe catalog, kept in the same SQLite database as the users."""
+
+    def __init__(self, users):
+        self.users = users
+        with users.transaction() as conn:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(recipes)")}
+            if "content_hash" not in columns:
+                conn.execute(ADD_CONTENT_HASH)
+
+    def count(self):
+        return self.users.connection().execute(COUNT).fetchone()[0]
+
+    def load(self):
+        recipes = []
+        for recipe_id, data in self.users.connection().execute(SELECT_ALL):
+            recipe = json.loads(data)
+            recipe["id"] = recipe_id
+            recipes.append(recipe)
+        return recipes
+
+    def content_hashes(self):
+        """{source_key: content_hash} for recipes imported through the cleaner."""
+        return dict(self.users.connection().execute(SELECT_HASHES))
+
+    def upsert_many(self, recipes):
+        """Insert or update a batch in one transaction.
+
+        A `content_hash` key, as set by recipe_cleaner, is stored in its
+        own column rather than in the recipe data.
+        """
+        rows = []
+        for recipe in recipes:
+            data = {k: v for k, v in recipe.items() if k not in ("id", "content_hash")}
+            rows.append((recipe.get("id"), source_key(recipe), json.dumps(data), recipe.get("content_hash")))
+        with self.users.transaction() as conn:
+            conn.executemany(UPSERT, rows)
+        return len(rows)
+
+    def clear(self):
+        with self.users.transaction() as conn:
+            conn.execute(DELETE_ALL)
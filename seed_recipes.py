@@ -1,8 +1,6 @@
-import boto3
+from recipe_importer import DynamoTarget
 
-session = boto3.Session(profile_name='default', region_name='us-east-1')
-dynamodb = session.resource('dynamodb')
-table = dynamodb.Table('diabetes_recipes')
+target = DynamoTarget('diabetes_recipes', region='us-east-1', profile='default')
 
 recipes = [
     {
@@ -92,9 +90,7 @@ recipes = [
     }
 ]
 
-for recipe in recipes:
-    recipe['id'] = str(recipe['id'])  # Convert id to string for DynamoDB
-    print(dynamodb.meta.client.list_tables())
-    table.put_item(Item=recipe)
+# One batch_writer session instead of a put_item round trip per recipe
+target.write(recipes)
 
 print("✅ All recipes inserted successfully.")
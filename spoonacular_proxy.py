@@ -0,0 +1,399 @@
+"""Shared Spoonacular proxy: one cache and one quota for every app install.
+
+Responses are cached in two tiers: a per-process LRU of response bodies
+in front of a table in the user database that every worker shares and
+that survives restarts. Cache keys are built from normalized parameters
+(case, whitespace, defaults, ingredient order), so equivalent requests
+from different devices share an entry. Concurrent misses for one key
+make a single upstream call.
+
+Upstream calls go through one hourly quota kept in the database, so all
+workers together stay under it, and each user gets a smaller hourly
+share of proxy requests. Bodies that are not the JSON an endpoint
+expects count as upstream failures and are never cached. When the quota
+is used up, Spoonacular answers 402, or the upstream fails, an expired
+entry is served as long as it is younger than STALE_TTL; responses say
+which through X-Cache (hit, miss or stale).
+"""
+import json
+import math
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+
+from single_flight import SingleFlight
+
+DEFAULT_BASE_URL = "https://api.spoonacular.com"
+DEFAULT_MAX_PER_HOUR = 150
+# Proxy requests one user may make per hour, so no single account can drain the shared quota
+DEFAULT_MAX_PER_USER_HOUR = 120
+SEARCH_TTL = 6 * 3600
+DETAILS_TTL = 7 * 86400
+# Expired entries are still served for this long when upstream is unavailable
+STALE_TTL = 30 * 86400
+MEMORY_ENTRIES = 2048
+FETCH_TIMEOUT = 15
+MAX_INGREDIENTS = 20
+# What the app always sent with complexSearch
+SEARCH_DEFAULTS = {
+    "minFiber": "3", "addRecipeInformation": "true", "fillIngredients": "true", "addRecipeNutrition": "true",
+    "instructionsRequired": "true", "sort": "healthiness", "sortDirection": "desc",
+}
+DIABETIC_TERMS = (
+    "low carb breakfast", "diabetic lunch", "sugar free dessert", "high fiber dinner",
+    "diabetic snacks", "low glycemic", "whole grain", "lean protein",
+)
+INGREDIENT_DETAILS = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spoonacular_cache (
+    key TEXT PRIMARY KEY,
+    stored_at INTEGER NOT NULL,
+    body TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_spoonacular_cache_stored_at ON spoonacular_cache (stored_at);
+CREATE TABLE IF NOT EXISTS spoonacular_quota (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    hour INTEGER NOT NULL,
+    used INTEGER NOT NULL,
+    blocked_until INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS spoonacular_user_quota (
+    email TEXT PRIMARY KEY,
+    hour INTEGER NOT NULL,
+    used INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+SELECT_ENTRY = "SELECT stored_at, body FROM spoonacular_cache WHERE key = ?"
+UPSERT_ENTRY = "INSERT OR REPLACE INTO spoonacular_cache (key, stored_at, body) VALUES (?, ?, ?)"
+PURGE_ENTRIES = "DELETE FROM spoonacular_cache WHERE stored_at < ?"
+SELECT_QUOTA = "SELECT hour, used, blocked_until FROM spoonacular_quota WHERE id = 1"
+UPSERT_QUOTA = "INSERT OR REPLACE INTO spoonacular_quota (id, hour, used, blocked_until) VALUES (1, ?, ?, ?)"
+SELECT_USER_QUOTA = "SELECT hour, used FROM spoonacular_user_quota WHERE email = ?"
+UPSERT_USER_QUOTA = "INSERT OR REPLACE INTO spoonacular_user_quota (email, hour, used) VALUES (?, ?, ?)"
+PURGE_USER_QUOTA = "DELETE FROM spoonacular_user_quota WHERE hour < ?"
+
+
+class UpstreamError(Exception):
+    """Spoonacular could not answer and nothing usable was cached."""
+
+    def __init__(self, message, status=502, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class QuotaExceeded(UpstreamError):
+    def __init__(self, retry_after):
+        super().__init__("Spoonacular quota is used up; try again later", 503, retry_after)
+
+
+class UserQuotaExceeded(UpstreamError):
+    def __init__(self, retry_after):
+        super().__init__("Too many Spoonacular requests; try again later", 429, retry_after)
+
+
+# === Response shapes ===
+def recipe_ids(items):
+    """Ids of a list of upstream recipe objects; ValueError when it is not one."""
+    if not isinstance(items, list):
+        raise ValueError("expected a list of recipes")
+    for item in items:
+        if not isinstance(item, dict) or isinstance(item.get("id"), bool) or not isinstance(item.get("id"), int):
+            raise ValueError("recipe without an integer id")
+    return [item["id"] for item in items]
+
+
+def search_results(data):
+    if not isinstance(data, dict):
+        raise ValueError("expected an object")
+    return recipe_ids(data.get("results", []))
+
+
+def recipe_information(data):
+    return recipe_ids([data])
+
+
+# === Normalization ===
+def normalize_text(value):
+    return " ".join(str(value or "").lower().split())
+
+
+def bounded_int(args, name, default, low, high):
+    raw = args.get(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be from {low} to {high}")
+    return value
+
+
+def search_params(args):
+    """Normalized complexSearch parameters from request args; raises ValueError."""
+    return {
+        "query": normalize_text(args.get("query")),
+        "type": normalize_text(args.get("type")),
+        "diet": normalize_text(args.get("diet")) or "diabetic",
+        "maxCarbs": bounded_int(args, "maxCarbs", 30, 0, 1000),
+        "maxSugar": bounded_int(args, "maxSugar", 15, 0, 1000),
+        "number": bounded_int(args, "number", 20, 1, 100),
+        "offset": bounded_int(args, "offset", 0, 0, 900),
+    }
+
+
+def parse_ingredients(raw):
+    """Sorted, de-duplicated ingredient names, so any order hits one entry."""
+    names = sorted({normalize_text(name) for name in str(raw or "").replace("+", ",").split(",")} - {""})
+    if not names:
+        raise ValueError("ingredients is required")
+    if len(names) > MAX_INGREDIENTS:
+        raise ValueError(f"At most {MAX_INGREDIENTS} ingredients")
+    return names
+
+
+def cache_key(path, params):
+    return path + "?" + urllib.parse.urlencode(sorted((k, str(v)) for k, v in params.items()))
+
+
+def fetch_json(url, timeout=FETCH_TIMEOUT):
+    """(status, body text) of a GET; network failures raise UpstreamError."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, response.read().decode("utf-8")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8", "replace")
+    except (OSError, ValueError) as e:
+        raise UpstreamError(f"Could not reach Spoonacular: {e}")
+
+
+class HourlyQuota:
+    """Upstream calls allowed per clock hour, shared by every worker through SQLite."""
+
+    def __init__(self, users, limit):
+        self.users = users
+        self.limit = limit
+
+    def acquire(self, now=None):
+        """Take one call; raises QuotaExceeded when none are left."""
+        now = int(time.time()) if now is None else now
+        hour = now // 3600
+        with self.users.transaction() as conn:
+            row = conn.execute(SELECT_QUOTA).fetchone()
+            stored_hour, used, blocked_until = row if row else (hour, 0, 0)
+            if blocked_until > now:
+                raise QuotaExceeded(blocked_until - now)
+            if stored_hour != hour:
+                used = 0
+            if used >= self.limit:
+                raise QuotaExceeded((hour + 1) * 3600 - now)
+            conn.execute(UPSERT_QUOTA, (hour, used + 1, blocked_until))
+
+    def block_until_tomorrow(self, now=None):
+        """Spoonacular said 402: its daily points reset at midnight UTC. Returns seconds left."""
+        now = int(time.time()) if now is None else now
+        until = (now // 86400 + 1) * 86400
+        with self.users.transaction() as conn:
+            row = conn.execute(SELECT_QUOTA).fetchone()
+            hour, used = (row[0], row[1]) if row else (now // 3600, 0)
+            conn.execute(UPSERT_QUOTA, (hour, used, until))
+        return until - now
+
+
+class UserQuota:
+    """Proxy requests each user may make per clock hour, shared by every worker through SQLite."""
+
+    def __init__(self, users, limit):
+        self.users = users
+        self.limit = limit
+
+    def acquire(self, email, now=None):
+        """Take one request for `email`; raises UserQuotaExceeded when none are left."""
+        now = int(time.time()) if now is None else now
+        hour = now // 3600
+        with self.users.transaction() as conn:
+            row = conn.execute(SELECT_USER_QUOTA, (email,)).fetchone()
+            used = row[1] if row and row[0] == hour else 0
+            if used >= self.limit:
+                raise UserQuotaExceeded((hour + 1) * 3600 - now)
+            if row is None:
+                conn.execute(PURGE_USER_QUOTA, (hour,))
+            conn.execute(UPSERT_USER_QUOTA, (email, hour, used + 1))
+
+
+class SpoonacularProxy:
+    def __init__(self, users, api_key, base_url=DEFAULT_BASE_URL, max_per_hour=DEFAULT_MAX_PER_HOUR,
+                 max_per_user_hour=DEFAULT_MAX_PER_USER_HOUR, memory_entries=MEMORY_ENTRIES, fetch=fetch_json):
+        self.users = users
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.fetch = fetch
+        self.quota = HourlyQuota(users, max_per_hour)
+        self.user_quota = UserQuota(users, max_per_user_hour)
+        self.flights = SingleFlight()
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()  # key -> (stored_at, body), least recently used first
+        self.memory_entries = memory_entries
+        with users.transaction() as conn:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+
+    # === Cache tiers ===
+    def _cached(self, key):
+        """(stored_at, body) from memory, else from the shared table; None if absent."""
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                return entry
+        row = self.users.connection().execute(SELECT_ENTRY, (key,)).fetchone()
+        if row is None:
+            return None
+        self._remember(key, tuple(row))
+        return tuple(row)
+
+    def _remember(self, key, entry):
+        with self.lock:
+            self.memory[key] = entry
+            self.memory.move_to_end(key)
+            if len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def _store(self, key, body):
+        now = int(time.time())
+        with self.users.transaction() as conn:
+            conn.execute(UPSERT_ENTRY, (key, now, body))
+            conn.execute(PURGE_ENTRIES, (now - STALE_TTL,))
+        self._remember(key, (now, body))
+
+    # === Upstream ===
+    def _call(self, path, params, shape):
+        """Body text of one upstream GET, counted against the shared quota.
+
+        `shape` raises ValueError on a body the endpoints could not use, so
+        nothing malformed is ever cached.
+        """
+        self.quota.acquire()
+        url = f"{self.base_url}{path}?" + urllib.parse.urlencode({**params, "apiKey": self.api_key})
+        status, body = self.fetch(url)
+        if status == 402:
+            raise QuotaExceeded(self.quota.block_until_tomorrow())
+        if status == 404:
+            raise UpstreamError("Not found on Spoonacular", 404)
+        if status != 200:
+            raise UpstreamError(f"Spoonacular answered {status}")
+        try:
+            shape(json.loads(body))
+        except ValueError:
+            raise UpstreamError("Spoonacular sent a malformed response") from None
+        return body
+
+    def get(self, path, params, ttl, shape):
+        """(body, "hit" | "miss" | "stale") for one upstream resource."""
+        key = cache_key(path, params)
+        entry = self._cached(key)
+        if entry is not None and entry[0] + ttl > time.time():
+            return entry[1], "hit"
+        return self.flights.do(key, lambda: self._refresh(key, path, params, ttl, shape))
+
+    def _refresh(self, key, path, params, ttl, shape):
+        # Another worker may have refreshed the shared table meanwhile
+        row = self.users.connection().execute(SELECT_ENTRY, (key,)).fetchone()
+        if row is not None and row[0] + ttl > time.time():
+            self._remember(key, tuple(row))
+            return row[1], "hit"
+        try:
+            body = self._call(path, params, shape)
+        except UpstreamError as e:
+            if row is not None and e.status != 404 and row[0] + STALE_TTL > time.time():
+                return row[1], "stale"
+            raise
+        self._store(key, body)
+        return body, "miss"
+
+    # === Endpoints ===
+    def search(self, params):
+        return self.get("/recipes/complexSearch", {**SEARCH_DEFAULTS, **params}, SEARCH_TTL, search_results)
+
+    def details(self, recipe_id):
+        return self.get(f"/recipes/{int(recipe_id)}/information", {"includeNutrition": "true"}, DETAILS_TTL,
+                        recipe_information)
+
+    def details_many(self, ids):
+        """([information, ...] in `ids` order, state); misses share one informationBulk call."""
+        found, states, missing = {}, set(), []
+        for recipe_id in dict.fromkeys(ids):
+            entry = self._cached(cache_key(f"/recipes/{recipe_id}/information", {"includeNutrition": "true"}))
+            if entry is not None and entry[0] + DETAILS_TTL > time.time():
+                found[recipe_id] = json.loads(entry[1])
+                states.add("hit")
+            else:
+                missing.append(recipe_id)
+        if missing:
+            try:
+                fetched = self.flights.do(("bulk", tuple(missing)), lambda: self._fetch_bulk(missing))
+                found.update(fetched)
+                states.add("miss")
+            except UpstreamError:
+                # Fall back to each detail on its own, which serves stale copies
+                for recipe_id in missing:
+                    try:
+                        body, state = self.details(recipe_id)
+                    except UpstreamError:
+                        continue
+                    found[recipe_id] = json.loads(body)
+                    states.add(state)
+        return [found[i] for i in ids if i in found], combined_state(states)
+
+    def _fetch_bulk(self, ids):
+        body = self._call("/recipes/informationBulk", {"ids": ",".join(map(str, ids)), "includeNutrition": "true"},
+                          recipe_ids)
+        fetched = {}
+        for info in json.loads(body):
+            fetched[info["id"]] = info
+            self._store(cache_key(f"/recipes/{info['id']}/information", {"includeNutrition": "true"}),
+                        json.dumps(info))
+        return fetched
+
+    def by_ingredients(self, ingredients):
+        """Full information for the best matches, like the app's searchByIngredients."""
+        body, state = self.get("/recipes/findByIngredients", {
+            "ingredients": ",".join(ingredients), "number": 20, "ranking": 2, "ignorePantry": "false",
+        }, SEARCH_TTL, recipe_ids)
+        ids = recipe_ids(json.loads(body))[:INGREDIENT_DETAILS]
+        recipes, details_state = self.details_many(ids)
+        return recipes, combined_state({state, details_state})
+
+    def diabetic_friendly(self, number, meal_type=""):
+        """Up to `number` unique recipes from the app's diabetic search terms."""
+        per_term = math.ceil(number / len(DIABETIC_TERMS))
+        results, seen, states, error = [], set(), set(), None
+        for term in DIABETIC_TERMS:
+            params = search_params({"query": term, "type": meal_type, "number": per_term})
+            try:
+                body, state = self.search(params)
+            except UpstreamError as e:
+                error = e
+                continue
+            states.add(state)
+            for recipe in json.loads(body).get("results", []):
+                if recipe["id"] not in seen:
+                    seen.add(recipe["id"])
+                    results.append(recipe)
+        if not states and error is not None:
+            raise error
+        return results[:number], combined_state(states)
+
+
+def combined_state(states):
+    for state in ("stale", "miss"):
+        if state in states:
+            return state
+    return "hit"
@@ -0,0 +1,206 @@
+"""Revoked access tokens: a shared Bloom filter in front of an exact SQLite set.
+
+Two kinds of revocation are stored, each until the last token it covers
+has expired:
+
+    jti          one token (POST /logout)
+    email, gen   every token issued to the user with that generation
+                 (POST /logout/all bumps the user's generation)
+
+The check on every authenticated request hashes the token's jti and its
+(email, gen) pair into the filter; only when either might be present does
+it query SQLite, so a valid token costs two filter probes and no I/O.
+
+The filter is a file mapped into every process, so pre-fork workers and a
+reloaded master all see a revocation as soon as it is made. Its memory is
+fixed: two windows of `capacity` entries, each covering one token
+lifetime. Entries land in the windows their expiry falls into, and a
+window is cleared and reused once every token in it has expired, so
+memory does not grow with the number of tokens issued or revoked.
+"""
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    key TEXT PRIMARY KEY,
+    expires INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires ON revoked_tokens (expires);
+CREATE TABLE IF NOT EXISTS token_generations (
+    email TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+INSERT_REVOKED = (
+    "INSERT INTO revoked_tokens (key, expires) VALUES (?, ?) "
+    "ON CONFLICT (key) DO UPDATE SET expires = max(expires, excluded.expires)"
+)
+SELECT_REVOKED = "SELECT 1 FROM revoked_tokens WHERE key IN (?, ?) AND expires >= ?"
+SELECT_LIVE = "SELECT key, expires FROM revoked_tokens WHERE expires >= ?"
+PURGE_EXPIRED = "DELETE FROM revoked_tokens WHERE expires < ?"
+SELECT_GENERATION = "SELECT generation FROM token_generations WHERE email = ?"
+BUMP_GENERATION = (
+    "INSERT INTO token_generations (email, generation) VALUES (?, 1) "
+    "ON CONFLICT (email) DO UPDATE SET generation = generation + 1 RETURNING generation"
+)
+
+MAGIC = 0x52564B31  # "RVK1"
+HEADER = 64
+# Header slots (int64): magic, bits per window, hashes, window seconds,
+# window held by slot 0, by slot 1, latest expiry that found no free slot
+WINDOWS = 2
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_ERROR_RATE = 0.01
+
+
+def generation_key(email, generation):
+    return f"gen\n{generation}\n{email}"
+
+
+class SharedBloomFilter:
+    """Bloom filter in a shared mapping, split into expiry windows.
+
+    `path` None maps an unlinked temporary file, shared only with
+    processes forked after this is created.
+    """
+
+    def __init__(self, window, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE, path=None):
+        self.window = int(window)
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.bits = (bits + 7) // 8 * 8
+        self.hashes = min(8, max(1, round(self.bits / capacity * math.log(2))))
+        # One digest supplies every probe position
+        self.unpack = struct.Struct(f"<{self.hashes}{'I' if self.bits < 2 ** 32 else 'Q'}")
+        size = HEADER + WINDOWS * self.bits // 8
+        self.file = open(path, "a+b") if path else tempfile.TemporaryFile()
+        self.thread_lock = threading.Lock()
+        with self.locked():
+            if os.fstat(self.file.fileno()).st_size < size:
+                self.file.truncate(size)
+            self.map = mmap.mmap(self.file.fileno(), size)
+            self.header = memoryview(self.map)[:HEADER].cast("q")
+            settings = (MAGIC, self.bits, self.hashes, self.window)
+            if tuple(self.header[:4]) != settings:
+                # New file or changed settings: start empty, the caller refills it
+                self.map[:] = bytes(size)
+                for i, value in enumerate(settings + (-1, -1)):
+                    self.header[i] = value
+        self.data = memoryview(self.map)[HEADER:]
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self.thread_lock = threading.Lock()
+
+    @contextmanager
+    def locked(self):
+        """Excludes other threads (thread lock) and other processes (fcntl record lock)."""
+        with self.thread_lock:
+            fcntl.lockf(self.file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.file, fcntl.LOCK_UN)
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=self.unpack.size).digest()
+        bits = self.bits
+        return [h % bits for h in self.unpack.unpack(digest)]
+
+    def add(self, key, until, now=None):
+        """Remember `key` for tokens expiring from now until `until` (epoch seconds)."""
+        now = int(time.time()) if now is None else now
+        positions = self.positions(key)
+        with self.locked():
+            for window in range(now // self.window, until // self.window + 1):
+                slot = window % WINDOWS
+                held = self.header[4 + slot]
+                if held != window:
+                    if held >= now // self.window:
+                        # Still in use: tokens expiring in `window` fall back to SQLite
+                        self.header[6] = max(self.header[6], until)
+                        continue
+                    offset = slot * self.bits // 8
+                    self.data[offset:offset + self.bits // 8] = bytes(self.bits // 8)
+                    self.header[4 + slot] = window
+                offset = slot * self.bits
+                for p in positions:
+                    p += offset
+                    self.data[p >> 3] |= 1 << (p & 7)
+
+    def might_contain(self, key, expires):
+        """False only if `key` was never added for a token expiring at `expires`."""
+        window = expires // self.window
+        slot = window % WINDOWS
+        if self.header[4 + slot] != window:
+            return expires <= self.header[6]
+        data, offset = self.data, slot * self.bits
+        for p in self.positions(key):
+            p += offset
+            if not data[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+
+class TokenRevocations:
+    """Revocation state kept in the user database, with a filter in front."""
+
+    def __init__(self, users, lifetime, capacity=DEFAULT_CAPACITY, path=None):
+        self.users = users
+        self.lifetime = int(lifetime)
+        with users.transaction() as conn:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+        self.filter = SharedBloomFilter(self.lifetime, capacity, path=path)
+        # Refill from the exact set: covers a new or resized filter file and
+        # anything a crash left out. Adding is idempotent, so a live file is fine.
+        now = int(time.time())
+        for key, expires in users.connection().execute(SELECT_LIVE, (now,)):
+            self.filter.add(key, expires, now)
+
+    def generation(self, email):
+        row = self.users.connection().execute(SELECT_GENERATION, (email,)).fetchone()
+        return row[0] if row else 0
+
+    def revoke_all(self, email):
+        """Invalidate every token issued to `email` so far; returns the new generation."""
+        expires = int(time.time()) + self.lifetime
+        with self.users.transaction() as conn:
+            generation = conn.execute(BUMP_GENERATION, (email,)).fetchone()[0]
+            key = generation_key(email, generation - 1)
+            self._store(conn, key, expires)
+        self.filter.add(key, expires)
+        return generation
+
+    def revoke_token(self, jti, expires):
+        with self.users.transaction() as conn:
+            self._store(conn, jti, expires)
+        self.filter.add(jti, expires)
+
+    def _store(self, conn, key, expires):
+        conn.execute(INSERT_REVOKED, (key, expires))
+        conn.execute(PURGE_EXPIRED, (int(time.time()),))
+
+    def is_revoked(self, payload):
+        """The check for `token_in_blocklist_loader`; `payload` is a decoded JWT."""
+        expires = payload["exp"]
+        jti = payload["jti"]
+        generation = payload.get("gen", 0)
+        email = payload["sub"]
+        gen_key = generation_key(email, generation)
+        if not self.filter.might_contain(jti, expires) and not self.filter.might_contain(gen_key, expires):
+            return False
+        conn = self.users.connection()
+        if conn.execute(SELECT_REVOKED, (jti, gen_key, int(time.time()))).fetchone():
+            return True
+        # Generations only go up, so an older one was revoked even if its row was purged
+        return generation < self.generation(email)
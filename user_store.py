@@ -0,0 +1,380 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import uuid
+import weakref
+from contextlib import contextmanager
+
+from progress_history import DayColumns, to_ordinal
+
+DEFAULT_GOALS = {"carbs": 200, "sugar": 50, "exercise": 30}
+PROGRESS_FIELDS = ("carbs", "sugar", "exercise")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL,
+    name TEXT NOT NULL,
+    bio TEXT NOT NULL DEFAULT '',
+    profile_picture TEXT NOT NULL DEFAULT '',
+    goals TEXT NOT NULL,
+    carbs NUMERIC NOT NULL DEFAULT 0,
+    sugar NUMERIC NOT NULL DEFAULT 0,
+    exercise NUMERIC NOT NULL DEFAULT 0,
+    last_updated TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users (email);
+CREATE TABLE IF NOT EXISTS progress_events (
+    email TEXT NOT NULL,
+    key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (email, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meals (
+    email TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    recipe_id INTEGER,
+    carbs REAL NOT NULL,
+    glycemic_index REAL NOT NULL,
+    PRIMARY KEY (email, ts, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS progress_history (
+    email TEXT PRIMARY KEY,
+    start_day INTEGER NOT NULL,
+    carbs BLOB NOT NULL,
+    sugar BLOB NOT NULL,
+    exercise BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Idempotency keys are remembered this long, by event day; events dated
+# earlier are not applied, since a retry of one could no longer be detected.
+EVENT_KEY_RETENTION_DAYS = 7
+# Timed meals feed the glucose-curve estimate; older ones are dropped
+MEAL_RETENTION_DAYS = 90
+# Connections kept open for reuse once their thread has exited
+MAX_IDLE_CONNECTIONS = 32
+
+# Statements are module constants so sqlite3's per-connection statement
+# cache hands back the same prepared statement on every call.
+SELECT_PROFILE = (
+    "SELECT name, bio, profile_picture, goals, carbs, sugar, exercise, last_updated "
+    "FROM users WHERE email = ?"
+)
+SELECT_PASSWORD = "SELECT password FROM users WHERE email = ?"
+INSERT_USER = (
+    "INSERT INTO users (email, password, name, goals, last_updated) VALUES (?, ?, ?, ?, ?)"
+)
+UPDATE_PASSWORD = "UPDATE users SET password = ? WHERE email = ?"
+UPDATE_GOALS = "UPDATE users SET goals = ? WHERE email = ?"
+SELECT_STALE_PROGRESS = (
+    "SELECT carbs, sugar, exercise, last_updated FROM users WHERE email = ? AND last_updated != ?"
+)
+ROLL_DAY = (
+    "UPDATE users SET carbs = 0, sugar = 0, exercise = 0, last_updated = ? "
+    "WHERE email = ? AND last_updated != ?"
+)
+RESET_PROGRESS = (
+    "UPDATE users SET carbs = 0, sugar = 0, exercise = 0, last_updated = ? WHERE email = ?"
+)
+ADD_PROGRESS = (
+    "UPDATE users SET carbs = carbs + ?, sugar = sugar + ?, exercise = exercise + ? "
+    "WHERE email = ?"
+)
+INSERT_EVENT = "INSERT OR IGNORE INTO progress_events (email, key, day) VALUES (?, ?, ?)"
+PRUNE_EVENTS = "DELETE FROM progress_events WHERE email = ? AND day < ?"
+INSERT_MEAL = (
+    "INSERT OR IGNORE INTO meals (email, ts, key, recipe_id, carbs, glycemic_index) VALUES (?, ?, ?, ?, ?, ?)"
+)
+SELECT_MEALS = (
+    "SELECT ts, recipe_id, carbs, glycemic_index FROM meals WHERE email = ? AND ts >= ? AND ts < ? ORDER BY ts"
+)
+PRUNE_MEALS = "DELETE FROM meals WHERE email = ? AND ts < ?"
+SELECT_HISTORY = "SELECT start_day, carbs, sugar, exercise FROM progress_history WHERE email = ?"
+UPSERT_HISTORY = (
+    "INSERT OR REPLACE INTO progress_history (email, start_day, carbs, sugar, exercise) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+# Only these columns may be changed through PUT /profile
+PROFILE_UPDATES = {
+    "name": "UPDATE users SET name = ? WHERE email = ?",
+    "bio": "UPDATE users SET bio = ? WHERE email = ?",
+}
+
+
+class KeyedLocks:
+    """One lock per key, created on demand and dropped once nobody holds it."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.locks = {}  # key -> [lock, holders]
+
+    @contextmanager
+    def hold(self, key):
+        with self.lock:
+            entry = self.locks.get(key)
+            if entry is None:
+                entry = self.locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.locks[key]
+
+
+class _Lease:
+    """Holds a thread's connection; when the thread exits, its finalizer returns the connection."""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class UserStore:
+    """SQLite-backed accounts and profiles.
+
+    Each thread gets its own connection (SQLite connections must not be
+    shared across threads). Werkzeug starts a thread per request, so a
+    connection goes back to a pool of at most MAX_IDLE_CONNECTIONS when its
+    thread exits and the next thread reuses it, prepared statements and
+    all. File databases run in WAL mode so readers in any thread or worker
+    process never block on a writer. Pass ``":memory:"`` for a private
+    in-memory database, e.g. in tests.
+    """
+
+    def __init__(self, path=":memory:"):
+        if path == ":memory:":
+            # Shared-cache URI so every thread's connection sees one database
+            self.uri = f"file:users-{uuid.uuid4().hex}?mode=memory&cache=shared"
+            self.memory = True
+        else:
+            self.uri = f"file:{os.path.abspath(path)}"
+            self.memory = False
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.idle = []
+        self.pid = os.getpid()
+        self.user_locks = KeyedLocks()
+        # Keeps an in-memory database alive for the lifetime of the store
+        self.anchor = self._open()
+        self.anchor.executescript(SCHEMA)
+
+    # === Connections ===
+    def _open(self):
+        conn = sqlite3.connect(
+            self.uri, uri=True, isolation_level=None,
+            check_same_thread=False, cached_statements=256,
+        )
+        conn.execute("PRAGMA busy_timeout = 5000")
+        if not self.memory:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        with self.lock:
+            self.connections.add(conn)
+        return conn
+
+    def connection(self):
+        if self.pid != os.getpid():
+            # Forked child: never reuse the parent's connections
+            self._after_fork()
+        lease = getattr(self.local, "lease", None)
+        if lease is None:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            lease = self.local.lease = _Lease(conn or self._open())
+            # Runs when the thread exits and its locals are freed
+            weakref.finalize(lease, self._release, lease.conn, self.pid)
+        return lease.conn
+
+    def _release(self, conn, pid):
+        if pid != os.getpid():
+            return
+        with self.lock:
+            if conn not in self.connections:
+                return  # closed by close()
+            if len(self.idle) < MAX_IDLE_CONNECTIONS and not conn.in_transaction:
+                self.idle.append(conn)
+                return
+            self.connections.discard(conn)
+        conn.close()
+
+    def _after_fork(self):
+        self.pid = os.getpid()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.idle = []
+        self.user_locks = KeyedLocks()
+
+    def close(self):
+        with self.lock:
+            connections, self.connections = self.connections, set()
+            self.idle = []
+        for conn in connections:
+            conn.close()
+        self.local = threading.local()
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction; takes the write lock up front to avoid upgrade deadlocks."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # === Accounts ===
+    def create_user(self, email, password_hash, name, today):
+        """Insert a new account; returns False if the email is taken."""
+        try:
+            with self.transaction() as conn:
+                conn.execute(INSERT_USER, (email, password_hash, name, json.dumps(DEFAULT_GOALS), today))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def get_password_hash(self, email):
+        row = self.connection().execute(SELECT_PASSWORD, (email,)).fetchone()
+        return row[0] if row else None
+
+    def set_password_hash(self, email, password_hash):
+        with self.transaction() as conn:
+            conn.execute(UPDATE_PASSWORD, (password_hash, email))
+
+    # === Profiles ===
+    def _roll_day(self, conn, email, today):
+        """Archive totals left over from a previous day into history, then zero them."""
+        row = conn.execute(SELECT_STALE_PROGRESS, (email, today)).fetchone()
+        if row is not None:
+            *values, last_updated = row
+            if any(values):
+                self._add_history(conn, email, last_updated, dict(zip(PROGRESS_FIELDS, values)))
+            conn.execute(ROLL_DAY, (today, email, today))
+            cutoff = datetime.date.fromisoformat(today) - datetime.timedelta(days=EVENT_KEY_RETENTION_DAYS)
+            conn.execute(PRUNE_EVENTS, (email, cutoff.isoformat()))
+            cutoff = datetime.date.fromisoformat(today) - datetime.timedelta(days=MEAL_RETENTION_DAYS)
+            conn.execute(PRUNE_MEALS, (email, int(datetime.datetime.combine(cutoff, datetime.time()).timestamp())))
+
+    def _history(self, conn, email):
+        row = conn.execute(SELECT_HISTORY, (email,)).fetchone()
+        if row is None:
+            return DayColumns(PROGRESS_FIELDS)
+        return DayColumns.from_blobs(PROGRESS_FIELDS, row[0], row[1:])
+
+    def _add_history(self, conn, email, day, amounts):
+        history = self._history(conn, email)
+        history.add(to_ordinal(day), amounts)
+        conn.execute(UPSERT_HISTORY, (email, history.start, *history.to_blobs()))
+
+    def _profile(self, conn, email):
+        row = conn.execute(SELECT_PROFILE, (email,)).fetchone()
+        if row is None:
+            return None
+        name, bio, picture, goals, carbs, sugar, exercise, last_updated = row
+        return {
+            "name": name,
+            "bio": bio,
+            "profile_picture": picture,
+            "goals": json.loads(goals),
+            "progress": {"carbs": carbs, "sugar": sugar, "exercise": exercise},
+            "lastUpdated": last_updated,
+        }
+
+    def get_profile(self, email, today):
+        """Profile with today's progress, clearing totals left over from a previous day."""
+        profile = self._profile(self.connection(), email)
+        if profile is None or profile["lastUpdated"] == today:
+            return profile
+        with self.transaction() as conn:
+            self._roll_day(conn, email, today)
+            return self._profile(conn, email)
+
+    def update_profile(self, email, changes):
+        with self.transaction() as conn:
+            for field, sql in PROFILE_UPDATES.items():
+                if field in changes:
+                    conn.execute(sql, (changes[field], email))
+            return self._profile(conn, email)
+
+    def set_goals(self, email, goals):
+        with self.transaction() as conn:
+            return conn.execute(UPDATE_GOALS, (json.dumps(goals), email)).rowcount == 1
+
+    def add_progress(self, email, amounts, today):
+        """Atomically add to today's totals; returns False for an unknown user."""
+        values = [amounts.get(field, 0) for field in PROGRESS_FIELDS]
+        with self.transaction() as conn:
+            self._roll_day(conn, email, today)
+            return conn.execute(ADD_PROGRESS, (*values, email)).rowcount == 1
+
+    def reset_progress(self, email, today):
+        with self.transaction() as conn:
+            return conn.execute(RESET_PROGRESS, (today, email)).rowcount == 1
+
+    def apply_events(self, email, events, today):
+        """Apply a batch of (key, day, amounts, meal) progress events exactly once.
+
+        Events whose key was already seen are skipped, so clients can resend
+        a whole batch after a dropped connection. Only events dated today
+        count towards today's totals; older ones are added to that day's
+        history and reported as "stale", and ones older than
+        EVENT_KEY_RETENTION_DAYS are dropped as "expired". `meal` is None or
+        (epoch seconds, recipe_id, carbs, glycemic_index) and is kept for
+        the glucose-curve estimate. Returns None for an unknown user.
+        """
+        counts = {"applied": 0, "duplicates": 0, "stale": 0, "expired": 0}
+        totals = [0] * len(PROGRESS_FIELDS)
+        cutoff = (datetime.date.fromisoformat(today) - datetime.timedelta(days=EVENT_KEY_RETENTION_DAYS)).isoformat()
+        # Per-user lock keeps one user's batches from interleaving in this
+        # process; the transaction makes the batch atomic across processes.
+        with self.user_locks.hold(email), self.transaction() as conn:
+            self._roll_day(conn, email, today)
+            if conn.execute(SELECT_PASSWORD, (email,)).fetchone() is None:
+                return None
+            for key, day, amounts, meal in events:
+                if day < cutoff:
+                    # Its key may already be pruned, so a retry would count twice
+                    counts["expired"] += 1
+                    continue
+                if not conn.execute(INSERT_EVENT, (email, key, day)).rowcount:
+                    counts["duplicates"] += 1
+                    continue
+                if meal is not None:
+                    conn.execute(INSERT_MEAL, (email, meal[0], key, *meal[1:]))
+                if day < today:
+                    counts["stale"] += 1
+                    self._add_history(conn, email, day, amounts)
+                else:
+                    counts["applied"] += 1
+                    for i, field in enumerate(PROGRESS_FIELDS):
+                        totals[i] += amounts.get(field, 0)
+            if counts["applied"]:
+                conn.execute(ADD_PROGRESS, (*totals, email))
+            counts["progress"] = self._profile(conn, email)["progress"]
+        return counts
+
+    def get_meals(self, email, first, last):
+        """(ts, recipe_id, carbs, glycemic_index) rows with first <= ts < last, oldest first."""
+        return self.connection().execute(SELECT_MEALS, (email, first, last)).fetchall()
+
+    def get_history(self, email, today):
+        """(DayColumns including today's live totals, goals), or None for an unknown user."""
+        profile = self.get_profile(email, today)
+        if profile is None:
+            return None
+        history = self._history(self.connection(), email)
+        history.add(to_ordinal(today), profile["progress"])
+        return history, profile["goals"]